@@ -0,0 +1,162 @@
+"""
+Command line tools for operating the store.
+
+    python -m app.cli import-products catalog.csv
+    python -m app.cli import-products catalog.jsonl --format jsonl
+    python -m app.cli rebuild-sales-rollups
+    python -m app.cli rebuild-category-counts
+    python -m app.cli create-superuser --email admin@example.com
+    python -m app.cli run-outbox-worker
+"""
+import argparse
+import asyncio
+import getpass
+import json
+import logging
+import signal
+import sys
+from dataclasses import asdict
+
+
+def import_products_command(args) -> int:
+    from app.services.product_import import IMPORT_FORMATS, detect_format, import_products_from_file
+
+    format = args.format or detect_format(args.path)
+    if format not in IMPORT_FORMATS:
+        print("Cannot tell the file format, pass --format csv or --format jsonl", file=sys.stderr)
+        return 2
+
+    def progress(report):
+        print(f"processed {report.processed}, imported {report.imported}, failed {report.failed}", file=sys.stderr)
+
+    with open(args.path, "rb") as binary_stream:
+        report = import_products_from_file(binary_stream, format, progress)
+    print(json.dumps(asdict(report), indent=2))
+    return 1 if report.failed else 0
+
+
+def rebuild_sales_rollups_command(args) -> int:
+    from app.database import SessionLocal
+    from app.services.sales import rebuild_sales_rollups
+
+    db = SessionLocal()
+    try:
+        rebuild_sales_rollups(db)
+    finally:
+        db.close()
+    print("Sales rollups rebuilt", file=sys.stderr)
+    return 0
+
+
+def rebuild_category_counts_command(args) -> int:
+    from app.database import SessionLocal
+    from app.services.category import rebuild_category_counts
+
+    db = SessionLocal()
+    try:
+        rebuild_category_counts(db)
+    finally:
+        db.close()
+    print("Category counts rebuilt", file=sys.stderr)
+    return 0
+
+
+def create_superuser_command(args) -> int:
+    from app.config import settings
+    from app.database import SessionLocal
+    from app.models.user import User, UserRole
+    from app.services.auth import get_password_hash
+
+    email = args.email or settings.FIRST_SUPERUSER
+    if not email:
+        print("Pass --email or set FIRST_SUPERUSER", file=sys.stderr)
+        return 2
+
+    db = SessionLocal()
+    try:
+        if db.query(User).filter(User.email == email).first() is not None:
+            print(f"User {email} already exists", file=sys.stderr)
+            return 0
+        password = settings.FIRST_SUPERUSER_PASSWORD or getpass.getpass(f"Password for {email}: ")
+        if not password:
+            print("A password is required", file=sys.stderr)
+            return 2
+        db.add(User(
+            email=email,
+            hashed_password=get_password_hash(password),
+            is_active=True,
+            role=UserRole.ADMIN,
+        ))
+        db.commit()
+    finally:
+        db.close()
+    print(f"Created admin user {email}", file=sys.stderr)
+    return 0
+
+
+def run_outbox_worker_command(args) -> int:
+    from app.config import settings
+    from app.services.outbox import load_outbox_handlers, process_outbox_batch, run_outbox_worker
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    load_outbox_handlers(settings.OUTBOX_HANDLER_MODULES)
+    batch_size = args.batch_size or settings.OUTBOX_BATCH_SIZE
+
+    async def drain() -> int:
+        # Due events only: ones waiting out a retry delay are left for the next run
+        total = 0
+        while (claimed := await process_outbox_batch(batch_size)):
+            total += claimed
+        return total
+
+    async def serve() -> None:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)  # Finish the current batch, then exit
+        await run_outbox_worker(batch_size, settings.OUTBOX_POLL_INTERVAL_SECONDS, stop)
+
+    if args.once:
+        print(f"Processed {asyncio.run(drain())} outbox events", file=sys.stderr)
+    else:
+        asyncio.run(serve())
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_products = commands.add_parser("import-products", help="Bulk import products from a CSV or JSONL file")
+    import_products.add_argument("path", help="CSV file with a header row, or JSON Lines file")
+    import_products.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension")
+    import_products.set_defaults(handler=import_products_command)
+
+    rebuild_sales = commands.add_parser("rebuild-sales-rollups",
+                                        help="Recompute the daily sales rollups from the order history")
+    rebuild_sales.set_defaults(handler=rebuild_sales_rollups_command)
+
+    rebuild_categories = commands.add_parser("rebuild-category-counts",
+                                             help="Relink products to categories and recount them with a full scan")
+    rebuild_categories.set_defaults(handler=rebuild_category_counts_command)
+
+    create_superuser = commands.add_parser("create-superuser",
+                                           help="Create the first admin user, if it doesn't exist yet")
+    create_superuser.add_argument("--email", help="Defaults to FIRST_SUPERUSER; the password is "
+                                                  "FIRST_SUPERUSER_PASSWORD, or prompted for")
+    create_superuser.set_defaults(handler=create_superuser_command)
+
+    outbox_worker = commands.add_parser("run-outbox-worker",
+                                        help="Deliver outbox events (order side effects) to their handlers")
+    outbox_worker.add_argument("--batch-size", type=int, help="Events claimed per transaction, "
+                                                               "defaults to OUTBOX_BATCH_SIZE")
+    outbox_worker.add_argument("--once", action="store_true", help="Deliver the events due now and exit")
+    outbox_worker.set_defaults(handler=run_outbox_worker_command)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,4 @@
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 
 
@@ -9,6 +10,18 @@ class Settings(BaseSettings):
 
     # Database configuration
     DATABASE_URL: str  # Database connection URL
+    ASYNC_DATABASE_URL: Optional[str] = None  # Async driver URL, derived from DATABASE_URL if unset
+    READ_REPLICA_DATABASE_URL: Optional[str] = None  # Replica for read-only sessions, unset reads the primary
+    READ_REPLICA_ASYNC_DATABASE_URL: Optional[str] = None  # Async driver URL, derived from READ_REPLICA_DATABASE_URL if unset
+    READ_YOUR_WRITES_SECONDS: int = 5  # Reads stay on the primary this long after their user (catalog reads: any catalog) writes
+
+    # Connection pools (each engine: primary and replica, sync and async)
+    DATABASE_POOL_SIZE: int = 5  # Connections kept open
+    DATABASE_MAX_OVERFLOW: int = 10  # Extra connections opened under load, closed when returned
+    DATABASE_POOL_TIMEOUT_SECONDS: int = 30  # Wait for a free connection before failing
+    DATABASE_POOL_PRE_PING: bool = False  # Test connections on checkout, replacing ones the server dropped
+    DATABASE_POOL_RECYCLE_SECONDS: int = 1800  # Replace connections older than this, -1 never
+    DATABASE_STATEMENT_TIMEOUT_MS: int = 0  # PostgreSQL statement_timeout per connection, 0 disables
 
     # JWT configuration
     SECRET_KEY: str  # Secret key for signing JWT tokens
@@ -16,9 +29,70 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30  # Token expiration time in minutes
     PASSWORD_RESET_TOKEN_EXPIRE_HOURS: int = 24  # Password reset token expiration time in hours
 
-    # First admin user credentials
-    FIRST_SUPERUSER: str  # Admin username for the first user
-    FIRST_SUPERUSER_PASSWORD: str  # Admin password for the first user
+    # Metrics
+    SQL_N_PLUS_ONE_THRESHOLD: int = 0  # Warn when one statement shape repeats more often in a request, 0 disables
+
+    # Authenticated principal cache (skips the users lookup on every request)
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60  # Upper bound on entry lifetime, 0 disables the cache
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10000  # Entries kept before evicting the least recently used
+
+    # Catalog response cache (serialized GET /products responses with ETags)
+    CATALOG_CACHE_TTL_SECONDS: int = 300  # Bounds staleness on workers that didn't see the write, 0 disables
+    CATALOG_CACHE_MAX_ENTRIES: int = 1024  # Distinct query shapes kept before evicting the least recently used
+
+    # Password hashing pool (keeps bcrypt off the event loop)
+    PASSWORD_POOL_KIND: str = "thread"  # "thread" or "process"
+    PASSWORD_POOL_WORKERS: int = 4  # Concurrent hash/verify calls
+    PASSWORD_POOL_QUEUE_SIZE: int = 32  # Calls allowed to wait for a worker before rejecting with 503
+    PASSWORD_POOL_RETRY_AFTER_SECONDS: int = 1  # Retry-After sent with the 503
+
+    # Product image uploads
+    MAX_UPLOAD_SIZE_BYTES: int = 10 * 1024 * 1024  # Uploads larger than this are rejected with 413
+    IMAGE_VARIANT_WORKERS: int = 2  # Processes resizing uploads into thumbnail/listing/detail variants
+
+    # Cart store (active carts in a key-value store, written behind to the cart tables)
+    CART_STORE: str = "sql"  # "sql" (tables only), "memory" (this process) or "redis"
+    CART_STORE_URL: str = "redis://localhost:6379/0"  # Redis-protocol server for CART_STORE=redis
+    CART_FLUSH_INTERVAL_SECONDS: int = 30  # How often changed carts are persisted; checkout always persists first
+    CART_STORE_MAX_CARTS: int = 100000  # CART_STORE=memory keeps this many carts, dropping the least recently used
+    CART_STORE_TTL_SECONDS: int = 30 * 86400  # CART_STORE=redis drops carts untouched this long (SQL keeps them)
+
+    # Rate limiting and load shedding (decided in middleware, before a request opens a DB session)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"  # "memory" (per worker) or "redis" (shared by every worker)
+    RATE_LIMIT_URL: str = "redis://localhost:6379/0"  # Redis-protocol server for RATE_LIMIT_BACKEND=redis
+    RATE_LIMITS: Dict[str, Dict[str, str]] = {  # "<METHOD> <route>": per-"ip" and/or per-"user" buckets
+        "POST /auth/token": {"ip": "10/minute"},
+        "POST /auth/register": {"ip": "10/minute"},
+        "POST /orders/": {"ip": "60/minute", "user": "10/minute"},
+        "POST /cart/items/": {"user": "120/minute"},
+    }
+    MAX_CONCURRENT_REQUESTS: int = 0  # Requests a worker serves at once, 0 disables shedding
+    MAX_QUEUED_REQUESTS: int = 100  # Requests allowed to wait for a slot; more are shed with 503
+    REQUEST_QUEUE_TIMEOUT_SECONDS: int = 5  # Longest a request waits for a slot before it is shed
+    SHED_RETRY_AFTER_SECONDS: int = 1  # Retry-After sent with the 503
+
+    # Idempotency-Key support on POST /orders/ and the cart item POSTs
+    IDEMPOTENCY_ENABLED: bool = True
+    IDEMPOTENCY_STORE: str = "memory"  # "memory" (this process) or "redis" (shared by every worker)
+    IDEMPOTENCY_STORE_URL: str = "redis://localhost:6379/0"  # Redis-protocol server for IDEMPOTENCY_STORE=redis
+    IDEMPOTENCY_TTL_SECONDS: int = 86400  # How long a response is replayed for its key
+    IDEMPOTENCY_WAIT_SECONDS: int = 10  # Longest a duplicate waits for the first request before a 409
+    IDEMPOTENCY_LOCK_SECONDS: int = 60  # In-flight marker lifetime, above any request's duration (frees keys of dead workers)
+
+    # Transactional outbox, delivered by `python -m app.cli run-outbox-worker`
+    OUTBOX_HANDLER_MODULES: List[str] = ["app.services.order_events"]  # Modules whose @outbox_handler functions run
+    OUTBOX_BATCH_SIZE: int = 100  # Events a worker claims per transaction
+    OUTBOX_POLL_INTERVAL_SECONDS: float = 1.0  # Pause between polls once the backlog is drained
+    OUTBOX_LEASE_SECONDS: int = 300  # Claimed events become due again after this if a worker dies mid-batch
+    OUTBOX_MAX_ATTEMPTS: int = 10  # Deliveries before an event is marked failed
+    OUTBOX_BACKOFF_SECONDS: int = 5  # First retry delay, doubled per failed attempt
+    OUTBOX_MAX_BACKOFF_SECONDS: int = 3600  # Retry delay cap
+    OUTBOX_RETENTION_DAYS: int = 7  # Delivered events are purged after this
+
+    # First admin user, created by `python -m app.cli create-superuser` (never at startup)
+    FIRST_SUPERUSER: Optional[str] = None  # Default email for create-superuser
+    FIRST_SUPERUSER_PASSWORD: Optional[str] = None  # Default password for create-superuser, prompted for if unset
 
     class Config:
         # Configuration settings for Pydantic
@@ -1,17 +1,163 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from app.config import settings
+from app.metrics import (
+    TimedAsyncAdaptedQueuePool,
+    TimedQueuePool,
+    TimedReplicaAsyncAdaptedQueuePool,
+    TimedReplicaQueuePool,
+    instrument_engine
+)
+from app.utils.read_your_writes import reads_pinned_to_primary, record_user_writes
 
 # Database connection URL from settings
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
-# Create an engine to connect to the database
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# Asyncio drivers used when no explicit ASYNC_DATABASE_URL is configured
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def get_async_database_url(url: str) -> str:
+    """
+    Derive the asyncio connection URL from a sync one.
+    e.g. postgresql://... -> postgresql+asyncpg://..., sqlite:///... -> sqlite+aiosqlite:///...
+    """
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        return url  # Unknown backend, assume the URL already names an async driver
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+SQLALCHEMY_ASYNC_DATABASE_URL = (
+    settings.ASYNC_DATABASE_URL or get_async_database_url(SQLALCHEMY_DATABASE_URL)
+)
+
+
+def get_statement_timeout_args(url: str) -> dict:
+    """
+    connect_args applying DATABASE_STATEMENT_TIMEOUT_MS to every new connection.
+    Only PostgreSQL has a server-side statement timeout; other backends get none.
+    """
+    timeout = settings.DATABASE_STATEMENT_TIMEOUT_MS
+    parsed = make_url(url)
+    if timeout <= 0 or parsed.get_backend_name() != "postgresql":
+        return {}
+    if parsed.get_driver_name() == "asyncpg":
+        return {"server_settings": {"statement_timeout": str(timeout)}}
+    return {"options": f"-c statement_timeout={timeout}"}  # libpq drivers (psycopg2, psycopg)
+
+
+def get_pool_options(url: str, poolclass) -> dict:
+    """
+    Engine options for a URL: a pool class that reports checkout wait, sized and
+    recycled per the DATABASE_POOL_* settings, plus the statement timeout.
+    In-memory SQLite keeps the dialect's single-connection pool.
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        return {}
+    options = {
+        "poolclass": poolclass,
+        "pool_size": settings.DATABASE_POOL_SIZE,
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT_SECONDS,
+        "pool_pre_ping": settings.DATABASE_POOL_PRE_PING,
+        "pool_recycle": settings.DATABASE_POOL_RECYCLE_SECONDS,
+    }
+    connect_args = get_statement_timeout_args(url)
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+
+# Create an engine to connect to the database (sync path, used by scripts and CLI tools)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **get_pool_options(SQLALCHEMY_DATABASE_URL, TimedQueuePool))
+instrument_engine(engine)  # Statement timing and per-request counts for /metrics
 
 # SessionLocal is the session factory that provides a session to interact with the database
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine used by the request handlers so DB waits don't block the event loop
+async_engine = create_async_engine(
+    SQLALCHEMY_ASYNC_DATABASE_URL,
+    **get_pool_options(SQLALCHEMY_ASYNC_DATABASE_URL, TimedAsyncAdaptedQueuePool)
+)
+instrument_engine(async_engine.sync_engine)
+
+# Writes on the primary keep the writing user's reads there for READ_YOUR_WRITES_SECONDS
+for primary in (engine, async_engine.sync_engine):
+    event.listen(primary, "before_cursor_execute", record_user_writes)
+
+# AsyncSessionLocal keeps attributes loaded after commit, since lazy refreshes can't run
+# outside of an awaited call once the response is being serialized
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+# Optional read replica, for read-only sessions
+SQLALCHEMY_READ_REPLICA_URL = settings.READ_REPLICA_DATABASE_URL
+SQLALCHEMY_ASYNC_READ_REPLICA_URL = settings.READ_REPLICA_ASYNC_DATABASE_URL or (
+    get_async_database_url(SQLALCHEMY_READ_REPLICA_URL) if SQLALCHEMY_READ_REPLICA_URL else None
+)
+
+read_engine = None
+async_read_engine = None
+if SQLALCHEMY_READ_REPLICA_URL:
+    read_engine = create_engine(
+        SQLALCHEMY_READ_REPLICA_URL,
+        **get_pool_options(SQLALCHEMY_READ_REPLICA_URL, TimedReplicaQueuePool)
+    )
+    instrument_engine(read_engine)
+if SQLALCHEMY_ASYNC_READ_REPLICA_URL:
+    async_read_engine = create_async_engine(
+        SQLALCHEMY_ASYNC_READ_REPLICA_URL,
+        **get_pool_options(SQLALCHEMY_ASYNC_READ_REPLICA_URL, TimedReplicaAsyncAdaptedQueuePool)
+    )
+    instrument_engine(async_read_engine.sync_engine)
+
+
+class ReadSession(Session):
+    """
+    Session for read-only work. Statements go to the replica in info["replica_bind"], unless
+    there is none or the current request must see a recent write (see app.utils.read_your_writes),
+    in which case they go to the session's own bind, the primary. Sessions with info["catalog_reads"]
+    also follow catalog writes. Never write through it.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get("replica_bind")
+        if replica is not None and not reads_pinned_to_primary(self.info.get("catalog_reads", False)):
+            return replica
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+
+ReadSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    bind=engine,
+    class_=ReadSession,
+    info={"replica_bind": read_engine},
+)
+
+AsyncReadSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    sync_session_class=ReadSession,
+    autoflush=False,
+    expire_on_commit=False,
+    info={"replica_bind": async_read_engine.sync_engine if async_read_engine is not None else None},
+)
+
 # Base class for all model classes to inherit from
 Base = declarative_base()
 
@@ -25,3 +171,41 @@ def get_db():
         yield db  # Yield the session to the route handler
     finally:
         db.close()  # Ensure the session is closed after use
+
+
+async def get_async_db():
+    """
+    Dependency that provides an async database session.
+    Ensures that the session is correctly closed after use.
+    """
+    async with AsyncSessionLocal() as db:  # Create a new async database session
+        yield db  # Yield the session to the route handler
+
+
+def get_read_db():
+    """
+    Dependency that provides a read-only database session, served by the read replica
+    when one is configured. Use get_db for anything that writes.
+    """
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db():
+    """
+    Async variant of get_read_db, for read-heavy request handlers (order history, reports).
+    """
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
+async def get_async_catalog_read_db():
+    """
+    get_async_read_db for catalog and search handlers: their reads also stay on the primary
+    for a while after any catalog change, so the catalog cache isn't refilled from a lagging replica.
+    """
+    async with AsyncReadSessionLocal(info={"catalog_reads": True}) as db:
+        yield db
@@ -1,10 +1,10 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db, get_db
 from app.models.user import User, UserRole
-from app.services.auth import get_current_user
-from app.utils.security import verify_password
+from app.services.auth import get_current_user_async, verify_password_async
+from app.utils.principal_cache import Principal
 
 # OAuth2 password bearer token schema, used for token-based authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
@@ -19,8 +19,8 @@ def get_db_session():
 
 
 def get_current_active_user(
-        current_user: User = Depends(get_current_user)
-) -> User:
+        current_user: Principal = Depends(get_current_user_async)
+) -> Principal:
     """
     Dependency to retrieve the current active user.
     Raises HTTP 400 if the user is not active.
@@ -34,8 +34,8 @@ def get_current_active_user(
 
 
 def get_admin_user(
-        current_user: User = Depends(get_current_active_user)
-) -> User:
+        current_user: Principal = Depends(get_current_active_user)
+) -> Principal:
     """
     Dependency to verify admin privileges.
     Raises HTTP 403 if the user is not an admin.
@@ -49,8 +49,8 @@ def get_admin_user(
 
 
 def get_customer_user(
-        current_user: User = Depends(get_current_active_user)
-) -> User:
+        current_user: Principal = Depends(get_current_active_user)
+) -> Principal:
     """
     Dependency to verify customer privileges.
     Raises HTTP 403 if the user is not a customer.
@@ -65,8 +65,8 @@ def get_customer_user(
 
 def verify_current_user(
         user_id: int,
-        current_user: User = Depends(get_current_active_user)
-) -> User:
+        current_user: Principal = Depends(get_current_active_user)
+) -> Principal:
     """
     Dependency to verify if the current user owns the resource.
     Ensures the user is either the resource owner or an admin.
@@ -79,10 +79,10 @@ def verify_current_user(
     return current_user
 
 
-def get_verified_user(
+async def get_verified_user(
         user_id: int,
-        db: Session = Depends(get_db),
-        current_user: User = Depends(get_current_active_user)
+        db: AsyncSession = Depends(get_async_db),
+        current_user: Principal = Depends(get_current_active_user)
 ) -> User:
     """
     Dependency that verifies if the user exists in the database and if the current user has access to it.
@@ -94,7 +94,7 @@ def get_verified_user(
             detail="You can only access your own resources"
         )
 
-    db_user = db.query(User).filter(User.id == user_id).first()
+    db_user = await db.get(User, user_id)
     if not db_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -103,15 +103,18 @@ def get_verified_user(
     return db_user
 
 
-def get_password_verifier(
+async def get_password_verifier(
         plain_password: str,
-        current_user: User = Depends(get_current_active_user)
+        db: AsyncSession = Depends(get_async_db),
+        current_user: Principal = Depends(get_current_active_user)
 ) -> bool:
     """
     Dependency to verify the user's password.
+    The cached principal carries no password hash, so the user row is loaded for it.
     Raises HTTP 401 if the password is incorrect.
     """
-    if not verify_password(plain_password, current_user.hashed_password):
+    db_user = await db.get(User, current_user.id)
+    if db_user is None or not await verify_password_async(plain_password, db_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect password"
@@ -0,0 +1,431 @@
+import abc
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Union
+from starlette.responses import JSONResponse
+from app.config import settings
+from app.metrics import IDEMPOTENCY_CONFLICTS, IDEMPOTENT_REPLAYS
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_STORE_KINDS = ("memory", "redis")
+
+HEADER = b"idempotency-key"
+REPLAYED_HEADER = (b"idempotent-replayed", b"true")
+MAX_KEY_LENGTH = 255
+PURGE_INTERVAL_SECONDS = 60  # How often the memory store drops expired entries
+
+# Writes that aren't naturally idempotent: a retry would create a second order or add the
+# quantity again. Setting or removing a cart item (PUT/DELETE) is safe to repeat as it is.
+IDEMPOTENT_ROUTES = {
+    ("POST", "/orders/"),
+    ("POST", "/cart/items/"),
+    ("POST", "/cart/items/batch"),
+}
+
+
+@dataclass
+class StoredResponse:
+    """A completed response as sent to the client, replayed byte for byte."""
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+    def to_dict(self) -> dict:
+        """JSON-safe form, for stores that hold strings."""
+        return {
+            "status": self.status,
+            "headers": [[name.decode("latin-1"), value.decode("latin-1")] for name, value in self.headers],
+            "body": base64.b64encode(self.body).decode("ascii"),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "StoredResponse":
+        return cls(
+            status=data["status"],
+            headers=[(name.encode("latin-1"), value.encode("latin-1")) for name, value in data["headers"]],
+            body=base64.b64decode(data["body"]),
+        )
+
+
+@dataclass
+class InFlight:
+    """Another request holding the same key is still running."""
+    fingerprint: str
+
+
+@dataclass
+class Completed:
+    """The key's first request finished; its response is stored."""
+    fingerprint: str
+    response: StoredResponse
+
+
+class Acquired:
+    """This request holds the key and must complete() or release() it."""
+
+    def __init__(self, token: str):
+        self.token = token
+
+
+Outcome = Union[Acquired, InFlight, Completed]
+
+
+class IdempotencyStore(abc.ABC):
+    """
+    Holds one entry per idempotency key: an in-flight marker while the first request runs
+    (expiring after `lock_seconds`, should its worker die), then the stored response for `ttl_seconds`.
+    """
+
+    @abc.abstractmethod
+    async def begin(self, key: str, fingerprint: str, lock_seconds: float) -> Outcome:
+        """Atomically take the key, or report who has it."""
+
+    @abc.abstractmethod
+    async def complete(self, key: str, token: str, fingerprint: str, response: StoredResponse,
+                       ttl_seconds: float) -> None:
+        """Store the response of the request holding the key and wake its waiters."""
+
+    @abc.abstractmethod
+    async def release(self, key: str, token: str) -> None:
+        """Drop the in-flight marker without a response, so a retry executes again."""
+
+    @abc.abstractmethod
+    async def wait(self, key: str, timeout: float) -> None:
+        """Return once the key's in-flight request may have finished, or after `timeout` seconds."""
+
+    async def close(self) -> None:
+        """Release connections held by the store."""
+
+
+@dataclass
+class _MemoryEntry:
+    fingerprint: str
+    token: Optional[str]
+    expires_at: float
+    response: Optional[StoredResponse] = None
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """
+    Entries in a dict of this process; waiters block on an event rather than polling.
+    begin/complete/release never await, so each is atomic on the event loop. Keys are only
+    seen by this worker: meant for tests and single-process deployments.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, _MemoryEntry] = {}
+        self._next_purge = 0.0
+
+    def _get(self, key: str) -> Optional[_MemoryEntry]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            entry.done.set()
+            return None
+        return entry
+
+    def _purge_expired(self) -> None:
+        now = time.monotonic()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + PURGE_INTERVAL_SECONDS
+        for key in [key for key, entry in self._entries.items() if entry.expires_at <= now]:
+            self._entries.pop(key).done.set()
+
+    async def begin(self, key: str, fingerprint: str, lock_seconds: float) -> Outcome:
+        entry = self._get(key)
+        if entry is None:
+            self._purge_expired()
+            token = uuid.uuid4().hex
+            self._entries[key] = _MemoryEntry(fingerprint, token, time.monotonic() + lock_seconds)
+            return Acquired(token)
+        if entry.response is not None:
+            return Completed(entry.fingerprint, entry.response)
+        return InFlight(entry.fingerprint)
+
+    async def complete(self, key: str, token: str, fingerprint: str, response: StoredResponse,
+                       ttl_seconds: float) -> None:
+        entry = self._entries.get(key)
+        if entry is None or entry.token != token:
+            # Our marker expired and someone else took the key; keep our response anyway
+            entry = self._entries[key] = _MemoryEntry(fingerprint, None, 0)
+        entry.response = response
+        entry.expires_at = time.monotonic() + ttl_seconds
+        entry.done.set()
+
+    async def release(self, key: str, token: str) -> None:
+        entry = self._entries.get(key)
+        if entry is not None and entry.token == token and entry.response is None:
+            del self._entries[key]
+            entry.done.set()
+
+    async def wait(self, key: str, timeout: float) -> None:
+        entry = self._get(key)
+        if entry is None or entry.response is not None:
+            return
+        try:
+            await asyncio.wait_for(entry.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class RedisIdempotencyStore(IdempotencyStore):
+    """
+    Entries in a Redis-protocol server, shared by every worker, as JSON strings under
+    `idempotency:<key>`. The in-flight marker is taken with SET NX and expires on its own;
+    waiters poll the key every `poll_seconds`. Needs the optional `redis` package.
+    """
+
+    def __init__(self, url: str, client=None, poll_seconds: float = 0.05):
+        if client is None:
+            try:
+                from redis import asyncio as redis
+            except ImportError as e:
+                raise RuntimeError("IDEMPOTENCY_STORE=redis needs the redis package: pip install redis") from e
+            client = redis.from_url(url, decode_responses=True)
+        self._client = client
+        self.poll_seconds = poll_seconds
+
+    def _key(self, key: str) -> str:
+        return f"idempotency:{key}"
+
+    def _decode(self, raw: Optional[str]) -> Optional[Union[InFlight, Completed]]:
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        if "response" in data:
+            return Completed(data["fingerprint"], StoredResponse.from_dict(data["response"]))
+        return InFlight(data["fingerprint"])
+
+    async def begin(self, key: str, fingerprint: str, lock_seconds: float) -> Outcome:
+        token = uuid.uuid4().hex
+        marker = json.dumps({"fingerprint": fingerprint, "token": token})
+        while True:
+            if await self._client.set(self._key(key), marker, nx=True, px=int(lock_seconds * 1000)):
+                return Acquired(token)
+            outcome = self._decode(await self._client.get(self._key(key)))
+            if outcome is not None:  # Else it expired in between: try to take it again
+                return outcome
+
+    async def complete(self, key: str, token: str, fingerprint: str, response: StoredResponse,
+                       ttl_seconds: float) -> None:
+        value = json.dumps({"fingerprint": fingerprint, "response": response.to_dict()})
+        await self._client.set(self._key(key), value, px=int(ttl_seconds * 1000))
+
+    async def release(self, key: str, token: str) -> None:
+        from redis.exceptions import WatchError
+
+        async with self._client.pipeline(transaction=True) as pipe:
+            try:
+                # Only delete our own marker, not a response or a marker taken after ours expired
+                await pipe.watch(self._key(key))
+                raw = await pipe.get(self._key(key))
+                if raw is None or json.loads(raw).get("token") != token:
+                    return
+                pipe.multi()
+                pipe.delete(self._key(key))
+                await pipe.execute()
+            except WatchError:
+                pass
+
+    async def wait(self, key: str, timeout: float) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            outcome = self._decode(await self._client.get(self._key(key)))
+            if not isinstance(outcome, InFlight):
+                return
+            await asyncio.sleep(min(self.poll_seconds, max(0.0, deadline - time.monotonic())))
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def create_idempotency_store(kind: str, url: Optional[str] = None) -> IdempotencyStore:
+    if kind not in IDEMPOTENCY_STORE_KINDS:
+        raise ValueError(f"Unknown idempotency store: {kind}")
+    if kind == "redis":
+        return RedisIdempotencyStore(url)
+    return MemoryIdempotencyStore()
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for header_name, value in scope["headers"]:
+        if header_name == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _bearer_subject(scope) -> Optional[str]:
+    authorization = _header(scope, b"authorization")
+    if authorization is None:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    from app.services.auth import token_subject
+    return token_subject(token)
+
+
+async def _read_body(receive) -> Tuple[bytes, bool]:
+    """The whole request body, and whether the client disconnected while sending it."""
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return b"".join(chunks), True
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(chunks), False
+
+
+def _replaying_receive(body: bytes, receive):
+    """ASGI receive handing the app the already-read `body`, then deferring to `receive`."""
+    body_sent = False
+
+    async def replay_receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()  # Waits for the client to disconnect
+
+    return replay_receive
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware honouring an `Idempotency-Key` header on IDEMPOTENT_ROUTES.
+    The first request with a key runs normally and its response (unless a 5xx, which
+    the client may retry) is stored for IDEMPOTENCY_TTL_SECONDS. Repeats get the stored
+    bytes back with `Idempotent-Replayed: true`, without running the route; repeats that
+    arrive while the first is still running wait for it. Keys are scoped to the user (the
+    access token's subject) and route, and reusing one with a different body is a 422.
+    Requests without the header, or without a valid token, pass through untouched, and so
+    do all requests while the store fails: like the rate limiter, it fails open.
+    """
+
+    def __init__(self, app, store: Optional[IdempotencyStore] = None):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if (self.store is None or scope["type"] != "http"
+                or (scope["method"], scope["path"]) not in IDEMPOTENT_ROUTES):
+            await self.app(scope, receive, send)
+            return
+        idempotency_key = _header(scope, HEADER)
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            await self._error(scope, receive, send, 400,
+                              f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+            return
+        subject = _bearer_subject(scope)
+        if subject is None:
+            await self.app(scope, receive, send)  # The route answers 401
+            return
+
+        body, disconnected = await _read_body(receive)
+        if disconnected:
+            return
+        fingerprint = hashlib.sha256(body).hexdigest()
+        key = f"{subject}:{scope['method']} {scope['path']}:{idempotency_key}"
+
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            try:
+                outcome = await self.store.begin(key, fingerprint, settings.IDEMPOTENCY_LOCK_SECONDS)
+            except Exception as e:
+                await self._pass_through(scope, body, receive, send, e)
+                return
+            if isinstance(outcome, Acquired):
+                break
+            if outcome.fingerprint != fingerprint:
+                IDEMPOTENCY_CONFLICTS.labels(scope["path"], "mismatch").inc()
+                await self._error(scope, receive, send, 422,
+                                  "Idempotency-Key was already used with a different request body")
+                return
+            if isinstance(outcome, Completed):
+                IDEMPOTENT_REPLAYS.labels(scope["path"]).inc()
+                await self._replay(outcome.response, send)
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                IDEMPOTENCY_CONFLICTS.labels(scope["path"], "in_progress").inc()
+                await self._error(scope, receive, send, 409,
+                                  "A request with this Idempotency-Key is still in progress",
+                                  headers={"Retry-After": "1"})
+                return
+            try:
+                await self.store.wait(key, remaining)
+            except Exception as e:
+                await self._pass_through(scope, body, receive, send, e)
+                return
+
+        await self._run(scope, body, receive, send, key, outcome.token, fingerprint)
+
+    async def _run(self, scope, body: bytes, receive, send, key: str, token: str, fingerprint: str) -> None:
+        """Run the route for the key's holder, recording what it sends."""
+        status, headers, chunks = 500, [], []
+
+        async def recording_send(message):
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status, headers = message["status"], list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, _replaying_receive(body, receive), recording_send)
+        except BaseException:
+            await self._release(scope, key, token)
+            raise
+        if status >= 500:
+            await self._release(scope, key, token)
+            return
+        response = StoredResponse(status, headers, b"".join(chunks))
+        try:
+            await self.store.complete(key, token, fingerprint, response, settings.IDEMPOTENCY_TTL_SECONDS)
+        except Exception as e:
+            # The response already went out; a retry will run the route again
+            logger.warning(f"Storing idempotent response for {scope['path']} failed: {e}")
+
+    async def _release(self, scope, key: str, token: str) -> None:
+        try:
+            await self.store.release(key, token)
+        except Exception as e:
+            # Keep the route's outcome; the marker expires after IDEMPOTENCY_LOCK_SECONDS anyway
+            logger.warning(f"Releasing Idempotency-Key for {scope['path']} failed: {e}")
+
+    async def _pass_through(self, scope, body: bytes, receive, send, error: Exception) -> None:
+        """Run the route without idempotency, for when the store fails."""
+        # Fail open: an unreachable store must not take checkout down with it
+        logger.warning(f"Idempotency store failed for {scope['path']}, running the request without it: {error}")
+        await self.app(scope, _replaying_receive(body, receive), send)
+
+    async def _replay(self, response: StoredResponse, send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": response.status,
+            "headers": response.headers + [REPLAYED_HEADER],
+        })
+        await send({"type": "http.response.body", "body": response.body})
+
+    async def _error(self, scope, receive, send, status_code: int, detail: str, headers: dict = None) -> None:
+        await JSONResponse({"detail": detail}, status_code=status_code, headers=headers)(scope, receive, send)
+
+
+# Shared store used by the middleware (None when disabled)
+idempotency_store = create_idempotency_store(
+    settings.IDEMPOTENCY_STORE, settings.IDEMPOTENCY_STORE_URL
+) if settings.IDEMPOTENCY_ENABLED else None
@@ -1,16 +1,24 @@
+import asyncio
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import engine, Base
-from app.routes import auth, product, cart, order
+from app.routes import admin, auth, product, category, cart, order, metrics, uploads
+from app.metrics import MetricsMiddleware
+from app.idempotency import IdempotencyMiddleware, idempotency_store
+from app.rate_limit import RateLimitMiddleware, concurrency_limiter, rate_limiter
 from app.config import settings
-from fastapi.staticfiles import StaticFiles
 
-# Create all tables in the database
-Base.metadata.create_all(bind=engine)
+# The schema is managed by Alembic (`alembic upgrade head`) and the first admin is created with
+# `python -m app.cli create-superuser`, so importing and starting the app never touches the database
 
 # Initialize FastAPI application
 app = FastAPI()
 
+# Idempotency-Key replays for checkout and cart writes, innermost so only admitted requests run
+app.add_middleware(IdempotencyMiddleware, store=idempotency_store)
+
+# Per-route rate limits and load shedding, inside CORS so rejections still carry its headers
+app.add_middleware(RateLimitMiddleware, rate_limiter=rate_limiter, concurrency_limiter=concurrency_limiter)
+
 # CORS (Cross-Origin Resource Sharing) configuration
 app.add_middleware(
     CORSMiddleware,
@@ -20,14 +28,18 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
-# Serve static files from the "uploads" directory under the "/uploads" path
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# Per-route latency and SQL statement metrics, exposed at /metrics
+app.add_middleware(MetricsMiddleware)
 
-# Include routers for authentication, products, cart, and orders
+# Include routers for authentication, products, categories, cart, orders, admin tools, metrics, and uploaded files
 app.include_router(auth.router)
 app.include_router(product.router)
+app.include_router(category.router)
 app.include_router(cart.router)
 app.include_router(order.router)
+app.include_router(admin.router)
+app.include_router(metrics.router)
+app.include_router(uploads.router)
 
 
 @app.get("/")
@@ -39,28 +51,60 @@ def read_root():
 
 
 @app.on_event("startup")
-def startup_event():
+async def start_cart_write_behind():
+    """
+    With a cart store configured, persist changed carts every CART_FLUSH_INTERVAL_SECONDS.
     """
-    Event triggered at startup. Creates the first superuser if it doesn't already exist.
-    This ensures an admin user is always available for the system.
+    from app.services.cart import run_cart_write_behind
+    from app.utils.cart_store import cart_store
+
+    if cart_store is not None:
+        app.state.cart_write_behind = asyncio.create_task(
+            run_cart_write_behind(settings.CART_FLUSH_INTERVAL_SECONDS)
+        )
+
+
+@app.on_event("shutdown")
+async def stop_cart_write_behind():
+    """
+    Stop the periodic cart flush, persist what is still dirty and close the cart store.
+    """
+    from app.services.cart import flush_dirty_carts
+    from app.utils.cart_store import cart_store
+
+    task = getattr(app.state, "cart_write_behind", None)
+    if task is not None:
+        task.cancel()
+    if cart_store is not None:
+        await flush_dirty_carts()
+        await cart_store.close()
+
+
+@app.on_event("shutdown")
+async def close_rate_limiter():
     """
-    from app.database import SessionLocal
-    from app.models.user import User
-    from app.utils.security import get_password_hash
-
-    db = SessionLocal()
-    try:
-        # Check if the superuser already exists
-        user = db.query(User).filter(User.email == settings.FIRST_SUPERUSER).first()
-        if not user:
-            # Create and add the superuser to the database if it doesn't exist
-            db_user = User(
-                email=settings.FIRST_SUPERUSER,
-                hashed_password=get_password_hash(settings.FIRST_SUPERUSER_PASSWORD),
-                is_active=True,
-                role="admin"
-            )
-            db.add(db_user)
-            db.commit()
-    finally:
-        db.close()
+    Close the rate limit backend's connections.
+    """
+    if rate_limiter is not None:
+        await rate_limiter.close()
+
+
+@app.on_event("shutdown")
+async def close_idempotency_store():
+    """
+    Close the idempotency store's connections.
+    """
+    if idempotency_store is not None:
+        await idempotency_store.close()
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    """
+    Event triggered at shutdown. Stops the password hashing and image workers.
+    """
+    from app.utils.image_variants import image_variant_pool
+    from app.utils.password_pool import password_pool
+
+    password_pool.shutdown()
+    image_variant_pool.shutdown()
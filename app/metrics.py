@@ -0,0 +1,238 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+from prometheus_client import Counter as PromCounter, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# HTTP metrics
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+
+# SQL metrics
+SQL_STATEMENT_DURATION = Histogram(
+    "db_statement_duration_seconds",
+    "Duration of individual SQL statements",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+SQL_STATEMENTS_PER_REQUEST = Histogram(
+    "db_statements_per_request",
+    "Number of SQL statements issued while serving one request",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144),
+)
+SQL_TIME_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds",
+    "Total time spent in SQL statements while serving one request",
+    ["method", "route"],
+)
+POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the pool",
+    ["engine"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+N_PLUS_ONE_WARNINGS = PromCounter(
+    "db_n_plus_one_warnings_total",
+    "Requests in which one statement shape repeated more than SQL_N_PLUS_ONE_THRESHOLD times",
+    ["method", "route"],
+)
+
+IDEMPOTENT_REPLAYS = PromCounter(
+    "idempotent_replays_total",
+    "Requests answered with the stored response of an earlier request with the same Idempotency-Key",
+    ["route"],
+)
+IDEMPOTENCY_CONFLICTS = PromCounter(
+    "idempotency_conflicts_total",
+    "Idempotency-Key requests rejected: reused with another body (422) or still in progress (409)",
+    ["route", "reason"],
+)
+
+
+class RequestSqlStats:
+    """SQL activity recorded for the request currently being served."""
+    __slots__ = ("statements", "duration", "shapes")
+
+    def __init__(self):
+        self.statements = 0
+        self.duration = 0.0
+        self.shapes: Counter = Counter()
+
+
+# Stats of the in-flight request; SQLAlchemy's async greenlets inherit the request's context
+current_request_sql: ContextVar[Optional[RequestSqlStats]] = ContextVar("current_request_sql", default=None)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_start_time"].pop()
+    operation = statement.lstrip().split(" ", 1)[0].upper() or "UNKNOWN"
+    SQL_STATEMENT_DURATION.labels(operation).observe(duration)
+
+    stats = current_request_sql.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.duration += duration
+        if settings.SQL_N_PLUS_ONE_THRESHOLD > 0:
+            stats.shapes[_WHITESPACE.sub(" ", statement)] += 1  # Bound parameters keep the shape stable
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attach the statement timing hooks to a (sync) engine."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class _TimedCheckoutMixin:
+    """Records how long each pool checkout waits for a connection."""
+    metrics_label = "default"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_WAIT.labels(self.metrics_label).observe(time.perf_counter() - start)
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    """QueuePool for the sync engine that reports checkout wait."""
+    metrics_label = "sync"
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool for the async engine that reports checkout wait."""
+    metrics_label = "async"
+
+
+class TimedReplicaQueuePool(TimedQueuePool):
+    """TimedQueuePool for the sync read-replica engine."""
+    metrics_label = "sync_replica"
+
+
+class TimedReplicaAsyncAdaptedQueuePool(TimedAsyncAdaptedQueuePool):
+    """TimedAsyncAdaptedQueuePool for the async read-replica engine."""
+    metrics_label = "async_replica"
+
+
+def _route_label(scope) -> str:
+    """Route template (e.g. /orders/{order_id}) rather than the raw path, to bound label cardinality."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "<unmatched>"
+
+
+def _report_n_plus_one(method: str, route: str, stats: RequestSqlStats) -> None:
+    threshold = settings.SQL_N_PLUS_ONE_THRESHOLD
+    repeated = [(shape, count) for shape, count in stats.shapes.items() if count > threshold]
+    if not repeated:
+        return
+    N_PLUS_ONE_WARNINGS.labels(method, route).inc()
+    for shape, count in repeated:
+        logger.warning(f"Possible N+1 in {method} {route}: statement ran {count} times: {shape[:300]}")
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-route latency and the SQL work each request does.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = RequestSqlStats()
+        token = current_request_sql.set(stats)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_request_sql.reset(token)
+
+            method, route = scope["method"], _route_label(scope)
+            REQUEST_LATENCY.labels(method, route, str(status_code)).observe(elapsed)
+            SQL_STATEMENTS_PER_REQUEST.labels(method, route).observe(stats.statements)
+            SQL_TIME_PER_REQUEST.labels(method, route).observe(stats.duration)
+            if stats.shapes:
+                _report_n_plus_one(method, route, stats)
+
+
+class AppStatsCollector:
+    """Exports the counters kept by the in-process pools and caches at scrape time."""
+
+    def collect(self):
+        from app.utils.catalog_cache import catalog_cache
+        from app.utils.password_pool import password_pool
+        from app.utils.principal_cache import principal_cache
+        from app.rate_limit import concurrency_limiter, rate_limiter
+
+        pool = password_pool.stats()
+        yield GaugeMetricFamily("password_pool_in_flight", "Password hash/verify calls running or queued",
+                                value=pool["in_flight"])
+        yield GaugeMetricFamily("password_pool_queued", "Password hash/verify calls waiting for a worker",
+                                value=pool["queued"])
+        yield GaugeMetricFamily("password_pool_saturation", "Fraction of password pool capacity in use",
+                                value=pool["saturation"])
+        yield CounterMetricFamily("password_pool_completed", "Password hash/verify calls completed",
+                                  value=pool["completed_total"])
+        yield CounterMetricFamily("password_pool_rejected", "Password hash/verify calls rejected with 503",
+                                  value=pool["rejected_total"])
+
+        if rate_limiter is not None:
+            limiter = rate_limiter.stats()
+            yield CounterMetricFamily("rate_limit_rejected", "Requests rejected with 429 by a rate limit",
+                                      value=limiter["rejected_total"])
+            yield CounterMetricFamily("rate_limit_errors", "Rate limit checks that failed open",
+                                      value=limiter["errors_total"])
+        if concurrency_limiter is not None:
+            load = concurrency_limiter.stats()
+            yield GaugeMetricFamily("requests_in_flight", "Requests being served by this worker",
+                                    value=load["in_flight"])
+            yield GaugeMetricFamily("requests_queued", "Requests waiting for a concurrency slot",
+                                    value=load["queued"])
+            yield CounterMetricFamily("requests_shed", "Requests shed with 503 under load",
+                                      value=load["shed_total"])
+
+        for name, cache in (("principal", principal_cache), ("catalog", catalog_cache)):
+            cache_stats = cache.stats()
+            yield GaugeMetricFamily(f"{name}_cache_size", f"Entries in the {name} cache",
+                                    value=cache_stats["size"])
+            yield CounterMetricFamily(f"{name}_cache_hits", f"{name.capitalize()} cache hits",
+                                      value=cache_stats["hits"])
+            yield CounterMetricFamily(f"{name}_cache_misses", f"{name.capitalize()} cache misses",
+                                      value=cache_stats["misses"])
+            yield CounterMetricFamily(f"{name}_cache_invalidations", f"{name.capitalize()} cache invalidations",
+                                      value=cache_stats["invalidations"])
+
+
+REGISTRY.register(AppStatsCollector())
@@ -0,0 +1,3 @@
+# Import every model so relationship() targets given by name ("Order", "CartItem", ...)
+# resolve no matter which model module is imported first
+from app.models import cart, category, image, order, outbox, product, sales, user  # noqa: F401
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String
+from sqlalchemy.orm import relationship
+from app.models.base import Base
+
+# Represents a product category; product_count is maintained incrementally as
+# products are added, moved or deleted, so category navigation never scans products
+class Category(Base):
+    __tablename__ = "categories"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, nullable=False)
+    product_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    products = relationship("Product", back_populates="category_ref")
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from app.models.base import Base
+
+# Represents an uploaded image file in the content-addressed store, shared by every
+# product whose local_image_path points at it
+class StoredImage(Base):
+    __tablename__ = "stored_images"
+
+    path = Column(String, primary_key=True)  # uploads/images/<aa>/<sha256>.<ext>
+    sha256 = Column(String(64), index=True, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)  # Products referencing this file
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
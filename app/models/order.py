@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.models.base import Base
@@ -16,15 +16,20 @@ class Order(Base):
     user = relationship("User", back_populates="orders")
     items = relationship("OrderItem", back_populates="order")
 
+    __table_args__ = (
+        Index("ix_orders_created_at_id", "created_at", "id"),  # Date-range exports in (created_at, id) order
+    )
+
 # Represents an individual item within an order
 class OrderItem(Base):
     __tablename__ = "order_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"))
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)  # Joins from orders
     product_id = Column(Integer, ForeignKey("products.id"))
     quantity = Column(Integer)
     price_at_purchase = Column(Float)
+    category_id = Column(Integer, ForeignKey("categories.id"))  # Product's category at the time of the sale
 
     order = relationship("Order", back_populates="items")
     product = relationship("Product", back_populates="order_items")
@@ -0,0 +1,23 @@
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Index, Integer, JSON, String
+from app.models.base import Base
+
+# Transactional outbox: events written in the same transaction as the change they describe
+# (see app/services/outbox.py), then delivered to handlers by the outbox worker.
+# Times are naive UTC, set by the application so every comparison uses one clock.
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+
+    id = Column(Integer, primary_key=True)
+    topic = Column(String, nullable=False)  # e.g. "order.created"
+    payload = Column(JSON, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending, done or failed (gave up retrying)
+    attempts = Column(Integer, nullable=False, default=0)  # Deliveries started, counted when claimed
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # Next delivery, or end of a worker's lease
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = Column(DateTime)  # When it was delivered or given up on
+    last_error = Column(String)
+
+    __table_args__ = (
+        Index("ix_outbox_events_status_available_at", "status", "available_at"),  # Claim scan
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float
+from sqlalchemy import Column, Integer, String, Float, Index, JSON, DDL, ForeignKey, event
 from sqlalchemy.orm import relationship
 from app.models.base import Base
 
@@ -7,12 +7,68 @@ class Product(Base):
     __tablename__ = "products"
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, index=True)
+    sku = Column(String, unique=True)  # Merchant's stock keeping unit, the key bulk imports upsert on
+    name = Column(String, index=True, nullable=False)
     description = Column(String)
-    price = Column(Float)
+    price = Column(Float, nullable=False)
     image_url = Column(String)
     local_image_path = Column(String)
-    category = Column(String)
+    image_variants = Column(JSON)  # Resized copies of local_image_path, e.g. {"thumbnail": path, "thumbnail_webp": path}
+    category = Column(String)  # Category name, kept on the row for responses and the search index
+    category_id = Column(Integer, ForeignKey("categories.id"))  # Set from `category` on flush, see app/services/category.py
 
+    category_ref = relationship("Category", back_populates="products")
     cart_items = relationship("CartItem", back_populates="product")
     order_items = relationship("OrderItem", back_populates="product")
+
+    # Composite indexes backing keyset pagination on GET /products/
+    __table_args__ = (
+        Index("ix_products_name_id", "name", "id"),
+        Index("ix_products_price_id", "price", "id"),
+        Index("ix_products_category_id_id", "category_id", "id"),  # Category filter, in id order
+    )
+
+
+# Full-text search index behind GET /products/search, created alongside the table.
+# Both variants are maintained by the database itself, so every write path stays in sync.
+
+# PostgreSQL: weighted tsvector as a generated column (name > category > description) with a
+# GIN index, plus a trigram index on name for partial words and typos
+POSTGRES_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """ALTER TABLE products ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(category, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'C')
+    ) STORED""",
+    "CREATE INDEX ix_products_search_vector ON products USING gin (search_vector)",
+    "CREATE INDEX ix_products_name_trgm ON products USING gin (name gin_trgm_ops)",
+]
+
+# SQLite (local runs): external-content FTS5 table kept in sync by triggers
+SQLITE_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE products_fts USING fts5(
+        name, description, category, content='products', content_rowid='id',
+        tokenize='porter unicode61', prefix='2 3'
+    )""",
+    """CREATE TRIGGER products_fts_insert AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description, new.category);
+    END""",
+    """CREATE TRIGGER products_fts_delete AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description, category)
+        VALUES ('delete', old.id, old.name, old.description, old.category);
+    END""",
+    """CREATE TRIGGER products_fts_update AFTER UPDATE OF name, description, category ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description, category)
+        VALUES ('delete', old.id, old.name, old.description, old.category);
+        INSERT INTO products_fts(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description, new.category);
+    END""",
+]
+
+for statement in POSTGRES_SEARCH_DDL:
+    event.listen(Product.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+for statement in SQLITE_SEARCH_DDL:
+    event.listen(Product.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(Product.__table__, "before_drop", DDL("DROP TABLE IF EXISTS products_fts").execute_if(dialect="sqlite"))
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Date, Float, ForeignKey, Integer
+from app.models.base import Base
+
+# Sales rollups: revenue and units per day, maintained incrementally by the order services
+# (create, cancel, status changes) so analytics never scan order_items.
+# Cancelled orders are not counted.
+
+# Totals per day
+class DailySales(Base):
+    __tablename__ = "sales_daily"
+
+    day = Column(Date, primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+
+# Totals per day and product
+class DailyProductSales(Base):
+    __tablename__ = "sales_daily_products"
+
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+
+# Totals per day and category, attributed to the product's category at the time of the sale
+class DailyCategorySales(Base):
+    __tablename__ = "sales_daily_categories"
+
+    day = Column(Date, primary_key=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), primary_key=True)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
@@ -0,0 +1,380 @@
+import abc
+import asyncio
+import logging
+import math
+import re
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+from starlette.responses import JSONResponse
+from starlette.routing import compile_path
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_BACKENDS = ("memory", "redis")
+
+# Always served, even under overload: health checks and metric scrapes
+EXEMPT_PATHS = {"/", "/metrics"}
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+_RULE = re.compile(r"^\s*(\d+)\s*/\s*(second|minute|hour|day)\s*$")
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    """A token bucket holding `burst` tokens and refilling at `rate` tokens per second."""
+    rate: float
+    burst: int
+
+    @classmethod
+    def parse(cls, text: str) -> "RateLimitRule":
+        """Parse "<requests>/<second|minute|hour|day>": bursts up to <requests>, refilled over the period."""
+        match = _RULE.match(text)
+        if match is None:
+            raise ValueError(f"Invalid rate limit {text!r}, expected e.g. '10/minute'")
+        requests = int(match.group(1))
+        if requests < 1:
+            raise ValueError(f"Invalid rate limit {text!r}, needs at least one request per period")
+        return cls(rate=requests / PERIODS[match.group(2)], burst=requests)
+
+
+@dataclass(frozen=True)
+class RouteLimits:
+    """The buckets one route draws from: one per client IP and/or one per authenticated user."""
+    name: str  # "<METHOD> <path>", as configured in RATE_LIMITS
+    method: str
+    path_regex: re.Pattern
+    per_ip: Optional[RateLimitRule] = None
+    per_user: Optional[RateLimitRule] = None
+
+
+class RateLimitBackend(abc.ABC):
+    """
+    Storage for token buckets. `take` removes one token from each of a request's buckets
+    (creating them full) and must be atomic, so concurrent requests never overspend a bucket.
+    """
+
+    @abc.abstractmethod
+    async def take(self, buckets: Sequence[Tuple[str, RateLimitRule]]) -> float:
+        """
+        Take a token from every (key, rule) bucket, or from none of them: 0 if each had one, else
+        the seconds until all will. A bucket that rejects a request never costs the others a token.
+        """
+
+    async def close(self) -> None:
+        """Release connections held by the backend."""
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    Buckets in a dict of this process. `take` never awaits, so it is atomic on the event loop.
+    Limits are per worker: with N uvicorn workers a client gets up to N times the configured
+    rate. Keeps the `max_keys` most recently used buckets; an evicted bucket comes back full.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()  # key -> (tokens, updated)
+
+    async def take(self, buckets: Sequence[Tuple[str, RateLimitRule]]) -> float:
+        now = time.monotonic()
+        levels = []
+        for key, rule in buckets:
+            tokens, updated = self._buckets.pop(key, (rule.burst, now))
+            levels.append(min(rule.burst, tokens + (now - updated) * rule.rate))
+        wait = max([(1 - tokens) / rule.rate for tokens, (_, rule) in zip(levels, buckets) if tokens < 1],
+                   default=0.0)
+        for (key, _), tokens in zip(buckets, levels):
+            self._buckets[key] = (tokens - 1 if wait == 0 else tokens, now)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Buckets in a Redis-protocol server, shared by every worker so limits hold across the
+    deployment. Each bucket is a hash `ratelimit:<key>`; a request's buckets are checked and
+    charged together by one Lua script (one round trip, atomic on the server, timed by the
+    server clock), and each expires once it would be full.
+    Needs Redis 5+ (or a compatible server) and the optional `redis` package.
+    """
+
+    # KEYS are the buckets, ARGV their rate and burst in pairs
+    TAKE_SCRIPT = """
+        local clock = redis.call('TIME')
+        local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+        local levels = {}
+        local wait = 0
+        for i, key in ipairs(KEYS) do
+            local rate = tonumber(ARGV[2 * i - 1])
+            local burst = tonumber(ARGV[2 * i])
+            local bucket = redis.call('HMGET', key, 'tokens', 'updated')
+            local tokens = tonumber(bucket[1]) or burst
+            local updated = tonumber(bucket[2]) or now
+            tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+            if tokens < 1 then
+                wait = math.max(wait, (1 - tokens) / rate)
+            end
+            levels[i] = tokens
+        end
+        for i, key in ipairs(KEYS) do
+            local rate = tonumber(ARGV[2 * i - 1])
+            local burst = tonumber(ARGV[2 * i])
+            local tokens = levels[i]
+            if wait == 0 then
+                tokens = tokens - 1
+            end
+            redis.call('HSET', key, 'tokens', tostring(tokens), 'updated', tostring(now))
+            redis.call('PEXPIRE', key, math.ceil(burst / rate * 1000))
+        end
+        return tostring(wait)
+    """
+
+    def __init__(self, url: str, client=None):
+        if client is None:
+            try:
+                from redis import asyncio as redis
+            except ImportError as e:
+                raise RuntimeError("RATE_LIMIT_BACKEND=redis needs the redis package: pip install redis") from e
+            client = redis.from_url(url, decode_responses=True)
+        self._client = client
+        self._take = client.register_script(self.TAKE_SCRIPT)
+
+    async def take(self, buckets: Sequence[Tuple[str, RateLimitRule]]) -> float:
+        # Lua numbers come back truncated to integers, hence the string
+        return float(await self._take(
+            keys=[f"ratelimit:{key}" for key, _ in buckets],
+            args=[value for _, rule in buckets for value in (rule.rate, rule.burst)],
+        ))
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def create_rate_limit_backend(kind: str, url: Optional[str] = None) -> RateLimitBackend:
+    if kind not in RATE_LIMIT_BACKENDS:
+        raise ValueError(f"Unknown rate limit backend: {kind}")
+    if kind == "redis":
+        return RedisRateLimitBackend(url)
+    return MemoryRateLimitBackend()
+
+
+def parse_route_limits(limits: Dict[str, Dict[str, str]]) -> List[RouteLimits]:
+    """
+    Build RouteLimits from RATE_LIMITS, e.g. {"POST /orders/": {"ip": "60/minute", "user": "10/minute"}}.
+    Paths are route templates, so "/orders/{order_id}/cancel" matches every order.
+    """
+    routes = []
+    for name, rules in limits.items():
+        method, _, path = name.partition(" ")
+        unknown = set(rules) - {"ip", "user"}
+        if not path or unknown:
+            raise ValueError(f"Invalid rate limit entry {name!r}: {rules!r}")
+        routes.append(RouteLimits(
+            name=name,
+            method=method.upper(),
+            path_regex=compile_path(path)[0],
+            per_ip=RateLimitRule.parse(rules["ip"]) if "ip" in rules else None,
+            per_user=RateLimitRule.parse(rules["user"]) if "user" in rules else None,
+        ))
+    return routes
+
+
+def _bearer_token(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            return token if scheme.lower() == "bearer" and token else None
+    return None
+
+
+class RateLimiter:
+    """
+    Applies per-route token buckets to incoming requests. Per-user buckets are keyed by the
+    access token's subject, read from the verified JWT without touching the database;
+    requests without a valid token only draw from the per-IP bucket. Behind a proxy, run
+    uvicorn with --proxy-headers so the client IP is the caller's, not the proxy's.
+    """
+
+    def __init__(self, backend: RateLimitBackend, routes: List[RouteLimits]):
+        self.backend = backend
+        self.routes = routes
+        self.rejected_total = 0
+        self.errors_total = 0
+
+    def match(self, method: str, path: str) -> Optional[RouteLimits]:
+        for route in self.routes:
+            if route.method == method and route.path_regex.match(path):
+                return route
+        return None
+
+    async def check(self, scope) -> float:
+        """0 if the request may proceed, else the seconds the client should wait before retrying."""
+        route = self.match(scope["method"], scope["path"])
+        if route is None:
+            return 0.0
+
+        buckets = []
+        if route.per_ip is not None:
+            client = scope.get("client")
+            buckets.append((f"{route.name}:ip:{client[0] if client else 'unknown'}", route.per_ip))
+        if route.per_user is not None:
+            token = _bearer_token(scope)
+            if token is not None:
+                from app.services.auth import token_subject
+                subject = token_subject(token)
+                if subject is not None:
+                    buckets.append((f"{route.name}:user:{subject}", route.per_user))
+        if not buckets:
+            return 0.0
+
+        try:
+            wait = await self.backend.take(buckets)
+        except Exception as e:
+            # Fail open: an unreachable limiter store must not take the API down with it
+            self.errors_total += 1
+            logger.warning(f"Rate limit check for {route.name} failed, allowing the request: {e}")
+            return 0.0
+        if wait > 0:
+            self.rejected_total += 1
+        return wait
+
+    def stats(self) -> dict:
+        return {"rejected_total": self.rejected_total, "errors_total": self.errors_total}
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+
+class RequestShed(Exception):
+    """Raised when the request queue is full, or a request waited longer than the queue timeout."""
+
+
+class ConcurrencyLimiter:
+    """
+    Caps the requests a worker serves at once. Up to `max_queued` more wait, first come
+    first served, for at most `queue_timeout` seconds; beyond that they are shed with a 503
+    at once, while the worker still has the headroom to answer cheaply.
+    """
+
+    def __init__(self, max_concurrent: int, max_queued: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self._waiters: Deque[asyncio.Future] = deque()
+
+        # Counters, only mutated from the event loop thread
+        self.in_flight = 0
+        self.shed_total = 0
+
+    async def acquire(self) -> None:
+        """Take a slot, waiting in the queue if needed. Raises RequestShed if it can't."""
+        if self.in_flight < self.max_concurrent and not self._waiters:
+            self.in_flight += 1
+            return
+        if len(self._waiters) >= self.max_queued:
+            self.shed_total += 1
+            raise RequestShed()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.shed_total += 1
+            raise RequestShed()
+        except BaseException:
+            # Cancelled (client gone) just as release() handed us the slot: pass it on
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self) -> None:
+        """Hand the slot to the oldest waiter still waiting, or free it."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # The slot moves over, in_flight stays the same
+                return
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        """Snapshot of load for metrics and health checks."""
+        return {
+            "max_concurrent": self.max_concurrent,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "shed_total": self.shed_total,
+        }
+
+
+def _retry_after(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware rejecting requests over their route's rate limit with 429, and shedding
+    load with 503 once the worker's concurrency limit and queue are full. Both run before
+    routing, so a rejected request never reaches dependencies such as get_db.
+    """
+
+    def __init__(self, app, rate_limiter: Optional[RateLimiter] = None,
+                 concurrency_limiter: Optional[ConcurrencyLimiter] = None):
+        self.app = app
+        self.rate_limiter = rate_limiter
+        self.concurrency_limiter = concurrency_limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        if self.rate_limiter is not None:
+            wait = await self.rate_limiter.check(scope)
+            if wait > 0:
+                response = JSONResponse(
+                    {"detail": "Too many requests, please retry later"},
+                    status_code=429,
+                    headers={"Retry-After": _retry_after(wait)},
+                )
+                await response(scope, receive, send)
+                return
+
+        if self.concurrency_limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.concurrency_limiter.acquire()
+        except RequestShed:
+            response = JSONResponse(
+                {"detail": "Server is busy, please retry"},
+                status_code=503,
+                headers={"Retry-After": _retry_after(settings.SHED_RETRY_AFTER_SECONDS)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.concurrency_limiter.release()
+
+
+# Shared limiters used by the middleware (None when disabled)
+rate_limiter = RateLimiter(
+    create_rate_limit_backend(settings.RATE_LIMIT_BACKEND, settings.RATE_LIMIT_URL),
+    parse_route_limits(settings.RATE_LIMITS),
+) if settings.RATE_LIMIT_ENABLED else None
+
+concurrency_limiter = ConcurrencyLimiter(
+    max_concurrent=settings.MAX_CONCURRENT_REQUESTS,
+    max_queued=settings.MAX_QUEUED_REQUESTS,
+    queue_timeout=settings.REQUEST_QUEUE_TIMEOUT_SECONDS,
+) if settings.MAX_CONCURRENT_REQUESTS > 0 else None
@@ -0,0 +1,101 @@
+from datetime import date, datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from app.database import get_async_read_db
+from app.dependencies import get_admin_user
+from app.utils.principal_cache import Principal
+from app.schemas.sales import CategorySales, DailySales, ProductSales
+from app.services.order import ORDER_STATUSES
+from app.services.order_export import EXPORT_FORMATS, stream_order_export
+from app.services.sales import get_category_sales_async, get_daily_sales_async, get_product_sales_async
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+# Endpoint streaming orders and their items for reporting
+# CSV has one line per order item; NDJSON one order per line with its items
+# Rows are read from a server-side cursor as the response is sent, so exports of any size use flat memory
+@router.get("/orders/export")
+async def export_orders(
+    format: str = Query("csv", description="csv or ndjson"),
+    start: Optional[datetime] = Query(None, description="Orders created at or after this time"),
+    end: Optional[datetime] = Query(None, description="Orders created before this time"),
+    order_status: Optional[str] = Query(None, alias="status"),
+    admin: Principal = Depends(get_admin_user)  # Ensure the user is an admin
+):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Export format must be csv or ndjson"
+        )
+    if order_status is not None and order_status not in ORDER_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Status must be one of: {', '.join(ORDER_STATUSES)}"
+        )
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must be before end"
+        )
+
+    return StreamingResponse(
+        stream_order_export(format, start=start, end=end, status=order_status),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="orders.{format}"'}
+    )
+
+
+def _check_range(start: Optional[date], end: Optional[date]) -> None:
+    if start is not None and end is not None and start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must not be after end"
+        )
+
+
+# Sales analytics, read from the rollup tables the order services keep up to date
+# `start` and `end` are inclusive days; cancelled orders are not counted
+
+# Endpoint returning orders, units and revenue per day
+@router.get("/sales/daily", response_model=List[DailySales])
+async def read_daily_sales(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+    admin: Principal = Depends(get_admin_user)  # Ensure the user is an admin
+):
+    _check_range(start, end)
+    return await get_daily_sales_async(db, start=start, end=end)
+
+
+# Endpoint returning the best-selling products by revenue
+@router.get("/sales/products", response_model=List[ProductSales])
+async def read_product_sales(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_read_db),
+    admin: Principal = Depends(get_admin_user)  # Ensure the user is an admin
+):
+    _check_range(start, end)
+    return await get_product_sales_async(db, start=start, end=end, limit=limit)
+
+
+# Endpoint returning units and revenue per category
+@router.get("/sales/categories", response_model=List[CategorySales])
+async def read_category_sales(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+    admin: Principal = Depends(get_admin_user)  # Ensure the user is an admin
+):
+    _check_range(start, end)
+    return await get_category_sales_async(db, start=start, end=end)
@@ -1,19 +1,21 @@
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import logging
 
-from app.database import get_db
+from app.database import get_async_db
 from app.schemas.user import Token, UserCreate, User
 from app.services.auth import (
-    authenticate_user,
+    authenticate_user_async,
     create_access_token,
-    get_current_user,
-    get_password_hash
+    get_current_user_async,
+    get_password_hash_async,
+    get_user_by_email_async
 )
 from app.models.user import User as UserModel
 from app.config import settings
+from app.utils.principal_cache import Principal
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 logger = logging.getLogger(__name__)
@@ -22,18 +24,18 @@ logger = logging.getLogger(__name__)
 @router.post("/register", response_model=User)
 async def register_user(
     user: UserCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Create a new user account
     try:
-        existing_user = db.query(UserModel).filter(UserModel.email == user.email).first()
+        existing_user = await get_user_by_email_async(db, user.email)
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
 
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await get_password_hash_async(user.password)
         db_user = UserModel(
             email=user.email,
             full_name=user.full_name,
@@ -42,12 +44,14 @@ async def register_user(
             role="CUSTOMER"
         )
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         return db_user
 
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Registration failed: {str(e)}", exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -58,11 +62,11 @@ async def register_user(
 @router.post("/token", response_model=Token)
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Authenticate user and return JWT access token
     try:
-        user = authenticate_user(db, form_data.username, form_data.password)
+        user = await authenticate_user_async(db, form_data.username, form_data.password)
         if not user:
             logger.warning(f"Failed login attempt for {form_data.username}")
             raise HTTPException(
@@ -98,7 +102,7 @@ async def login_for_access_token(
 
 @router.get("/me", response_model=User)
 async def read_users_me(
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user_async)
 ):
     # Return the currently authenticated user's details
     return current_user
@@ -1,71 +1,96 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db
-from app.schemas.cart import Cart, CartItemCreate
+from app.database import get_async_db
+from app.schemas.cart import Cart, CartBatch, CartItemCreate
 from app.services.cart import (
-    get_user_cart,
-    add_to_cart,
-    remove_from_cart,
-    clear_cart
+    get_user_cart_async,
+    add_to_cart_async,
+    apply_cart_batch_async,
+    remove_from_cart_async,
+    clear_cart_async,
+    update_cart_item_quantity_async
 )
-from app.services.auth import get_current_user
-from app.schemas.user import User
+from app.services.auth import get_current_user_async
+from app.utils.principal_cache import Principal
+from app.utils.json_response import json_response
 
 router = APIRouter(prefix="/cart", tags=["cart"])
 
+# Carts are serialized once from the service result; see app.utils.json_response
+cart_adapter = TypeAdapter(Cart)
+
 
 @router.get("/", response_model=Cart)
-def get_cart(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+async def get_cart(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user_async)
 ):
     # Retrieve current user's cart
-    return get_user_cart(db, current_user.id)
+    return json_response(cart_adapter, await get_user_cart_async(db, current_user.id))
 
 
 @router.post("/items/", response_model=Cart)
-def add_item_to_cart(
+async def add_item_to_cart(
     item: CartItemCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user_async)
 ):
     # Add a product to the cart
-    return add_to_cart(db, current_user.id, item.product_id, item.quantity)
+    cart = await add_to_cart_async(db, current_user.id, item.product_id, item.quantity)
+    return json_response(cart_adapter, cart)
+
+
+@router.post("/items/batch", response_model=Cart)
+async def apply_cart_operations(
+    batch: CartBatch,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user_async)
+):
+    # Apply many add/update/remove operations at once and return the final cart
+    try:
+        cart = await apply_cart_batch_async(db, current_user.id, batch.operations)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    return json_response(cart_adapter, cart)
 
 
 @router.delete("/items/{product_id}", response_model=Cart)
-def remove_item_from_cart(
+async def remove_item_from_cart(
     product_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user_async)
 ):
     # Remove a product from the cart
-    cart = remove_from_cart(db, current_user.id, product_id)
+    cart = await remove_from_cart_async(db, current_user.id, product_id)
     if not cart:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Item not found in cart"
         )
-    return cart
+    return json_response(cart_adapter, cart)
 
 
 @router.delete("/clear", status_code=status.HTTP_204_NO_CONTENT)
-def clear_user_cart(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+async def clear_user_cart(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user_async)
 ):
     # Clear all items in the user's cart
-    clear_cart(db, current_user.id)
+    await clear_cart_async(db, current_user.id)
     return None
 
 
 @router.put("/items/{product_id}", response_model=Cart)
-def update_cart_item(
+async def update_cart_item(
     product_id: int,
     quantity: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user_async)
 ):
     # Update the quantity of a specific cart item
     if quantity <= 0:
@@ -74,16 +99,11 @@ def update_cart_item(
             detail="Quantity must be positive"
         )
 
-    cart = get_user_cart(db, current_user.id)
-    item = next((i for i in cart.items if i.product_id == product_id), None)
-
-    if not item:
+    try:
+        cart = await update_cart_item_quantity_async(db, current_user.id, product_id, quantity)
+    except ValueError:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Item not found in cart"
         )
-
-    item.quantity = quantity
-    db.commit()
-    db.refresh(cart)
-    return cart
+    return json_response(cart_adapter, cart)
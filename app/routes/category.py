@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, Header
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from app.database import get_async_catalog_read_db
+from app.schemas.category import Category
+from app.services.category import get_categories_async
+from app.utils.catalog_cache import catalog_cache, catalog_response
+from app.utils.json_response import dump_json
+
+router = APIRouter(prefix="/categories", tags=["categories"])
+
+category_list_adapter = TypeAdapter(list[Category])
+
+
+# Endpoint to list categories with their product counts, for category navigation
+# Counts come from the maintained categories.product_count, so this never scans products
+@router.get("/", response_model=list[Category])
+async def read_categories(
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_catalog_read_db)
+):
+    key = ("categories",)
+    entry = catalog_cache.get(key)
+    if entry is None:
+        generation = catalog_cache.generation  # Captured before reading, see CatalogCache.set
+        categories = await get_categories_async(db)
+        body = dump_json(category_list_adapter, categories)
+        entry = catalog_cache.set(key, body, generation)
+    return catalog_response(entry, if_none_match)
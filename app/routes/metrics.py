@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+
+router = APIRouter(tags=["metrics"])
+
+
+# Endpoint exposing request, SQL, pool and cache metrics in Prometheus text format
+@router.get("/metrics", include_in_schema=False)
+def read_metrics():
+    return Response(content=generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
@@ -1,88 +1,95 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
-from app.database import get_db
+from app.database import get_async_db, get_async_read_db
 from app.schemas.order import Order, OrderCreate, OrderItem
 from app.services.order import (
-    create_order,
-    get_user_orders,
-    get_order_details,
-    cancel_order
+    create_order_async,
+    get_user_orders_async,
+    get_order_details_async,
+    cancel_order_async
 )
-from app.services.auth import get_current_user
-from app.schemas.user import User
+from app.services.auth import get_current_user_async
+from app.utils.principal_cache import Principal
+from app.utils.json_response import json_response
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
+# Orders are serialized once from the service result; see app.utils.json_response
+order_adapter = TypeAdapter(Order)
+order_list_adapter = TypeAdapter(List[Order])
+order_item_list_adapter = TypeAdapter(List[OrderItem])
+
 
 @router.post("/", response_model=Order)
-def create_new_order(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+async def create_new_order(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user_async)
 ):
     # Create an order from user's cart
-    order = create_order(db, current_user.id)
+    order = await create_order_async(db, current_user.id)
     if not order:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Cannot create order with empty cart"
         )
-    return order
+    return json_response(order_adapter, order)
 
 
 @router.get("/", response_model=List[Order])
-def list_user_orders(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+async def list_user_orders(
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: Principal = Depends(get_current_user_async)
 ):
     # Retrieve all orders for the current user
-    return get_user_orders(db, current_user.id)
+    return json_response(order_list_adapter, await get_user_orders_async(db, current_user.id))
 
 
 @router.get("/{order_id}", response_model=Order)
-def get_order(
+async def get_order(
     order_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: Principal = Depends(get_current_user_async)
 ):
     # Get details of a specific order
-    order = get_order_details(db, order_id)
+    order = await get_order_details_async(db, order_id)
     if not order or order.user_id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Order not found"
         )
-    return order
+    return json_response(order_adapter, order)
 
 
 @router.post("/{order_id}/cancel", response_model=Order)
-def cancel_user_order(
+async def cancel_user_order(
     order_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user_async)
 ):
     # Cancel a user’s order
-    order = cancel_order(db, order_id, current_user.id)
+    order = await cancel_order_async(db, order_id, current_user.id)
     if not order:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Order cannot be cancelled"
         )
-    return order
+    return json_response(order_adapter, order)
 
 
 @router.get("/{order_id}/items", response_model=List[OrderItem])
-def get_order_items(
+async def get_order_items(
     order_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: Principal = Depends(get_current_user_async)
 ):
     # Get list of items for a specific order
-    order = get_order_details(db, order_id)
+    order = await get_order_details_async(db, order_id)
     if not order or order.user_id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Order not found"
         )
-    return order.items
+    return json_response(order_item_list_adapter, order.items)
@@ -1,28 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session
-from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File, Form, Header, Query
+from pydantic import TypeAdapter
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, Union
 import os
-from app.database import get_db
-from app.schemas.product import Product, ProductCreate
-from app.services.product import create_product, get_product, get_products
+from app.database import get_async_catalog_read_db, get_async_db
+from app.schemas.product import Product, ProductCreate, ProductImportReport, ProductPage
+from app.services.product import (
+    create_product_async,
+    generate_product_image_variants,
+    get_product_async,
+    get_products_async,
+    get_products_page_async,
+    search_products_async
+)
+from app.services.image import publish_stored_image_async
+from app.services.product_import import IMPORT_FORMATS, detect_format, import_products_from_file
 from app.dependencies import get_admin_user
-from app.models.user import User
-from app.utils.file_upload import save_upload_file
+from app.utils.principal_cache import Principal
+from app.utils.catalog_cache import catalog_cache, catalog_response
+from app.utils.file_upload import discard_upload, save_upload_file
+from app.utils.json_response import dump_json
 from fastapi import status
+from starlette.concurrency import run_in_threadpool
 
 router = APIRouter(prefix="/products", tags=["products"])
 
+# Serializers for catalog responses, applied once per cache fill instead of on every request
+product_adapter = TypeAdapter(Product)
+product_list_adapter = TypeAdapter(list[Product])
+product_page_adapter = TypeAdapter(ProductPage)
+
 # Endpoint to create a new product
 @router.post("/", response_model=Product)
 async def create_new_product(
+    background_tasks: BackgroundTasks,
     name: str = Form(...),
     description: str = Form(...),
     price: float = Form(...),
     category: str = Form(...),
     image_file: Optional[UploadFile] = File(None),
     image_url: Optional[str] = Form(None),
-    db: Session = Depends(get_db),
-    admin: User = Depends(get_admin_user)  # Ensure the user is an admin
+    sku: Optional[str] = Form(None),
+    db: AsyncSession = Depends(get_async_db),
+    admin: Principal = Depends(get_admin_user)  # Ensure the user is an admin
 ):
     # Ensure at least one image source is provided
     if not image_file and not image_url:
@@ -38,38 +59,129 @@ async def create_new_product(
             "description": description,
             "price": price,
             "category": category,
-            "image_url": image_url
+            "image_url": image_url,
+            "sku": sku
         }
 
-        # Create the product in the database
-        db_product = create_product(db, ProductCreate(**product_data))
-
         # Process image file if provided
+        saved = None
         if image_file:
-            # Save the image and update the product with the file path
-            local_path = save_upload_file(image_file, db_product.id)
-            db_product.local_image_path = local_path
-            db.commit()
-            db.refresh(db_product)
+            # Stage the image under its content hash; the product row takes a reference to it
+            saved = await save_upload_file(image_file)
+            product_data["local_image_path"] = saved.path
+
+        # Create the product in the database
+        try:
+            db_product = await create_product_async(db, ProductCreate(**product_data))
+        except BaseException:
+            if saved is not None:
+                discard_upload(saved)  # Nothing references it, keep it out of the store
+            raise
+
+        if saved is not None:
+            # Publish the image now that the reference is committed
+            await publish_stored_image_async(db, saved)
+            # Resize into thumbnail/listing/detail variants after the response is sent
+            background_tasks.add_task(generate_product_image_variants, db_product.id, saved.path)
 
         return db_product
 
+    except HTTPException:
+        await db.rollback()
+        raise  # e.g. 413 from an oversized upload
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A product with this SKU already exists"
+        )
     except Exception as e:
-        db.rollback()  # Rollback transaction if an error occurs
+        await db.rollback()  # Rollback transaction if an error occurs
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating product: {str(e)}"
         )
 
+# Endpoint to bulk import products from a CSV (header row) or JSON Lines file
+# Rows with a `sku` update the existing product with that SKU; invalid rows are listed in the report
+@router.post("/import", response_model=ProductImportReport)
+async def import_product_catalog(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, description="csv or jsonl; detected from the file name if omitted"),
+    admin: Principal = Depends(get_admin_user)  # Ensure the user is an admin
+):
+    format = format or detect_format(file.filename)
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Import format must be csv or jsonl"
+        )
+    # Validation and inserts are blocking work on a sync session; keep them off the event loop
+    return await run_in_threadpool(import_products_from_file, file.file, format)
+
 # Endpoint to retrieve all products
-@router.get("/", response_model=list[Product])
-def read_products(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return get_products(db, skip=skip, limit=limit)
+# Passing `cursor` (empty for the first page) switches to keyset pagination and returns a ProductPage
+# Responses are served from catalog_cache with an ETag; If-None-Match hits get a 304 without a query
+@router.get("/", response_model=Union[ProductPage, list[Product]])
+async def read_products(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    category: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_catalog_read_db)
+):
+    key = ("list", skip, limit, category) if cursor is None else ("page", sort, cursor, limit, category)
+    entry = catalog_cache.get(key)
+    if entry is None:
+        generation = catalog_cache.generation  # Captured before reading, see CatalogCache.set
+        if cursor is None:
+            products = await get_products_async(db, skip=skip, limit=limit, category=category)
+            body = dump_json(product_list_adapter, products)
+        else:
+            try:
+                items, next_cursor = await get_products_page_async(
+                    db, sort=sort, cursor=cursor, limit=limit, category=category
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+            body = dump_json(product_page_adapter, {"items": items, "next_cursor": next_cursor})
+        entry = catalog_cache.set(key, body, generation)
+    return catalog_response(entry, if_none_match)
+
+# Endpoint to search products by name, description and category, best matches first
+# Declared before /{product_id} so "search" isn't taken for a product ID
+@router.get("/search", response_model=list[Product])
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_catalog_read_db)
+):
+    key = ("search", q, limit)
+    entry = catalog_cache.get(key)
+    if entry is None:
+        generation = catalog_cache.generation  # Captured before reading, see CatalogCache.set
+        products = await search_products_async(db, q=q, limit=limit)
+        body = dump_json(product_list_adapter, products)
+        entry = catalog_cache.set(key, body, generation)
+    return catalog_response(entry, if_none_match)
 
 # Endpoint to retrieve a specific product by ID
 @router.get("/{product_id}", response_model=Product)
-def read_product(product_id: int, db: Session = Depends(get_db)):
-    db_product = get_product(db, product_id=product_id)
-    if db_product is None:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return db_product
+async def read_product(
+    product_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_catalog_read_db)
+):
+    key = ("detail", product_id)
+    entry = catalog_cache.get(key)
+    if entry is None:
+        generation = catalog_cache.generation  # Captured before reading, see CatalogCache.set
+        db_product = await get_product_async(db, product_id=product_id)
+        if db_product is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        body = dump_json(product_adapter, db_product)
+        entry = catalog_cache.set(key, body, generation)
+    return catalog_response(entry, if_none_match)
@@ -0,0 +1,28 @@
+import os
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import FileResponse
+from app.utils.file_upload import UPLOAD_DIR, UPLOAD_ROOT
+
+router = APIRouter(prefix="/uploads", tags=["uploads"])
+
+# Content-addressed files never change under the same URL, so caches may keep them forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+# Endpoint serving uploaded images and their variants
+# FileResponse answers Range requests (206) and hands the file to the server's sendfile
+# when it supports the ASGI pathsend extension, instead of copying chunks through Python
+@router.api_route("/{file_path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def read_upload(file_path: str):
+    root = os.path.realpath(UPLOAD_ROOT)
+    full_path = os.path.realpath(os.path.join(root, file_path))
+    # Refuse anything resolving outside uploads/ (e.g. ../), anything that isn't a file, and
+    # dot-files: staged uploads and half-written variants aren't published yet
+    if (not full_path.startswith(root + os.sep) or not os.path.isfile(full_path)
+            or any(part.startswith(".") for part in os.path.relpath(full_path, root).split(os.sep))):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+
+    headers = {}
+    if full_path.startswith(os.path.realpath(UPLOAD_DIR) + os.sep):
+        headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    return FileResponse(full_path, headers=headers)
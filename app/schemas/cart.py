@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Literal, Optional
 from app.schemas.product import Product
 
 # Base model for cart item with product ID and quantity
@@ -15,6 +15,23 @@ class CartItemCreate(CartItemBase):
 class CartItemUpdate(BaseModel):
     quantity: int
 
+# Model for one operation of a batch cart update
+# add: increase quantity (inserting the item if needed), update: set quantity, remove: delete the item
+class CartItemOperation(BaseModel):
+    op: Literal["add", "update", "remove"]
+    product_id: int
+    quantity: Optional[int] = None  # Required and positive for add and update
+
+    @model_validator(mode="after")
+    def check_quantity(self):
+        if self.op != "remove" and (self.quantity is None or self.quantity <= 0):
+            raise ValueError(f"{self.op} needs a positive quantity")
+        return self
+
+# Model for a batch of cart operations, applied in order in one transaction
+class CartBatch(BaseModel):
+    operations: List[CartItemOperation] = Field(..., min_length=1, max_length=500)
+
 # Model for cart item with detailed product info
 class CartItem(CartItemBase):
     id: int
@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+
+# Model for a category with the number of products in it
+class Category(BaseModel):
+    id: int
+    name: str
+    product_count: int
+
+    class Config:
+        orm_mode = True  # Enable ORM compatibility for DB models
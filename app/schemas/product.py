@@ -1,8 +1,9 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, field_validator
+from typing import Dict, List, Optional
 
 # Base model for product with common fields
 class ProductBase(BaseModel):
+    sku: Optional[str] = None
     name: str
     description: Optional[str] = None
     price: float
@@ -17,6 +18,40 @@ class ProductCreate(ProductBase):
 # Model for product with ID and ORM compatibility
 class Product(ProductBase):
     id: int
+    image_variants: Optional[Dict[str, str]] = None  # Resized image URLs, filled in shortly after an upload
+
+    @field_validator("image_variants")
+    @classmethod
+    def variant_urls(cls, variants):
+        # Stored as paths under uploads/, served from the /uploads mount
+        if variants is None:
+            return None
+        return {name: "/" + path.lstrip("/") for name, path in variants.items()}
+
+    class Config:
+        orm_mode = True  # Enable ORM compatibility for DB models
+
+# Model for one page of products returned by cursor pagination
+class ProductPage(BaseModel):
+    items: List[Product]
+    next_cursor: Optional[str] = None  # Pass back as `cursor` to fetch the next page
+
+# Model for a row a bulk import skipped, by line number in the uploaded file
+class ProductImportError(BaseModel):
+    line: int
+    error: str
+
+    class Config:
+        orm_mode = True  # Enable ORM compatibility for DB models
+
+# Model for the outcome of a bulk product import
+class ProductImportReport(BaseModel):
+    processed: int
+    imported: int
+    failed: int
+    merged: int  # Rows superseded by a later row with the same SKU
+    errors: List[ProductImportError]
+    errors_truncated: bool  # More rows failed than are listed in `errors`
 
     class Config:
         orm_mode = True  # Enable ORM compatibility for DB models
@@ -0,0 +1,32 @@
+from pydantic import BaseModel
+from datetime import date
+
+# Model for the sales totals of one day
+class DailySales(BaseModel):
+    day: date
+    orders: int
+    units: int
+    revenue: float
+
+    class Config:
+        orm_mode = True  # Enable ORM compatibility for DB models
+
+# Model for the sales totals of one product over a date range
+class ProductSales(BaseModel):
+    product_id: int
+    name: str
+    units: int
+    revenue: float
+
+    class Config:
+        orm_mode = True  # Enable ORM compatibility for DB rows
+
+# Model for the sales totals of one category over a date range
+class CategorySales(BaseModel):
+    category_id: int
+    name: str
+    units: int
+    revenue: float
+
+    class Config:
+        orm_mode = True  # Enable ORM compatibility for DB rows
@@ -4,11 +4,16 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import get_async_db, get_db
 from app.models.user import User
 from app.schemas.user import Token, TokenData
 from app.config import settings
+from app.utils.password_pool import PasswordPoolFull, password_pool
+from app.utils.principal_cache import Principal, principal_cache
+from app.utils.read_your_writes import current_user_id
 
 # Context for password hashing using bcrypt
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=12)
@@ -27,6 +32,28 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def _run_in_password_pool(fn, *args):
+    """Run a bcrypt call on the password pool, answering 503 when it is saturated"""
+    try:
+        return await password_pool.run(fn, *args)
+    except PasswordPoolFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service is busy, please retry",
+            headers={"Retry-After": str(settings.PASSWORD_POOL_RETRY_AFTER_SECONDS)},
+        )
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Check a password on the password pool instead of the event loop"""
+    return await _run_in_password_pool(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password on the password pool instead of the event loop"""
+    return await _run_in_password_pool(get_password_hash, password)
+
+
 def create_access_token(
         data: dict,
         expires_delta: Optional[timedelta] = None
@@ -50,6 +77,15 @@ def authenticate_user(
     return user
 
 
+def token_subject(token: str) -> Optional[str]:
+    """Email of a valid access token, None if it doesn't verify. Checks the signature only, no lookup"""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+
 def get_current_user(
         db: Session = Depends(get_db),
         token: str = Depends(oauth2_scheme)
@@ -79,6 +115,62 @@ def get_current_user(
     return user
 
 
+async def get_user_by_email_async(db: AsyncSession, email: str) -> Optional[User]:
+    """Fetch a user by email using the async session"""
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
+
+
+async def authenticate_user_async(
+        db: AsyncSession,
+        email: str,
+        password: str
+) -> Optional[User]:
+    """Async variant of authenticate_user"""
+    user = await get_user_by_email_async(db, email)
+    if not user or not await verify_password_async(password, user.hashed_password):
+        return None
+    return user
+
+
+async def get_current_user_async(
+        db: AsyncSession = Depends(get_async_db),
+        token: str = Depends(oauth2_scheme)
+) -> Principal:
+    """
+    Async variant of get_current_user, used by the request handlers.
+    Returns a detached Principal, served from principal_cache when possible.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        payload = jwt.decode(
+            token,
+            settings.SECRET_KEY,
+            algorithms=[settings.ALGORITHM]
+        )
+        email: str = payload.get("sub")
+        if email is None:
+            raise credentials_exception
+        token_data = TokenData(email=email)
+    except JWTError:
+        raise credentials_exception
+
+    principal = principal_cache.get(token_data.email)
+    if principal is None:
+        user = await get_user_by_email_async(db, token_data.email)
+        if user is None:
+            raise credentials_exception
+        principal = Principal.from_user(user)
+        principal_cache.set(token_data.email, principal, token_exp=payload.get("exp"))
+
+    current_user_id.set(principal.id)  # Lets read sessions honour this user's recent writes
+    return principal
+
+
 def get_current_active_user(
         current_user: User = Depends(get_current_user)
 ) -> User:
@@ -116,6 +208,27 @@ def create_user(
     return user
 
 
+async def create_user_async(
+        db: AsyncSession,
+        email: str,
+        password: str,
+        **extra_data
+) -> User:
+    """Async variant of create_user"""
+    if await get_user_by_email_async(db, email):
+        raise ValueError("User already exists")
+
+    user = User(
+        email=email,
+        hashed_password=await get_password_hash_async(password),
+        **extra_data
+    )
+    db.add(user)
+    await db.commit()
+    await db.refresh(user)
+    return user
+
+
 def generate_password_reset_token(email: str) -> str:
     """Generate a token for password reset with an expiration"""
     expires = timedelta(hours=settings.password_reset_token_expire_hours)
@@ -141,3 +254,36 @@ def verify_password_reset_token(token: str) -> Optional[str]:
     except JWTError:
         return None
     return email
+
+
+PRINCIPAL_INVALIDATIONS_KEY = "principal_cache_invalidations"
+PRINCIPAL_FIELDS = ("email", "role", "is_active")
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_principal_invalidations(session, flush_context):
+    """Remember which users had auth-relevant fields changed or were deleted in this transaction"""
+    emails = session.info.setdefault(PRINCIPAL_INVALIDATIONS_KEY, set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, User):
+            continue
+        state = inspect(obj)
+        for field in PRINCIPAL_FIELDS:
+            history = state.attrs[field].history
+            if obj in session.deleted or history.has_changes():
+                # Cover both the old and the new email when the subject itself changes
+                emails.update(e for e in state.attrs.email.history.sum() if e)
+                break
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_principal_invalidations(session):
+    """Drop cached principals once the change is visible to other sessions"""
+    for email in session.info.pop(PRINCIPAL_INVALIDATIONS_KEY, ()):
+        principal_cache.invalidate(email)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_principal_invalidations(session):
+    """Nothing was persisted, so the cached principals are still valid"""
+    session.info.pop(PRINCIPAL_INVALIDATIONS_KEY, None)
@@ -1,45 +1,169 @@
-from sqlalchemy.orm import Session
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from app.database import AsyncSessionLocal
 from app.models.cart import Cart, CartItem
+from app.models.product import Product
+from app.utils.cart_store import StoredCart, cart_store
+from app.utils.upsert import upsert_insert
+
+logger = logging.getLogger(__name__)
+
+# Loading profile for every cart handed back to callers. The Cart schema serializes
+# items[].product, so both levels are selectin-loaded: one query for the cart, one for
+# its items and one for their products, however many items the cart holds.
+CART_LOAD_OPTIONS = (
+    selectinload(Cart.items).selectinload(CartItem.product),
+)
+
+
+def _cart_query(user_id: int):
+    """Select the user's cart using the CART_LOAD_OPTIONS profile."""
+    return (
+        select(Cart)
+        .where(Cart.user_id == user_id)
+        .options(*CART_LOAD_OPTIONS)
+        .execution_options(populate_existing=True)  # Reload items changed since the last fetch
+    )
+
+
+def _item_upsert(dialect_name: str, increment: bool):
+    """
+    INSERT ... ON CONFLICT (cart_id, product_id) DO UPDATE for cart items, executed with
+    {cart_id, product_id, quantity} parameter sets. The database adds (increment=True) or
+    sets the quantity under the row lock, so concurrent adds never lose an increment.
+    """
+    insert = upsert_insert(dialect_name)
+    if insert is None:
+        raise ValueError(f"Cart upserts are not supported on {dialect_name}")
+    items = CartItem.__table__
+    stmt = insert(items)
+    quantity = items.c.quantity + stmt.excluded.quantity if increment else stmt.excluded.quantity
+    return stmt.on_conflict_do_update(
+        index_elements=[items.c.cart_id, items.c.product_id],
+        set_={"quantity": quantity},
+    )
+
+
+def _fold_operations(operations: Iterable) -> tuple[dict, dict, set]:
+    """
+    Reduce ordered batch operations to one action per product:
+    increments to add, absolute quantities to set, and products to remove.
+    """
+    adds, sets, removes = {}, {}, set()
+    for operation in operations:
+        product_id = operation.product_id
+        if operation.op == "remove":
+            adds.pop(product_id, None)
+            sets.pop(product_id, None)
+            removes.add(product_id)
+        elif operation.op == "update":
+            adds.pop(product_id, None)
+            removes.discard(product_id)
+            sets[product_id] = operation.quantity
+        elif product_id in sets:
+            sets[product_id] += operation.quantity
+        elif product_id in removes:
+            # Adding after a removal starts from zero
+            removes.discard(product_id)
+            sets[product_id] = operation.quantity
+        else:
+            adds[product_id] = adds.get(product_id, 0) + operation.quantity
+    return adds, sets, removes
+
+
+def _batch_statements(dialect_name: str, cart_id: int, adds: dict, sets: dict, removes: set):
+    """(statement, parameters) pairs applying folded batch operations: at most three statements."""
+    statements = []
+    if adds:
+        statements.append((_item_upsert(dialect_name, increment=True), [
+            {"cart_id": cart_id, "product_id": product_id, "quantity": quantity}
+            for product_id, quantity in adds.items()
+        ]))
+    if sets:
+        statements.append((_item_upsert(dialect_name, increment=False), [
+            {"cart_id": cart_id, "product_id": product_id, "quantity": quantity}
+            for product_id, quantity in sets.items()
+        ]))
+    if removes:
+        statements.append((
+            delete(CartItem).where(CartItem.cart_id == cart_id, CartItem.product_id.in_(removes)),
+            None,
+        ))
+    return statements
+
+
+def _existing_products_query(product_ids: set):
+    return select(Product.id).where(Product.id.in_(product_ids))
+
+
+def _cart_id_query(user_id: int):
+    """Select just the id of the user's cart, for writes that don't need its items."""
+    return select(Cart.id).where(Cart.user_id == user_id)
+
+
+def get_user_cart_id(db: Session, user_id: int) -> int:
+    """Retrieve or create the user's cart and return its id."""
+    cart_id = db.execute(_cart_id_query(user_id)).scalars().first()
+    if cart_id is None:
+        cart = Cart(user_id=user_id)
+        db.add(cart)
+        db.commit()
+        cart_id = cart.id
+    return cart_id
 
 
 def get_user_cart(db: Session, user_id: int) -> Cart:
-    """Retrieve or create a cart for the user."""
+    """Retrieve or create a cart for the user; items and products are loaded up front."""
     # Try to fetch the user's cart from the database
-    cart = db.query(Cart).filter(Cart.user_id == user_id).first()
+    cart = db.execute(_cart_query(user_id)).scalars().first()
     if not cart:
         # Create a new cart if it doesn't exist for the user
-        cart = Cart(user_id=user_id)
-        db.add(cart)  # Add new cart to the session
+        db.add(Cart(user_id=user_id))  # Add new cart to the session
         db.commit()  # Commit the transaction to save the cart
-        db.refresh(cart)  # Refresh the cart instance with the latest data
+        cart = db.execute(_cart_query(user_id)).scalars().first()  # Load it with the cart profile
     return cart
 
 
 def add_to_cart(db: Session, user_id: int, product_id: int, quantity: int = 1) -> Cart:
-    """Add a product to the user's cart."""
-    cart = get_user_cart(db, user_id)  # Retrieve or create user's cart
+    """Add a product to the user's cart, or increase its quantity if it is already there."""
+    cart_id = get_user_cart_id(db, user_id)  # Retrieve or create user's cart
 
-    # Check if the product is already in the cart
-    existing_item = next(
-        (item for item in cart.items if item.product_id == product_id),
-        None
+    # Insert the item or increase its quantity in one atomic statement
+    db.execute(
+        _item_upsert(db.get_bind().dialect.name, increment=True),
+        [{"cart_id": cart_id, "product_id": product_id, "quantity": quantity}]
     )
+    db.commit()  # Commit the changes to the database
+    return get_user_cart(db, user_id)  # Reload the cart to include the updated items
 
-    if existing_item:
-        # If the item is already in the cart, increase the quantity
-        existing_item.quantity += quantity
-    else:
-        # If it's a new product, create a new CartItem and add it to the cart
-        new_item = CartItem(
-            cart_id=cart.id,
-            product_id=product_id,
-            quantity=quantity
-        )
-        db.add(new_item)  # Add the new item to the session
 
-    db.commit()  # Commit the changes to the database
-    db.refresh(cart)  # Refresh the cart instance to include the updated items
-    return cart
+def apply_cart_batch(db: Session, user_id: int, operations: Iterable) -> Cart:
+    """
+    Apply add/update/remove operations to the user's cart in one transaction and return the final cart.
+    Raises ValueError if an added or updated product doesn't exist.
+    """
+    cart_id = get_user_cart_id(db, user_id)  # Retrieve or create user's cart
+    adds, sets, removes = _fold_operations(operations)
+
+    wanted = set(adds) | set(sets)
+    if wanted:
+        missing = wanted - set(db.execute(_existing_products_query(wanted)).scalars())
+        if missing:
+            raise ValueError(f"Products not found: {sorted(missing)}")
+
+    try:
+        for statement, parameters in _batch_statements(db.get_bind().dialect.name, cart_id, adds, sets, removes):
+            db.execute(statement, parameters)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return get_user_cart(db, user_id)  # Reload the cart to include the updated items
 
 
 def remove_from_cart(db: Session, user_id: int, product_id: int) -> Cart:
@@ -54,7 +178,7 @@ def remove_from_cart(db: Session, user_id: int, product_id: int) -> Cart:
         # If the product exists in the cart, delete the item
         db.delete(item_to_remove)
         db.commit()  # Commit the changes to the database
-        db.refresh(cart)  # Refresh the cart instance to reflect the update
+        cart = get_user_cart(db, user_id)  # Reload the cart to reflect the update
 
     return cart
 
@@ -89,5 +213,242 @@ def update_cart_item_quantity(
     # Update the quantity of the cart item
     item.quantity = new_quantity
     db.commit()  # Commit the changes to the database
-    db.refresh(cart)  # Refresh the cart instance to reflect the updated quantity
+    return get_user_cart(db, user_id)  # Reload the cart to reflect the updated quantity
+
+
+@dataclass
+class StoredCartItem:
+    """A cart line served from cart_store; items aren't rows yet, so the id is the product id."""
+    id: int
+    product_id: int
+    quantity: int
+    product: Product
+
+
+@dataclass
+class StoredCartView:
+    """A cart served from cart_store, shaped like the Cart schema."""
+    id: int
+    items: List[StoredCartItem]
+
+
+async def _stored_cart(db: AsyncSession, user_id: int) -> StoredCart:
+    """The user's cart from cart_store, seeded from the tables the first time it is used."""
+    cart = await cart_store.get(user_id)
+    if cart is None:
+        cart_id = await get_user_cart_id_async(db, user_id)
+        rows = await db.execute(select(CartItem.product_id, CartItem.quantity).where(CartItem.cart_id == cart_id))
+        cart = await cart_store.load(user_id, cart_id, {product_id: quantity for product_id, quantity in rows})
     return cart
+
+
+async def _cart_view(db: AsyncSession, cart: StoredCart) -> StoredCartView:
+    """Attach products to a stored cart with one query; lines for deleted products are dropped."""
+    products = {}
+    if cart.items:
+        result = await db.execute(select(Product).where(Product.id.in_(cart.items)))
+        products = {product.id: product for product in result.scalars()}
+    return StoredCartView(id=cart.cart_id, items=[
+        StoredCartItem(id=product_id, product_id=product_id, quantity=quantity, product=products[product_id])
+        for product_id, quantity in sorted(cart.items.items())
+        if product_id in products and quantity > 0
+    ])
+
+
+async def _load_user_cart_async(db: AsyncSession, user_id: int) -> Cart:
+    """Retrieve or create the user's cart from the tables, with items and products loaded."""
+    result = await db.execute(_cart_query(user_id))
+    cart = result.scalars().first()
+    if not cart:
+        # Create a new cart if it doesn't exist for the user
+        cart = Cart(user_id=user_id, items=[])  # Start with a loaded, empty items collection
+        db.add(cart)
+        await db.commit()
+    return cart
+
+
+async def get_user_cart_async(db: AsyncSession, user_id: int):
+    """Async variant of get_user_cart; the returned cart has items and products loaded."""
+    if cart_store is not None:
+        return await _cart_view(db, await _stored_cart(db, user_id))
+    return await _load_user_cart_async(db, user_id)
+
+
+async def get_user_cart_id_async(db: AsyncSession, user_id: int) -> int:
+    """Async variant of get_user_cart_id."""
+    cart_id = (await db.execute(_cart_id_query(user_id))).scalars().first()
+    if cart_id is None:
+        cart = Cart(user_id=user_id)
+        db.add(cart)
+        await db.commit()
+        cart_id = cart.id
+    return cart_id
+
+
+async def add_to_cart_async(
+        db: AsyncSession,
+        user_id: int,
+        product_id: int,
+        quantity: int = 1
+) -> Cart:
+    """Async variant of add_to_cart."""
+    if cart_store is not None:
+        await _stored_cart(db, user_id)  # Seed the store from the tables on first use
+        await cart_store.apply(user_id, {product_id: quantity}, {}, set())
+        return await get_user_cart_async(db, user_id)
+
+    cart_id = await get_user_cart_id_async(db, user_id)  # Retrieve or create user's cart
+
+    # Insert the item or increase its quantity in one atomic statement
+    await db.execute(
+        _item_upsert(db.get_bind().dialect.name, increment=True),
+        [{"cart_id": cart_id, "product_id": product_id, "quantity": quantity}]
+    )
+    await db.commit()
+    return await _load_user_cart_async(db, user_id)  # Reload the cart to include the updated items
+
+
+async def apply_cart_batch_async(db: AsyncSession, user_id: int, operations: Iterable) -> Cart:
+    """Async variant of apply_cart_batch."""
+    adds, sets, removes = _fold_operations(operations)
+
+    wanted = set(adds) | set(sets)
+    if wanted:
+        found = (await db.execute(_existing_products_query(wanted))).scalars()
+        missing = wanted - set(found)
+        if missing:
+            raise ValueError(f"Products not found: {sorted(missing)}")
+
+    if cart_store is not None:
+        await _stored_cart(db, user_id)  # Seed the store from the tables on first use
+        await cart_store.apply(user_id, adds, sets, removes)
+        return await get_user_cart_async(db, user_id)
+
+    cart_id = await get_user_cart_id_async(db, user_id)  # Retrieve or create user's cart
+
+    try:
+        for statement, parameters in _batch_statements(db.get_bind().dialect.name, cart_id, adds, sets, removes):
+            await db.execute(statement, parameters)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return await _load_user_cart_async(db, user_id)  # Reload the cart to include the updated items
+
+
+async def remove_from_cart_async(db: AsyncSession, user_id: int, product_id: int) -> Cart:
+    """Async variant of remove_from_cart."""
+    if cart_store is not None:
+        await _stored_cart(db, user_id)  # Seed the store from the tables on first use
+        await cart_store.apply(user_id, {}, {}, {product_id})
+        return await get_user_cart_async(db, user_id)
+
+    cart = await _load_user_cart_async(db, user_id)  # Retrieve the user's cart
+    item_to_remove = next(
+        (item for item in cart.items if item.product_id == product_id),
+        None
+    )
+
+    if item_to_remove:
+        # If the product exists in the cart, delete the item
+        await db.delete(item_to_remove)
+        await db.commit()
+        cart = await _load_user_cart_async(db, user_id)  # Reload the cart to reflect the update
+
+    return cart
+
+
+async def clear_cart_async(db: AsyncSession, user_id: int) -> None:
+    """Async variant of clear_cart."""
+    if cart_store is not None:
+        cart = await _stored_cart(db, user_id)
+        await cart_store.clear(user_id, cart.cart_id)
+        return
+
+    cart = await _load_user_cart_async(db, user_id)  # Retrieve the user's cart
+    await db.execute(delete(CartItem).where(CartItem.cart_id == cart.id))
+    await db.commit()
+
+
+async def update_cart_item_quantity_async(
+        db: AsyncSession,
+        user_id: int,
+        product_id: int,
+        new_quantity: int
+) -> Cart:
+    """Async variant of update_cart_item_quantity."""
+    if new_quantity <= 0:
+        raise ValueError("Quantity must be positive")  # Validate positive quantity
+
+    if cart_store is not None:
+        if product_id not in (await _stored_cart(db, user_id)).items:
+            raise ValueError("Item not found in cart")
+        await cart_store.apply(user_id, {}, {product_id: new_quantity}, set())
+        return await get_user_cart_async(db, user_id)
+
+    cart = await _load_user_cart_async(db, user_id)  # Retrieve the user's cart
+    item = next(
+        (item for item in cart.items if item.product_id == product_id),
+        None
+    )
+
+    if not item:
+        raise ValueError("Item not found in cart")  # Raise an error if the item is not in the cart
+
+    item.quantity = new_quantity
+    await db.commit()
+    return await _load_user_cart_async(db, user_id)  # Reload the cart to reflect the updated quantity
+
+
+async def write_stored_cart_async(db: AsyncSession, user_id: int) -> Optional[StoredCart]:
+    """
+    Replace the user's cart_items with the cart held in cart_store, without committing.
+    Returns the cart written, or None if the store doesn't hold the cart, in which case the
+    tables are already current.
+    The cart is marked clean before it is read, so changes made meanwhile mark it dirty again;
+    callers mark it dirty themselves if the transaction fails.
+    """
+    await cart_store.discard_dirty(user_id)
+    cart = await cart_store.get(user_id)
+    if cart is None:
+        return None
+
+    await db.execute(delete(CartItem).where(CartItem.cart_id == cart.cart_id))
+    wanted = {product_id for product_id, quantity in cart.items.items() if quantity > 0}
+    if wanted:
+        # Products deleted since they were added drop out, as they do from the cart view
+        existing = sorted(set((await db.execute(_existing_products_query(wanted))).scalars()))
+        if existing:
+            await db.execute(insert(CartItem), [
+                {"cart_id": cart.cart_id, "product_id": product_id, "quantity": cart.items[product_id]}
+                for product_id in existing
+            ])
+    return cart
+
+
+async def flush_dirty_carts() -> int:
+    """Persist every cart changed in cart_store since the last flush, one transaction per cart."""
+    flushed = 0
+    async with AsyncSessionLocal() as db:
+        for user_id in await cart_store.take_dirty():
+            try:
+                if await write_stored_cart_async(db, user_id):
+                    await db.commit()
+                    flushed += 1
+            except Exception:
+                await db.rollback()
+                await cart_store.mark_dirty(user_id)  # Try again on the next flush
+                logger.exception(f"Failed to persist cart of user {user_id}")
+    return flushed
+
+
+async def run_cart_write_behind(interval_seconds: float) -> None:
+    """Flush dirty carts every `interval_seconds` until cancelled."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            flushed = await flush_dirty_carts()
+            if flushed:
+                logger.info(f"Persisted {flushed} carts")
+        except Exception:
+            logger.exception("Cart write-behind flush failed")  # e.g. the store is unreachable; retry next tick
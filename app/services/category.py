@@ -0,0 +1,147 @@
+from collections import Counter
+from typing import Optional
+from sqlalchemy import bindparam, event, func, inspect, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models.category import Category
+from app.models.product import Product
+from app.utils.catalog_cache import catalog_cache
+from app.utils.read_your_writes import CATALOG_WRITES, recent_writes
+from app.utils.upsert import upsert_insert
+
+
+def normalize_category(name: Optional[str]) -> Optional[str]:
+    """Category names are stored trimmed; blank means no category."""
+    if name is None:
+        return None
+    return name.strip() or None
+
+
+def get_or_create_category_id(connection, name: str) -> int:
+    """Return the id of the category called `name`, creating it if needed."""
+    insert = upsert_insert(connection.dialect.name)
+    if insert is not None:
+        connection.execute(
+            insert(Category).values(name=name, product_count=0).on_conflict_do_nothing(index_elements=[Category.name])
+        )
+    category_id = connection.execute(select(Category.id).where(Category.name == name)).scalar()
+    if category_id is None:
+        result = connection.execute(Category.__table__.insert().values(name=name, product_count=0))
+        category_id = result.inserted_primary_key[0]
+    return category_id
+
+
+def get_or_create_category_ids(connection, names) -> dict:
+    """
+    Map each of `names` to its category id, creating missing categories.
+    Two statements where the dialect has upserts; names are taken in sorted order so
+    concurrent writers lock new categories in the same order.
+    """
+    names = sorted(set(names))
+    insert = upsert_insert(connection.dialect.name)
+    if not names or insert is None:
+        return {name: get_or_create_category_id(connection, name) for name in names}
+    connection.execute(
+        insert(Category).on_conflict_do_nothing(index_elements=[Category.name]),
+        [{"name": name, "product_count": 0} for name in names],
+    )
+    return dict(connection.execute(select(Category.name, Category.id).where(Category.name.in_(names))).all())
+
+
+def apply_category_count_deltas(connection, deltas: Counter) -> None:
+    """Add each delta to its category's product_count; uncategorized products (None) have no counter."""
+    changes = [
+        {"changed_id": category_id, "delta": delta}
+        for category_id, delta in sorted(deltas.items(), key=lambda item: item[0] or 0)  # Consistent lock order
+        if category_id is not None and delta
+    ]
+    if changes:
+        connection.execute(
+            update(Category)
+            .where(Category.id == bindparam("changed_id"))
+            .values(product_count=Category.product_count + bindparam("delta")),
+            changes,  # One executemany however many categories changed
+        )
+
+
+@event.listens_for(Session, "before_flush")
+def _update_category_counts(session, flush_context, instances):
+    """
+    Point products at their categories row and keep categories.product_count in step,
+    in the same transaction as the product write.
+    Core bulk inserts bypass this and apply their own deltas (see app/services/product_import.py).
+    """
+    products = [obj for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+                if isinstance(obj, Product)]
+    if not products:
+        return
+
+    connection = session.connection()
+    deltas = Counter()
+    for obj in products:
+        if obj in session.deleted:
+            deltas[obj.category_id] -= 1
+            continue
+        if obj not in session.new and not inspect(obj).attrs.category.history.has_changes():
+            continue
+
+        name = normalize_category(obj.category)
+        if obj.category != name:
+            obj.category = name
+        old_id = None if obj in session.new else obj.category_id
+        new_id = get_or_create_category_id(connection, name) if name else None
+        if new_id != old_id:
+            obj.category_id = new_id
+            deltas[old_id] -= 1
+            deltas[new_id] += 1
+        elif obj in session.new:
+            deltas[new_id] += 1
+
+    apply_category_count_deltas(connection, deltas)
+
+
+def rebuild_category_counts(db: Session):
+    """
+    Recreate missing categories from products.category, then relink products and recount with two set-based updates.
+    A backfill (`python -m app.cli rebuild-category-counts`) for databases created before categories existed or
+    loaded behind the ORM's back; it scans the whole catalog, so regular writes keep the counts incrementally instead.
+    Only rows whose link or count is wrong are rewritten.
+    """
+    connection = db.connection()
+    names = db.execute(select(Product.category).where(Product.category.isnot(None)).distinct()).scalars().all()
+    for name in names:
+        get_or_create_category_id(connection, name)
+    linked_id = select(Category.id).where(Category.name == Product.category).scalar_subquery()
+    db.execute(
+        update(Product)
+        .where(Product.category_id.is_distinct_from(linked_id))
+        .values(category_id=linked_id)
+    )
+    counted = select(func.count(Product.id)).where(Product.category_id == Category.id).scalar_subquery()
+    db.execute(
+        update(Category)
+        .where(Category.product_count.is_distinct_from(counted))
+        .values(product_count=counted)
+    )
+    db.commit()
+    catalog_cache.clear()  # Core updates don't go through the product invalidation listeners
+    recent_writes.record(CATALOG_WRITES)
+
+
+def _categories_query():
+    # Reads the counters only; categories without products are hidden
+    return select(Category).where(Category.product_count > 0).order_by(Category.name)
+
+
+def get_categories(db: Session):
+    """
+    Retrieve every category that has products, with its product count.
+    """
+    return db.execute(_categories_query()).scalars().all()
+
+
+async def get_categories_async(db: AsyncSession):
+    """
+    Async variant of get_categories for the request handlers.
+    """
+    return (await db.execute(_categories_query())).scalars().all()
@@ -0,0 +1,151 @@
+import asyncio
+import glob
+import logging
+import os
+from collections import Counter
+from sqlalchemy import delete, event, inspect, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models.image import StoredImage
+from app.models.product import Product
+from app.utils.file_upload import UPLOAD_DIR, SavedUpload, discard_upload, publish_upload
+from app.utils.upsert import upsert_insert
+
+logger = logging.getLogger(__name__)
+
+IMAGE_REMOVALS_KEY = "stored_image_removals"
+
+
+def _is_stored_image(path) -> bool:
+    """Only files in the content-addressed store are refcounted; image_url links and legacy paths aren't."""
+    return bool(path) and os.path.normpath(path).startswith(os.path.normpath(UPLOAD_DIR) + os.sep)
+
+
+def _add_references(connection, path: str, count: int) -> None:
+    """Create the stored_images row for `path` or bump its refcount."""
+    sha256 = os.path.splitext(os.path.basename(path))[0]
+    insert = upsert_insert(connection.dialect.name)
+    if insert is not None:
+        stmt = insert(StoredImage).values(path=path, sha256=sha256, ref_count=count)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=[StoredImage.path],
+            set_={"ref_count": StoredImage.ref_count + count},
+        ))
+        return
+    result = connection.execute(
+        update(StoredImage).where(StoredImage.path == path).values(ref_count=StoredImage.ref_count + count)
+    )
+    if result.rowcount == 0:
+        connection.execute(StoredImage.__table__.insert().values(path=path, sha256=sha256, ref_count=count))
+
+
+@event.listens_for(Session, "before_flush")
+def _update_image_references(session, flush_context, instances):
+    """
+    Keep stored_images.ref_count in step with products.local_image_path, in the
+    same transaction as the product write. Images left with no references are
+    collected once the transaction commits, see _remove_unreferenced_images.
+    """
+    deltas = Counter()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Product):
+            continue
+        history = inspect(obj).attrs.local_image_path.history
+        if obj in session.deleted:
+            old_paths, new_paths = (history.deleted or history.unchanged or [obj.local_image_path]), []
+        elif not history.has_changes():
+            continue
+        else:
+            old_paths, new_paths = history.deleted, history.added
+        for path in old_paths:
+            if _is_stored_image(path):
+                deltas[path] -= 1
+        for path in new_paths:
+            if _is_stored_image(path):
+                deltas[path] += 1
+
+    if not any(deltas.values()):
+        return
+
+    connection = session.connection()
+    released = []
+    for path, count in deltas.items():
+        if count > 0:
+            _add_references(connection, path, count)
+        elif count < 0:
+            connection.execute(
+                update(StoredImage).where(StoredImage.path == path).values(ref_count=StoredImage.ref_count + count)
+            )
+            released.append(path)
+
+    if released:
+        unreferenced = connection.execute(
+            select(StoredImage.path).where(StoredImage.path.in_(released), StoredImage.ref_count <= 0)
+        ).scalars().all()
+        if unreferenced:
+            session.info.setdefault(IMAGE_REMOVALS_KEY, set()).update(unreferenced)
+
+
+def _remove_image_files(path: str) -> None:
+    """Delete an image file and its variants from disk."""
+    stem = os.path.splitext(path)[0]
+    for file_path in [path] + glob.glob(f"{glob.escape(stem)}_*"):
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            logger.exception(f"Could not remove unreferenced image {file_path}")
+
+
+@event.listens_for(Session, "after_commit")
+def _remove_unreferenced_images(session):
+    """
+    Delete image files (and their variants) no product references anymore, with their
+    stored_images rows. Each row is locked and re-checked first, and the files go before
+    the row does: a product taking a new reference to the same content waits on that lock,
+    and its upload is published (see publish_stored_image_async) only after the collection
+    committed, so a referenced image is never deleted.
+    """
+    removals = session.info.pop(IMAGE_REMOVALS_KEY, ())
+    if not removals:
+        return
+    with session.get_bind().begin() as connection:
+        for path in removals:
+            unreferenced = connection.execute(
+                select(StoredImage.path)
+                .where(StoredImage.path == path, StoredImage.ref_count <= 0)
+                .with_for_update()
+            ).scalar()
+            if unreferenced is None:
+                continue  # Referenced again since, or already collected
+            _remove_image_files(path)
+            connection.execute(delete(StoredImage).where(StoredImage.path == path))
+
+
+async def publish_stored_image_async(db: AsyncSession, saved: SavedUpload) -> None:
+    """
+    Move a staged upload into the store once the product referencing it has committed.
+    Runs under the stored_images row lock, so a collection of the same content whose last
+    reference was just dropped either finished before (and the file is written again) or
+    sees the new reference and keeps the file. Uploads nothing references are discarded.
+    """
+    try:
+        ref_count = (await db.execute(
+            select(StoredImage.ref_count).where(StoredImage.path == saved.path).with_for_update()
+        )).scalar()
+        if ref_count:
+            await asyncio.to_thread(publish_upload, saved)
+        else:
+            discard_upload(saved)  # The product lost its image (or was deleted) in the meantime
+        await db.commit()
+    except BaseException:
+        discard_upload(saved)
+        await db.rollback()
+        raise
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_image_removals(session):
+    """Nothing was persisted, so every image is still referenced."""
+    session.info.pop(IMAGE_REMOVALS_KEY, None)
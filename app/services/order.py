@@ -1,68 +1,167 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from datetime import datetime
 from app.models.order import (Order, OrderItem)
 from app.models.cart import (Cart,CartItem)
+from app.models.product import Product
+from app.services.cart import write_stored_cart_async
+from app.services.outbox import ORDER_CREATED, ORDER_STATUS_CHANGED, outbox_event
+from app.services.sales import order_sale_lines, sales_rollup_statements, status_change_sign
+from app.utils.cart_store import cart_store
 from typing import Optional
 
+# Statuses an order can move through; update_order_status rejects anything else
+ORDER_STATUSES = ("pending", "processing", "shipped", "delivered", "cancelled")
 
-def create_order(db: Session, user_id: int) -> Optional[Order]:
+# Loading profile for every order handed back to callers. The Order schema serializes
+# items[].product, so an order history costs three queries (orders, items, products)
+# no matter how many orders or items it contains.
+ORDER_LOAD_OPTIONS = (
+    selectinload(Order.items).selectinload(OrderItem.product),
+)
+
+
+def _order_query():
+    """Select orders using the ORDER_LOAD_OPTIONS profile"""
+    return (
+        select(Order)
+        .options(*ORDER_LOAD_OPTIONS)
+        .execution_options(populate_existing=True)  # Pick up items added since the last fetch
+    )
+
+
+def _locked_cart_query(user_id: int):
+    """Select the user's cart id, locking the cart row until checkout commits"""
+    return select(Cart.id).where(Cart.user_id == user_id).with_for_update()
+
+
+def _cart_lines_query(cart_id: int):
     """
-    Creates an order from the user's cart
-    Returns None if cart is empty
+    Select (product_id, quantity, price, category_id) for every cart line in one joined query.
+    Product rows are share-locked so prices can't change between totalling and insert.
+    Lines whose product no longer exists drop out of the inner join.
     """
-    cart = db.query(Cart).filter(Cart.user_id == user_id).first()
-    if not cart or not cart.items:
-        return None
-
-    # Calculate total amount
-    total_amount = sum(
-        item.product.price * item.quantity
-        for item in cart.items
-        if item.product  # Ensure product exists
+    return (
+        select(CartItem.product_id, CartItem.quantity, Product.price, Product.category_id)
+        .join(Product, Product.id == CartItem.product_id)
+        .where(CartItem.cart_id == cart_id)
+        .order_by(CartItem.id)
+        .with_for_update(read=True, of=Product)
     )
 
-    # Create the order
-    order = Order(
+
+def _new_order(user_id: int, lines) -> Order:
+    """Build the pending order for the given cart lines"""
+    return Order(
         user_id=user_id,
-        total_amount=total_amount,
+        total_amount=sum(line.price * line.quantity for line in lines),
         created_at=datetime.utcnow(),
         status="pending"
     )
-    db.add(order)
-    db.commit()
-    db.refresh(order)
-
-    # Create order items
-    for cart_item in cart.items:
-        if not cart_item.product:
-            continue  # Skip items with missing products
-
-        order_item = OrderItem(
-            order_id=order.id,
-            product_id=cart_item.product_id,
-            quantity=cart_item.quantity,
-            price_at_purchase=cart_item.product.price
-        )
-        db.add(order_item)
 
-    # Clear the cart
-    db.query(CartItem).filter(CartItem.cart_id == cart.id).delete()
-    db.commit()
 
-    return order
+def _order_item_rows(order_id: int, lines) -> list[dict]:
+    """Parameter sets for the single bulk insert of order items"""
+    return [
+        {
+            "order_id": order_id,
+            "product_id": line.product_id,
+            "quantity": line.quantity,
+            "price_at_purchase": line.price,
+            "category_id": line.category_id,
+        }
+        for line in lines
+    ]
+
+
+def _order_created_event(order: Order, lines):
+    """Outbox event for a new order, added to the checkout transaction"""
+    return outbox_event(ORDER_CREATED, {
+        "order_id": order.id,
+        "user_id": order.user_id,
+        "total_amount": order.total_amount,
+        "created_at": order.created_at.isoformat(),
+        "items": [
+            {"product_id": line.product_id, "quantity": line.quantity, "price": line.price}
+            for line in lines
+        ],
+    })
+
+
+def _status_changed_event(order: Order, old_status: str):
+    """Outbox event for an order status change, added to the transaction that makes it"""
+    return outbox_event(ORDER_STATUS_CHANGED, {
+        "order_id": order.id,
+        "user_id": order.user_id,
+        "old_status": old_status,
+        "new_status": order.status,
+    })
+
+
+def _update_sales_rollups(db: Session, order: Order, sign: int) -> None:
+    """Add the order to the sales rollups (sign=1) or take it out (sign=-1), uncommitted"""
+    if sign:
+        for statement, parameters in sales_rollup_statements(
+                db.get_bind().dialect.name, order.created_at, order_sale_lines(order), sign):
+            db.execute(statement, parameters)
+
+
+async def _update_sales_rollups_async(db: AsyncSession, order: Order, sign: int) -> None:
+    """Async variant of _update_sales_rollups"""
+    if sign:
+        for statement, parameters in sales_rollup_statements(
+                db.get_bind().dialect.name, order.created_at, order_sale_lines(order), sign):
+            await db.execute(statement, parameters)
+
+
+def create_order(db: Session, user_id: int) -> Optional[Order]:
+    """
+    Creates an order from the user's cart in a single transaction
+    The cart row is locked, the total comes from one joined query, order items
+    are bulk-inserted in one statement, the cart is cleared, the sales rollups are
+    updated and the order.created outbox event is added before the one commit,
+    so a failure never leaves a partial order (or an event for one) behind
+    Reads cart_items only; carts held in a cart store are checked out by create_order_async
+    Returns None if cart is empty
+    """
+    try:
+        cart_id = db.execute(_locked_cart_query(user_id)).scalar()
+        lines = db.execute(_cart_lines_query(cart_id)).all() if cart_id is not None else []
+        if not lines:
+            db.rollback()  # Release the cart lock
+            return None
+
+        order = _new_order(user_id, lines)
+        db.add(order)
+        db.flush()  # Assign the order id without committing
+
+        db.execute(insert(OrderItem), _order_item_rows(order.id, lines))
+        db.execute(delete(CartItem).where(CartItem.cart_id == cart_id))
+        for statement, parameters in sales_rollup_statements(
+                db.get_bind().dialect.name, order.created_at, lines, 1):
+            db.execute(statement, parameters)
+        db.add(_order_created_event(order, lines))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return get_order_details(db, order.id)
 
 
 def get_user_orders(db: Session, user_id: int) -> list[Order]:
-    """Returns all orders for a user"""
-    return db.query(Order).filter(Order.user_id == user_id) \
-        .order_by(Order.created_at.desc()) \
-        .all()
+    """Returns all orders for a user, with items and products loaded"""
+    return list(db.execute(
+        _order_query()
+        .where(Order.user_id == user_id)
+        .order_by(Order.created_at.desc())
+    ).scalars().all())
 
 
 def get_order_details(db: Session, order_id: int) -> Optional[Order]:
-    """Returns detailed order information"""
-    return db.query(Order).filter(Order.id == order_id) \
-        .first()
+    """Returns detailed order information, with items and products loaded"""
+    return db.execute(_order_query().where(Order.id == order_id)).scalars().first()
 
 
 def cancel_order(db: Session, order_id: int, user_id: int) -> Optional[Order]:
@@ -70,26 +169,30 @@ def cancel_order(db: Session, order_id: int, user_id: int) -> Optional[Order]:
     Cancels an order if it's still pending
     Returns the cancelled order or None if cancellation failed
     """
-    order = db.query(Order).filter(
-        Order.id == order_id,
-        Order.user_id == user_id,
-        Order.status == "pending"
-    ).first()
+    order = db.execute(
+        _order_query().where(
+            Order.id == order_id,
+            Order.user_id == user_id,
+            Order.status == "pending"
+        ).with_for_update(of=Order)  # Concurrent cancels can't both take the order out of the rollups
+    ).scalars().first()
 
     if not order:
         return None
 
     order.status = "cancelled"
     order.cancelled_at = datetime.utcnow()
+    _update_sales_rollups(db, order, -1)
+    db.add(_status_changed_event(order, "pending"))
     db.commit()
-    db.refresh(order)
 
-    return order
+    return get_order_details(db, order.id)
 
 
 def get_order_items(db: Session, order_id: int) -> list[OrderItem]:
-    """Returns all items for a specific order"""
+    """Returns all items for a specific order, with products loaded"""
     return db.query(OrderItem).filter(OrderItem.order_id == order_id) \
+        .options(selectinload(OrderItem.product)) \
         .all()
 
 
@@ -102,15 +205,20 @@ def update_order_status(
     Updates order status (admin function)
     Valid statuses: pending, processing, shipped, delivered, cancelled
     """
-    valid_statuses = ["pending", "processing", "shipped", "delivered", "cancelled"]
-    if new_status not in valid_statuses:
+    if new_status not in ORDER_STATUSES:
         return None
 
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = db.execute(
+        _order_query().where(Order.id == order_id).with_for_update(of=Order)  # Status and rollups change together
+    ).scalars().first()
     if not order:
         return None
 
+    old_status = order.status
+    _update_sales_rollups(db, order, status_change_sign(old_status, new_status))
     order.status = new_status
+    if new_status != old_status:
+        db.add(_status_changed_event(order, old_status))
 
     if new_status == "shipped":
         order.shipped_at = datetime.utcnow()
@@ -118,5 +226,135 @@ def update_order_status(
         order.delivered_at = datetime.utcnow()
 
     db.commit()
-    db.refresh(order)
-    return order
\ No newline at end of file
+    return get_order_details(db, order.id)
+
+
+async def create_order_async(db: AsyncSession, user_id: int) -> Optional[Order]:
+    """
+    Async variant of create_order, same single-transaction checkout
+    With a cart store configured, the cached cart is written to cart_items first,
+    under the cart lock and in the checkout transaction
+    Returns None if cart is empty
+    """
+    stored = None
+    try:
+        cart_id = (await db.execute(_locked_cart_query(user_id))).scalar()
+        if cart_store is not None and cart_id is not None:
+            stored = await write_stored_cart_async(db, user_id)
+        lines = (await db.execute(_cart_lines_query(cart_id))).all() if cart_id is not None else []
+        if not lines:
+            await db.rollback()  # Release the cart lock
+            if cart_store is not None:
+                await cart_store.mark_dirty(user_id)  # Let write-behind persist the emptied cart instead
+            return None
+
+        order = _new_order(user_id, lines)
+        db.add(order)
+        await db.flush()  # Assign the order id without committing
+
+        await db.execute(insert(OrderItem), _order_item_rows(order.id, lines))
+        await db.execute(delete(CartItem).where(CartItem.cart_id == cart_id))
+        for statement, parameters in sales_rollup_statements(
+                db.get_bind().dialect.name, order.created_at, lines, 1):
+            await db.execute(statement, parameters)
+        db.add(_order_created_event(order, lines))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        if cart_store is not None:
+            await cart_store.mark_dirty(user_id)  # The cached cart wasn't persisted after all
+        raise
+
+    if stored is not None:
+        # cart_items were cleared with the order; take the ordered lines out of the cached cart too,
+        # keeping changes made to it since it was written
+        await cart_store.remove_checked_out(
+            user_id, cart_id, {line.product_id: line.quantity for line in lines}, stored.version
+        )
+    return await get_order_details_async(db, order.id)
+
+
+async def get_user_orders_async(db: AsyncSession, user_id: int) -> list[Order]:
+    """Async variant of get_user_orders"""
+    result = await db.execute(
+        _order_query()
+        .where(Order.user_id == user_id)
+        .order_by(Order.created_at.desc())
+    )
+    return list(result.scalars().all())
+
+
+async def get_order_details_async(db: AsyncSession, order_id: int) -> Optional[Order]:
+    """Async variant of get_order_details"""
+    result = await db.execute(_order_query().where(Order.id == order_id))
+    return result.scalars().first()
+
+
+async def cancel_order_async(db: AsyncSession, order_id: int, user_id: int) -> Optional[Order]:
+    """
+    Async variant of cancel_order
+    Returns the cancelled order or None if cancellation failed
+    """
+    result = await db.execute(
+        _order_query().where(
+            Order.id == order_id,
+            Order.user_id == user_id,
+            Order.status == "pending"
+        ).with_for_update(of=Order)  # Concurrent cancels can't both take the order out of the rollups
+    )
+    order = result.scalars().first()
+
+    if not order:
+        return None
+
+    order.status = "cancelled"
+    order.cancelled_at = datetime.utcnow()
+    await _update_sales_rollups_async(db, order, -1)
+    db.add(_status_changed_event(order, "pending"))
+    await db.commit()
+
+    return order
+
+
+async def get_order_items_async(db: AsyncSession, order_id: int) -> list[OrderItem]:
+    """Async variant of get_order_items"""
+    result = await db.execute(
+        select(OrderItem)
+        .where(OrderItem.order_id == order_id)
+        .options(selectinload(OrderItem.product))
+    )
+    return list(result.scalars().all())
+
+
+async def update_order_status_async(
+        db: AsyncSession,
+        order_id: int,
+        new_status: str
+) -> Optional[Order]:
+    """
+    Async variant of update_order_status (admin function)
+    Valid statuses: pending, processing, shipped, delivered, cancelled
+    """
+    if new_status not in ORDER_STATUSES:
+        return None
+
+    result = await db.execute(
+        _order_query().where(Order.id == order_id).with_for_update(of=Order)  # Status and rollups change together
+    )
+    order = result.scalars().first()
+    if not order:
+        return None
+
+    old_status = order.status
+    await _update_sales_rollups_async(db, order, status_change_sign(old_status, new_status))
+    order.status = new_status
+    if new_status != old_status:
+        db.add(_status_changed_event(order, old_status))
+
+    if new_status == "shipped":
+        order.shipped_at = datetime.utcnow()
+    elif new_status == "delivered":
+        order.delivered_at = datetime.utcnow()
+
+    await db.commit()
+    return order
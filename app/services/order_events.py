@@ -0,0 +1,21 @@
+import logging
+from app.services.outbox import ORDER_CREATED, ORDER_STATUS_CHANGED, outbox_handler
+
+logger = logging.getLogger(__name__)
+
+# Default post-checkout side effects, run by the outbox worker (OUTBOX_HANDLER_MODULES).
+# Notifications, fulfilment or analytics hooks belong here, off the request path;
+# each may see the same event more than once.
+
+
+@outbox_handler(ORDER_CREATED)
+def log_order_created(payload: dict) -> None:
+    """Record a placed order"""
+    logger.info(f"Order {payload['order_id']} placed by user {payload['user_id']}: "
+                f"{len(payload['items'])} items, total {payload['total_amount']:.2f}")
+
+
+@outbox_handler(ORDER_STATUS_CHANGED)
+def log_order_status_changed(payload: dict) -> None:
+    """Record an order moving between statuses"""
+    logger.info(f"Order {payload['order_id']} went from {payload['old_status']} to {payload['new_status']}")
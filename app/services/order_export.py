@@ -0,0 +1,110 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Optional
+from sqlalchemy import select
+from app.database import AsyncReadSessionLocal
+from app.models.order import Order, OrderItem
+
+EXPORT_FORMATS = ("csv", "ndjson")
+
+# Rows fetched per round trip from the server-side cursor, and per chunk written to the response
+EXPORT_BATCH_SIZE = 1000
+
+# One CSV line per order item; orders without items get a line with empty item columns
+EXPORT_COLUMNS = (
+    "order_id", "user_id", "created_at", "status", "total_amount",
+    "item_id", "product_id", "quantity", "price_at_purchase",
+)
+
+
+def _order_export_query(start: Optional[datetime], end: Optional[datetime], status: Optional[str]):
+    """
+    Select flat (order, item) rows in (created_at, id) order, so an order's items are adjacent.
+    `start` is inclusive, `end` exclusive.
+    """
+    stmt = (
+        select(
+            Order.id.label("order_id"), Order.user_id, Order.created_at, Order.status, Order.total_amount,
+            OrderItem.id.label("item_id"), OrderItem.product_id, OrderItem.quantity, OrderItem.price_at_purchase,
+        )
+        .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+        .order_by(Order.created_at, Order.id, OrderItem.id)
+    )
+    if start is not None:
+        stmt = stmt.where(Order.created_at >= start)
+    if end is not None:
+        stmt = stmt.where(Order.created_at < end)
+    if status is not None:
+        stmt = stmt.where(Order.status == status)
+    return stmt.execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+
+def _csv_chunk(rows, header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow([
+            value.isoformat() if isinstance(value, datetime) else value
+            for value in row
+        ])
+    return buffer.getvalue()
+
+
+def _order_line(order: dict) -> str:
+    return json.dumps(order, default=datetime.isoformat) + "\n"
+
+
+async def stream_order_export(
+        format: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        status: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    Yield orders with their items as CSV (one line per item, with a header) or NDJSON
+    (one order per line with an `items` list), EXPORT_BATCH_SIZE rows per chunk.
+    Rows come from a server-side cursor in a read session of its own (the replica, when configured)
+    that stays open while the response streams, so memory stays flat however many orders match.
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {format}")
+
+    async with AsyncReadSessionLocal() as db:
+        result = await db.stream(_order_export_query(start, end, status))
+        if format == "csv":
+            yield _csv_chunk([], header=True)
+            async for rows in result.partitions():
+                yield _csv_chunk(rows)
+            return
+
+        # NDJSON: items of one order are adjacent, so only the current order is held
+        order = None
+        async for rows in result.partitions():
+            lines = []
+            for row in rows:
+                if order is None or order["id"] != row.order_id:
+                    if order is not None:
+                        lines.append(_order_line(order))
+                    order = {
+                        "id": row.order_id,
+                        "user_id": row.user_id,
+                        "created_at": row.created_at,
+                        "status": row.status,
+                        "total_amount": row.total_amount,
+                        "items": [],
+                    }
+                if row.item_id is not None:
+                    order["items"].append({
+                        "id": row.item_id,
+                        "product_id": row.product_id,
+                        "quantity": row.quantity,
+                        "price_at_purchase": row.price_at_purchase,
+                    })
+            if lines:
+                yield "".join(lines)
+        if order is not None:
+            yield _order_line(order)
@@ -0,0 +1,190 @@
+import asyncio
+import importlib
+import inspect
+import logging
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Union
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.outbox import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+# Event statuses: waiting for (re)delivery, delivered, or out of attempts
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+# Topics written by the order services
+ORDER_CREATED = "order.created"
+ORDER_STATUS_CHANGED = "order.status_changed"
+
+OutboxHandler = Callable[[dict], Union[None, Awaitable[None]]]
+
+# topic -> handlers, filled by outbox_handler() when handler modules are imported
+_handlers: Dict[str, List[OutboxHandler]] = defaultdict(list)
+
+
+def outbox_handler(topic: str):
+    """
+    Register the decorated function to receive every event of `topic` as its payload dict.
+    Handlers may be sync (run in a thread) or async. Delivery is at least once: an event is
+    redelivered to all of its handlers if any of them raises, or if the worker dies midway,
+    so handlers must tolerate repeats (e.g. key side effects on the order id).
+    """
+    def register(handler: OutboxHandler) -> OutboxHandler:
+        _handlers[topic].append(handler)
+        return handler
+    return register
+
+
+def load_outbox_handlers(modules: Iterable[str]) -> None:
+    """Import the modules whose @outbox_handler functions the worker should run."""
+    for module in modules:
+        importlib.import_module(module)
+
+
+def outbox_event(topic: str, payload: dict) -> OutboxEvent:
+    """
+    A new event for `topic`. db.add() it in the transaction that makes the change it
+    describes: the event exists if and only if that change commits.
+    """
+    now = datetime.utcnow()
+    return OutboxEvent(topic=topic, payload=payload, status=PENDING, attempts=0, available_at=now, created_at=now)
+
+
+def _claimable_query(now: datetime, batch_size: int):
+    # SKIP LOCKED lets concurrent workers claim disjoint batches on PostgreSQL;
+    # SQLite ignores it and serializes the claim transactions instead
+    return (
+        select(OutboxEvent.id)
+        .where(OutboxEvent.status == PENDING, OutboxEvent.available_at <= now)
+        .order_by(OutboxEvent.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+
+
+def _claim_statement(ids: List[int], now: datetime, lease_until: datetime):
+    """
+    Lease the selected events until `lease_until`, counting the attempt. The conditions are
+    repeated so an event another worker claimed in the meantime isn't returned twice.
+    """
+    return (
+        update(OutboxEvent)
+        .where(OutboxEvent.id.in_(ids), OutboxEvent.status == PENDING, OutboxEvent.available_at <= now)
+        .values(available_at=lease_until, attempts=OutboxEvent.attempts + 1)
+        .returning(OutboxEvent.id, OutboxEvent.topic, OutboxEvent.payload, OutboxEvent.attempts)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def claim_outbox_events_async(db: AsyncSession, batch_size: int) -> list:
+    """
+    Claim up to `batch_size` due events, oldest first, and commit the claim.
+    Each is leased for OUTBOX_LEASE_SECONDS: if it isn't settled by then (the worker died),
+    it becomes due again. Returns (id, topic, payload, attempts) rows.
+    """
+    now = datetime.utcnow()
+    ids = list((await db.execute(_claimable_query(now, batch_size))).scalars().all())
+    if not ids:
+        await db.rollback()
+        return []
+    lease_until = now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+    rows = (await db.execute(_claim_statement(ids, now, lease_until))).all()
+    await db.commit()
+    return sorted(rows, key=lambda row: row.id)
+
+
+def retry_delay(attempts: int) -> float:
+    """
+    Seconds before the next delivery after `attempts` failed ones: OUTBOX_BACKOFF_SECONDS
+    doubling per attempt, capped at OUTBOX_MAX_BACKOFF_SECONDS, with jitter so events that
+    failed together don't retry in lockstep.
+    """
+    delay = min(settings.OUTBOX_MAX_BACKOFF_SECONDS, settings.OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+async def _deliver(topic: str, payload: dict) -> None:
+    for handler in _handlers.get(topic, ()):
+        if inspect.iscoroutinefunction(handler):
+            await handler(payload)
+        else:
+            await asyncio.to_thread(handler, payload)
+
+
+def _settled_statement(event_id: int, values: dict):
+    return update(OutboxEvent).where(OutboxEvent.id == event_id).values(**values) \
+        .execution_options(synchronize_session=False)
+
+
+async def process_outbox_batch(batch_size: int) -> int:
+    """
+    Claim one batch, deliver each event to its topic's handlers in order, and record the
+    outcomes in one commit: delivered, retried later with backoff, or failed for good after
+    OUTBOX_MAX_ATTEMPTS. Returns the number of events claimed.
+    """
+    async with AsyncSessionLocal() as db:
+        events = await claim_outbox_events_async(db, batch_size)
+        for event in events:
+            try:
+                await _deliver(event.topic, event.payload)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"[:1000]
+                if event.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                    logger.error(f"Outbox event {event.id} ({event.topic}) failed {event.attempts} times, "
+                                 f"giving up: {error}")
+                    values = {"status": FAILED, "processed_at": datetime.utcnow(), "last_error": error}
+                else:
+                    delay = retry_delay(event.attempts)
+                    logger.warning(f"Outbox event {event.id} ({event.topic}) failed, retrying in {delay:.0f}s: {error}")
+                    values = {"available_at": datetime.utcnow() + timedelta(seconds=delay), "last_error": error}
+            else:
+                values = {"status": DONE, "processed_at": datetime.utcnow()}
+            await db.execute(_settled_statement(event.id, values))
+        await db.commit()
+    return len(events)
+
+
+async def purge_outbox_events_async(older_than: datetime) -> int:
+    """Delete delivered events processed before `older_than`; failed ones stay for inspection."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            delete(OutboxEvent).where(OutboxEvent.status == DONE, OutboxEvent.processed_at < older_than)
+        )
+        await db.commit()
+    return result.rowcount
+
+
+async def run_outbox_worker(
+        batch_size: int,
+        poll_interval: float,
+        stop: Optional[asyncio.Event] = None
+) -> None:
+    """
+    Deliver outbox events until `stop` is set: batches back to back while there is a
+    backlog, polling every `poll_interval` seconds once it is drained. Any number of
+    workers can run side by side. Delivered events are purged after OUTBOX_RETENTION_DAYS.
+    """
+    stop = stop or asyncio.Event()
+    next_purge = datetime.utcnow()
+    while not stop.is_set():
+        try:
+            claimed = await process_outbox_batch(batch_size)
+            if datetime.utcnow() >= next_purge:
+                await purge_outbox_events_async(datetime.utcnow() - timedelta(days=settings.OUTBOX_RETENTION_DAYS))
+                next_purge = datetime.utcnow() + timedelta(hours=1)
+        except Exception as e:
+            # E.g. the database is briefly unreachable: keep the worker alive and poll again
+            logger.error(f"Outbox worker cycle failed: {e}", exc_info=True)
+            claimed = 0
+        if claimed < batch_size:
+            try:
+                await asyncio.wait_for(stop.wait(), poll_interval)
+            except asyncio.TimeoutError:
+                pass
@@ -1,13 +1,154 @@
+import logging
+import re
+from typing import Optional
+from sqlalchemy import column, event, func, literal_column, or_, select, table, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from app.database import AsyncSessionLocal
+from app.models.category import Category
 from app.models.product import Product
 from app.schemas.product import ProductCreate
+from app.services import category, image  # noqa: F401  Registers the category count and image refcount listeners
+from app.utils.catalog_cache import catalog_cache
+from app.utils.image_variants import image_variant_pool
+from app.utils.pagination import decode_cursor, encode_cursor
+from app.utils.read_your_writes import CATALOG_WRITES, recent_writes
 
-def get_products(db: Session, skip: int = 0, limit: int = 100):
+logger = logging.getLogger(__name__)
+
+# Columns products can be keyset-paginated on; each has a (column, id) index
+PRODUCT_SORT_KEYS = {
+    "id": Product.id,
+    "name": Product.name,
+    "price": Product.price,
+}
+
+def _in_category(query, category: Optional[str]):
+    """
+    Restrict a products query to one category, by name.
+    Matches on category_id so the (category_id, id) index serves the filter.
+    """
+    if category is None:
+        return query
+    category_id = select(Category.id).where(Category.name == category).scalar_subquery()
+    return query.where(Product.category_id == category_id)
+
+def _products_query(skip: int, limit: int, category: Optional[str] = None):
+    query = _in_category(select(Product), category)
+    return query.order_by(Product.id).offset(skip).limit(limit)  # Fetch products with pagination
+
+def get_products(db: Session, skip: int = 0, limit: int = 100, category: Optional[str] = None):
     """
     Retrieve a list of products, with pagination support.
-    Skips the first 'skip' products and limits the result to 'limit' products.
+    Skips the first 'skip' products and limits the result to 'limit' products,
+    optionally only those in `category`.
+    """
+    return db.execute(_products_query(skip, limit, category)).scalars().all()
+
+def _products_page_query(sort: str, cursor: Optional[str], limit: int, category: Optional[str] = None):
+    """
+    Build a keyset (seek) query for one page of products ordered by (sort, id).
+    Fetches one extra row so the caller can tell whether another page exists.
+    """
+    if sort not in PRODUCT_SORT_KEYS:
+        raise ValueError(f"Unsupported sort key: {sort}")
+    if limit < 1:
+        raise ValueError("Limit must be positive")
+    sort_column = PRODUCT_SORT_KEYS[sort]
+
+    query = _in_category(select(Product), category)
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort)
+        if sort == "id":
+            query = query.where(Product.id > last_id)
+        else:
+            # Row-value comparison lets the (sort, id) index seek straight to the next row
+            query = query.where(tuple_(sort_column, Product.id) > tuple_(value, last_id))
+    order_by = (Product.id,) if sort == "id" else (sort_column, Product.id)
+    return query.order_by(*order_by).limit(limit + 1)
+
+def _products_page(products: list, sort: str, limit: int):
+    """
+    Trim the extra row fetched by _products_page_query and build the next cursor.
+    """
+    if len(products) <= limit:
+        return products, None
+    products = products[:limit]
+    last = products[-1]
+    return products, encode_cursor(sort, getattr(last, sort), last.id)
+
+def get_products_page(
+        db: Session,
+        sort: str = "id",
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        category: Optional[str] = None
+):
+    """
+    Retrieve one page of products using keyset pagination.
+    Returns (products, next_cursor); next_cursor is None on the last page.
+    Raises ValueError for an unknown sort key or an invalid cursor.
     """
-    return db.query(Product).offset(skip).limit(limit).all()  # Fetch products with pagination
+    products = db.execute(_products_page_query(sort, cursor, limit, category)).scalars().all()
+    return _products_page(products, sort, limit)
+
+# Terms of a search query; anything else (FTS operators, quotes, punctuation) is ignored
+SEARCH_TERM = re.compile(r"\w+")
+
+# SQLite FTS5 table maintained by triggers, see app/models/product.py
+products_fts = table("products_fts", column("rowid"))
+
+def _search_query(dialect: str, q: str, limit: int):
+    """
+    Build a ranked search over name, description and category for the given dialect.
+    Returns None when `q` contains no searchable terms.
+    """
+    terms = SEARCH_TERM.findall(q)
+    if not terms:
+        return None
+
+    if dialect == "postgresql":
+        # Full-text match on the weighted search_vector, or a trigram match on name for
+        # partial words and typos; both are answered from GIN indexes
+        query = func.websearch_to_tsquery("english", q)
+        search_vector = literal_column("products.search_vector")
+        rank = func.ts_rank_cd(search_vector, query) + func.similarity(Product.name, q)
+        return (
+            select(Product)
+            .where(or_(search_vector.op("@@")(query), Product.name.op("%")(q)))
+            .order_by(rank.desc(), Product.id)
+            .limit(limit)
+        )
+
+    if dialect == "sqlite":
+        # Quoted terms are matched literally (AND-ed); the last one also matches as a prefix
+        match = " ".join(f'"{term}"' for term in terms) + "*"
+        fts = literal_column("products_fts")
+        return (
+            select(Product)
+            .join(products_fts, products_fts.c.rowid == Product.id)
+            .where(fts.op("MATCH")(match))
+            .order_by(func.bm25(fts, 10.0, 1.0, 5.0), Product.id)  # Column weights: name, description, category
+            .limit(limit)
+        )
+
+    # No text index on other backends: unranked substring match
+    pattern = f"%{q}%"
+    return (
+        select(Product)
+        .where(or_(Product.name.ilike(pattern), Product.description.ilike(pattern), Product.category.ilike(pattern)))
+        .order_by(Product.id)
+        .limit(limit)
+    )
+
+def search_products(db: Session, q: str, limit: int = 20):
+    """
+    Full-text search over products, best matches first.
+    """
+    query = _search_query(db.get_bind().dialect.name, q, limit)
+    if query is None:
+        return []
+    return db.execute(query).scalars().all()
 
 def create_product(db: Session, product: ProductCreate):
     """
@@ -24,3 +165,105 @@ def get_product(db: Session, product_id: int):
     Retrieve a specific product by its ID.
     """
     return db.query(Product).filter(Product.id == product_id).first()  # Fetch the product by its ID
+
+
+async def get_products_async(db: AsyncSession, skip: int = 0, limit: int = 100, category: Optional[str] = None):
+    """
+    Async variant of get_products for the request handlers.
+    """
+    result = await db.execute(_products_query(skip, limit, category))
+    return result.scalars().all()
+
+async def get_products_page_async(
+        db: AsyncSession,
+        sort: str = "id",
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        category: Optional[str] = None
+):
+    """
+    Async variant of get_products_page for the request handlers.
+    """
+    result = await db.execute(_products_page_query(sort, cursor, limit, category))
+    return _products_page(result.scalars().all(), sort, limit)
+
+async def search_products_async(db: AsyncSession, q: str, limit: int = 20):
+    """
+    Async variant of search_products for the request handlers.
+    """
+    query = _search_query(db.get_bind().dialect.name, q, limit)
+    if query is None:
+        return []
+    return (await db.execute(query)).scalars().all()
+
+async def create_product_async(db: AsyncSession, product: ProductCreate):
+    """
+    Async variant of create_product for the request handlers.
+    """
+    db_product = Product(**product.dict())  # Instantiate a new Product object from the provided schema
+    db.add(db_product)  # Add the new product to the session
+    await db.commit()  # Commit the transaction to save the product to the database
+    await db.refresh(db_product)  # Refresh the object to get the updated product with an ID
+    return db_product  # Return the created product
+
+async def get_product_async(db: AsyncSession, product_id: int):
+    """
+    Async variant of get_product for the request handlers.
+    """
+    return await db.get(Product, product_id)  # Fetch the product by its ID
+
+async def set_product_image_variants_async(db: AsyncSession, product_id: int, source_path: str, variants: dict):
+    """
+    Record generated image variants on a product.
+    Skipped if the product was deleted or got a newer image while the variants were generated.
+    """
+    db_product = await db.get(Product, product_id)
+    if db_product is None or db_product.local_image_path != source_path:
+        return False
+    db_product.image_variants = variants
+    await db.commit()
+    return True
+
+async def generate_product_image_variants(product_id: int, source_path: str):
+    """
+    Background task run after an image upload: resize it in the image process pool
+    and store the variant paths on the product.
+    """
+    try:
+        variants = await image_variant_pool.generate(source_path)
+        async with AsyncSessionLocal() as db:
+            await set_product_image_variants_async(db, product_id, source_path, variants)
+    except Exception:
+        # Nobody awaits a background task, so log instead of losing the error
+        logger.exception(f"Generating image variants for product {product_id} failed")
+
+
+CATALOG_CHANGES_KEY = "catalog_cache_changes"
+
+@event.listens_for(Session, "after_flush")
+def _collect_catalog_changes(session, flush_context):
+    """
+    Record which products were inserted, updated or deleted in this transaction.
+    """
+    changed = [obj for obj in list(session.new) + list(session.deleted) if isinstance(obj, Product)]
+    changed += [obj for obj in session.dirty
+                if isinstance(obj, Product) and session.is_modified(obj, include_collections=False)]
+    if changed:
+        session.info.setdefault(CATALOG_CHANGES_KEY, set()).update(obj.id for obj in changed)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_catalog_cache(session):
+    """
+    Drop cached catalog responses once the product change is committed.
+    """
+    product_ids = session.info.pop(CATALOG_CHANGES_KEY, None)
+    if product_ids is not None:
+        catalog_cache.invalidate(product_ids)
+        recent_writes.record(CATALOG_WRITES)  # Refill the cache from the primary, not a lagging replica
+
+@event.listens_for(Session, "after_rollback")
+def _discard_catalog_changes(session):
+    """
+    Nothing was persisted, so the cached catalog is still valid.
+    """
+    session.info.pop(CATALOG_CHANGES_KEY, None)
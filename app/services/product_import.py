@@ -0,0 +1,283 @@
+import csv
+import io
+import json
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional, TextIO, Tuple
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.product import Product
+from app.schemas.product import ProductCreate
+from app.services.category import apply_category_count_deltas, get_or_create_category_ids, normalize_category
+from app.utils.catalog_cache import catalog_cache
+from app.utils.read_your_writes import CATALOG_WRITES, recent_writes
+from app.utils.upsert import upsert_insert
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ("csv", "jsonl")
+
+# Product fields a bulk import can set; images are uploaded separately
+IMPORT_FIELDS = ("sku", "name", "description", "price", "image_url", "category")
+
+CHUNK_SIZE = 1000  # Rows validated and written per transaction
+MAX_REPORTED_ERRORS = 1000  # Row errors kept in the report; the rest are only counted
+
+# Columns written per row: the imported fields plus the category link resolved for each chunk
+WRITE_FIELDS = IMPORT_FIELDS + ("category_id",)
+
+# Columns a re-imported SKU overwrites
+UPSERT_FIELDS = ("name", "description", "price", "image_url", "category", "category_id")
+
+
+@dataclass
+class RowError:
+    """Why one input row was skipped."""
+    line: int
+    error: str
+
+
+@dataclass
+class ImportReport:
+    """Running totals of a bulk import, passed to the progress callback after every chunk."""
+    processed: int = 0
+    imported: int = 0
+    failed: int = 0
+    merged: int = 0  # Rows superseded by a later row with the same SKU in the same chunk
+    errors: List[RowError] = field(default_factory=list)
+    errors_truncated: bool = False
+
+    def add_error(self, line: int, error: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(RowError(line=line, error=error))
+        else:
+            self.errors_truncated = True
+
+
+def detect_format(filename: Optional[str]) -> Optional[str]:
+    """Import format implied by a file name (.csv, .jsonl or .ndjson)."""
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return None
+
+
+def iter_records(stream: TextIO, format: str) -> Iterator[Tuple[int, object]]:
+    """
+    Yield (line number, record) pairs from a CSV (with a header row) or JSON Lines stream.
+    A JSONL line that doesn't parse is yielded as its ValueError so it is reported, not fatal.
+    """
+    if format == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif format == "jsonl":
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as e:
+                yield line_number, e
+    else:
+        raise ValueError(f"Unsupported import format: {format}")
+
+
+def _validate(record) -> dict:
+    """
+    Validate one record against ProductCreate and return the row to write.
+    Raises ValueError/ValidationError for invalid records.
+    """
+    if isinstance(record, Exception):
+        raise ValueError(f"Invalid JSON: {record}")
+    if not isinstance(record, dict):
+        raise ValueError("Expected an object")
+    # CSV has no nulls; treat empty cells as missing
+    values = {name: record.get(name) for name in IMPORT_FIELDS if record.get(name) not in (None, "")}
+    product = ProductCreate.model_validate(values)
+    row = product.model_dump(include=set(IMPORT_FIELDS))
+    row["sku"] = (row["sku"] or "").strip() or None
+    row["category"] = normalize_category(row["category"])
+    return row
+
+
+def _chunks(records: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(records)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _write_rows_copy(db: Session, rows: List[dict]) -> None:
+    """
+    PostgreSQL (psycopg2): COPY the chunk into a temp table, then move it into products
+    with set-based INSERT ... SELECT statements, upserting rows that carry a SKU.
+    """
+    columns = ", ".join(WRITE_FIELDS)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([r"\N" if row[name] is None else row[name] for name in WRITE_FIELDS])
+    buffer.seek(0)
+
+    cursor = db.connection().connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS product_import "
+            "(sku text, name text, description text, price double precision, image_url text, category text, "
+            "category_id integer) ON COMMIT DELETE ROWS"
+        )
+        cursor.copy_expert(f"COPY product_import ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+        cursor.execute(f"INSERT INTO products ({columns}) SELECT {columns} FROM product_import WHERE sku IS NULL")
+        updates = ", ".join(f"{name} = excluded.{name}" for name in UPSERT_FIELDS)
+        cursor.execute(
+            f"INSERT INTO products ({columns}) SELECT {columns} FROM product_import WHERE sku IS NOT NULL "
+            f"ON CONFLICT (sku) DO UPDATE SET {updates}"
+        )
+    finally:
+        cursor.close()
+
+
+def _link_categories(db: Session, rows: List[dict]) -> Counter:
+    """
+    Set category_id on every row, creating categories the chunk introduces, and return the
+    product_count change per category id. Products already holding one of the chunk's SKUs
+    are locked, so their current category is what the upsert moves them out of.
+    The core inserts bypass the ORM listeners that keep the counts otherwise.
+    """
+    category_ids = get_or_create_category_ids(db.connection(), [row["category"] for row in rows if row["category"]])
+    skus = [row["sku"] for row in rows if row["sku"] is not None]
+    current = dict(db.execute(
+        select(Product.sku, Product.category_id).where(Product.sku.in_(skus)).with_for_update()
+    ).all()) if skus else {}
+
+    deltas = Counter()
+    for row in rows:
+        row["category_id"] = category_ids.get(row["category"])
+        if row["sku"] in current:
+            deltas[current[row["sku"]]] -= 1
+        deltas[row["category_id"]] += 1
+    return deltas
+
+
+def _write_rows(db: Session, rows: List[dict]) -> None:
+    """
+    Write one chunk as batched INSERTs, upserting rows that carry a SKU, and apply its
+    category count changes in the same transaction.
+    Passing the rows as parameter sets (rather than .values(rows)) keeps one cached statement;
+    drivers then batch it (sqlite3 executemany, psycopg2 multi-row VALUES pages).
+    """
+    deltas = _link_categories(db, rows)
+    apply_category_count_deltas(db.connection(), deltas)
+
+    dialect = db.get_bind().dialect
+    if dialect.name == "postgresql" and dialect.driver == "psycopg2":
+        _write_rows_copy(db, rows)
+        return
+
+    plain = [row for row in rows if row["sku"] is None]
+    keyed = [row for row in rows if row["sku"] is not None]
+    if plain:
+        db.execute(insert(Product), plain)
+    if keyed:
+        upsert = upsert_insert(dialect.name)
+        if upsert is None:
+            raise ValueError(f"SKU upserts are not supported on {dialect.name}")
+        stmt = upsert(Product)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[Product.sku],
+            set_={name: getattr(stmt.excluded, name) for name in UPSERT_FIELDS},
+        ), keyed)
+
+
+def import_products(
+        db: Session,
+        stream: TextIO,
+        format: str,
+        progress: Optional[Callable[[ImportReport], None]] = None
+) -> ImportReport:
+    """
+    Stream products from a CSV or JSONL file into the catalog.
+    Rows are validated against ProductCreate and written CHUNK_SIZE at a time, each chunk in
+    its own transaction with its category count changes, so memory stays bounded however large
+    the file is. Rows with a SKU replace the existing product with that SKU. Invalid rows are
+    skipped and reported. Every processed row ends up imported, failed or merged.
+    """
+    report = ImportReport()
+    try:
+        for chunk in _chunks(iter_records(stream, format), CHUNK_SIZE):
+            _import_chunk(db, chunk, report)
+            if progress is not None:
+                progress(report)
+    finally:
+        # Core inserts skip the product invalidation listeners
+        catalog_cache.clear()
+        recent_writes.record(CATALOG_WRITES)
+    logger.info(f"Product import finished: {report.imported} imported, {report.failed} failed, "
+                f"{report.merged} merged")
+    return report
+
+
+def _import_chunk(db: Session, chunk: list, report: ImportReport) -> None:
+    """Validate and write one chunk of (line, record) pairs, updating `report`."""
+    rows = {}  # Keyed by SKU (or line) so a SKU repeated within a chunk is written once, last one wins
+    lines = {}
+    for line, record in chunk:
+        report.processed += 1
+        try:
+            row = _validate(record)
+        except ValidationError as e:
+            report.add_error(line, "; ".join(
+                f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()
+            ))
+            continue
+        except ValueError as e:
+            report.add_error(line, str(e))
+            continue
+        key = row["sku"] if row["sku"] is not None else ("line", line)
+        if key in rows:
+            report.merged += 1  # An earlier row with this SKU is superseded
+        rows[key] = row
+        lines[key] = line
+
+    if rows:
+        try:
+            _write_rows(db, list(rows.values()))
+            db.commit()
+            report.imported += len(rows)
+        except SQLAlchemyError:
+            db.rollback()
+            # Retry the chunk row by row so the error is reported against the offending rows only
+            for key, row in rows.items():
+                try:
+                    _write_rows(db, [row])
+                    db.commit()
+                    report.imported += 1
+                except SQLAlchemyError as e:
+                    db.rollback()
+                    report.add_error(lines[key], f"Database error: {getattr(e, 'orig', e)}")
+
+
+def import_products_from_file(
+        binary_stream,
+        format: str,
+        progress: Optional[Callable[[ImportReport], None]] = None
+) -> ImportReport:
+    """
+    Run import_products over a binary file object (UTF-8, optional BOM) in a session of its own.
+    Blocking; the API runs it in a worker thread.
+    """
+    stream = io.TextIOWrapper(binary_stream, encoding="utf-8-sig", newline="")
+    db = SessionLocal()
+    try:
+        return import_products(db, stream, format, progress)
+    finally:
+        db.close()
+        stream.detach()  # Leave the underlying file open for its owner
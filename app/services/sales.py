@@ -0,0 +1,222 @@
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from typing import Iterable, NamedTuple, Optional
+from sqlalchemy import Date, cast, delete, func, insert, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models.category import Category
+from app.models.order import Order, OrderItem
+from app.models.product import Product
+from app.models.sales import DailyCategorySales, DailyProductSales, DailySales
+from app.utils.upsert import upsert_insert
+
+# Orders in this status are left out of the rollups
+EXCLUDED_STATUS = "cancelled"
+
+ROLLUP_TABLES = (DailySales, DailyProductSales, DailyCategorySales)
+
+
+class SaleLine(NamedTuple):
+    """One order line as the rollups see it."""
+    product_id: int
+    category_id: Optional[int]
+    quantity: int
+    price: float
+
+
+def order_sale_lines(order: Order) -> list[SaleLine]:
+    """Sale lines of an order, with the categories its items were sold in."""
+    return [
+        SaleLine(
+            product_id=item.product_id,
+            category_id=item.category_id,
+            quantity=item.quantity,
+            price=item.price_at_purchase,
+        )
+        for item in order.items
+    ]
+
+
+def utc_day(created_at: datetime) -> date:
+    """The UTC day an order counts toward. Naive timestamps are UTC, as checkout writes them."""
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc)
+    return created_at.date()
+
+
+def counts_toward_sales(status: Optional[str]) -> bool:
+    return status != EXCLUDED_STATUS
+
+
+def _rollup_upsert(dialect_name: str, model):
+    """
+    INSERT ... ON CONFLICT (primary key) DO UPDATE adding the inserted values to the stored ones,
+    so concurrent orders on the same day and product never lose an increment.
+    """
+    insert = upsert_insert(dialect_name)
+    if insert is None:
+        raise ValueError(f"Sales rollup upserts are not supported on {dialect_name}")
+    table = model.__table__
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=list(table.primary_key.columns),
+        set_={
+            column.name: column + stmt.excluded[column.name]
+            for column in table.columns if not column.primary_key
+        },
+    )
+
+
+def sales_rollup_statements(dialect_name: str, created_at: datetime, lines: Iterable, sign: int):
+    """
+    (statement, parameters) pairs adding an order's lines to the rollups (sign=1), or taking
+    them out again (sign=-1) when it is cancelled. `lines` have product_id, category_id,
+    quantity and price. Run them in the transaction that changes the order.
+    """
+    day = utc_day(created_at)
+    products = defaultdict(lambda: [0, 0.0])
+    categories = defaultdict(lambda: [0, 0.0])
+    for line in lines:
+        revenue = line.price * line.quantity
+        products[line.product_id][0] += line.quantity
+        products[line.product_id][1] += revenue
+        if line.category_id is not None:
+            categories[line.category_id][0] += line.quantity
+            categories[line.category_id][1] += revenue
+    if not products:
+        return []
+
+    return [
+        (_rollup_upsert(dialect_name, DailySales), [{
+            "day": day,
+            "orders": sign,
+            "units": sign * sum(units for units, _ in products.values()),
+            "revenue": sign * sum(revenue for _, revenue in products.values()),
+        }]),
+        (_rollup_upsert(dialect_name, DailyProductSales), [
+            {"day": day, "product_id": product_id, "units": sign * units, "revenue": sign * revenue}
+            for product_id, (units, revenue) in products.items()
+        ]),
+    ] + ([
+        (_rollup_upsert(dialect_name, DailyCategorySales), [
+            {"day": day, "category_id": category_id, "units": sign * units, "revenue": sign * revenue}
+            for category_id, (units, revenue) in categories.items()
+        ]),
+    ] if categories else [])
+
+
+def status_change_sign(old_status: Optional[str], new_status: str) -> int:
+    """+1 if a status change brings an order back into the rollups, -1 if it takes it out, else 0."""
+    return int(counts_toward_sales(new_status)) - int(counts_toward_sales(old_status))
+
+
+def _day(column, dialect_name: str):
+    # The UTC day, as utc_day gives the incremental updates, whatever the session time zone.
+    # SQLite has no DATE type: CAST would keep only the year, date() gives the stored 'YYYY-MM-DD'
+    if dialect_name == "sqlite":
+        return func.date(column)
+    if dialect_name == "postgresql":
+        # A literal, so SELECT and GROUP BY render the same expression rather than two bind parameters
+        return cast(func.timezone(literal_column("'UTC'"), column), Date)
+    return cast(column, Date)
+
+
+def rebuild_sales_rollups(db: Session) -> None:
+    """
+    Recompute every rollup from orders and order_items with set-based INSERT ... SELECT statements.
+    Backfills history recorded before the rollups existed and repairs drift. Categories are the
+    ones recorded on order_items at checkout.
+    """
+    day = _day(Order.created_at, db.get_bind().dialect.name).label("day")
+    revenue = func.sum(OrderItem.price_at_purchase * OrderItem.quantity)
+
+    for model in ROLLUP_TABLES:
+        db.execute(delete(model))
+    db.execute(insert(DailySales).from_select(
+        ["day", "orders", "units", "revenue"],
+        select(day, func.count(func.distinct(Order.id)), func.sum(OrderItem.quantity), revenue)
+        .select_from(Order).join(OrderItem, OrderItem.order_id == Order.id)
+        .where(Order.status.is_distinct_from(EXCLUDED_STATUS))
+        .group_by(day)
+    ))
+    db.execute(insert(DailyProductSales).from_select(
+        ["day", "product_id", "units", "revenue"],
+        select(day, OrderItem.product_id, func.sum(OrderItem.quantity), revenue)
+        .select_from(Order).join(OrderItem, OrderItem.order_id == Order.id)
+        .where(Order.status.is_distinct_from(EXCLUDED_STATUS))
+        .group_by(day, OrderItem.product_id)
+    ))
+    db.execute(insert(DailyCategorySales).from_select(
+        ["day", "category_id", "units", "revenue"],
+        select(day, OrderItem.category_id, func.sum(OrderItem.quantity), revenue)
+        .select_from(Order).join(OrderItem, OrderItem.order_id == Order.id)
+        .where(Order.status.is_distinct_from(EXCLUDED_STATUS), OrderItem.category_id.isnot(None))
+        .group_by(day, OrderItem.category_id)
+    ))
+    db.commit()
+
+
+def _in_range(stmt, model, start: Optional[date], end: Optional[date]):
+    # start and end are inclusive days
+    if start is not None:
+        stmt = stmt.where(model.day >= start)
+    if end is not None:
+        stmt = stmt.where(model.day <= end)
+    return stmt
+
+
+def _daily_sales_query(start: Optional[date], end: Optional[date]):
+    # Days whose orders were all cancelled keep a zeroed row; leave them out
+    stmt = select(DailySales).where(DailySales.orders != 0).order_by(DailySales.day)
+    return _in_range(stmt, DailySales, start, end)
+
+
+def _product_sales_query(start: Optional[date], end: Optional[date], limit: int):
+    units = func.sum(DailyProductSales.units).label("units")
+    revenue = func.sum(DailyProductSales.revenue).label("revenue")
+    totals = _in_range(
+        select(DailyProductSales.product_id, units, revenue).group_by(DailyProductSales.product_id),
+        DailyProductSales, start, end
+    ).subquery()
+    return (
+        select(totals.c.product_id, Product.name, totals.c.units, totals.c.revenue)
+        .join(Product, Product.id == totals.c.product_id)
+        .where(totals.c.units != 0)
+        .order_by(totals.c.revenue.desc(), totals.c.product_id)
+        .limit(limit)
+    )
+
+
+def _category_sales_query(start: Optional[date], end: Optional[date]):
+    units = func.sum(DailyCategorySales.units).label("units")
+    revenue = func.sum(DailyCategorySales.revenue).label("revenue")
+    totals = _in_range(
+        select(DailyCategorySales.category_id, units, revenue).group_by(DailyCategorySales.category_id),
+        DailyCategorySales, start, end
+    ).subquery()
+    return (
+        select(totals.c.category_id, Category.name, totals.c.units, totals.c.revenue)
+        .join(Category, Category.id == totals.c.category_id)
+        .where(totals.c.units != 0)
+        .order_by(totals.c.revenue.desc(), totals.c.category_id)
+    )
+
+
+async def get_daily_sales_async(db: AsyncSession, start: Optional[date] = None, end: Optional[date] = None):
+    """Orders, units and revenue per day between `start` and `end` (inclusive), from the rollups."""
+    return (await db.execute(_daily_sales_query(start, end))).scalars().all()
+
+
+async def get_product_sales_async(
+        db: AsyncSession,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        limit: int = 100
+):
+    """Best-selling products by revenue between `start` and `end` (inclusive), from the rollups."""
+    return (await db.execute(_product_sales_query(start, end, limit))).all()
+
+
+async def get_category_sales_async(db: AsyncSession, start: Optional[date] = None, end: Optional[date] = None):
+    """Units and revenue per category between `start` and `end` (inclusive), from the rollups."""
+    return (await db.execute(_category_sales_query(start, end))).all()
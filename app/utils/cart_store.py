@@ -0,0 +1,314 @@
+import abc
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+from app.config import settings
+
+CART_STORE_KINDS = ("sql", "memory", "redis")
+
+
+@dataclass
+class StoredCart:
+    """
+    A cart as held in a cart store: the id of its carts row and product_id -> quantity.
+    `version` goes up with every change, so a writer can tell whether the cart it read is still current.
+    """
+    cart_id: int
+    items: Dict[int, int] = field(default_factory=dict)
+    version: int = 0
+
+
+class CartStore(abc.ABC):
+    """
+    Key-value home for active carts, in front of the carts/cart_items tables.
+    Cart writes land here and are written behind to SQL (see app.services.cart):
+    every change marks the user's cart dirty, and flushes take dirty carts and persist them.
+    A cart the store doesn't hold yet is loaded from SQL on first use, so stores may
+    drop idle carts once they are persisted.
+    """
+
+    @abc.abstractmethod
+    async def get(self, user_id: int) -> Optional[StoredCart]:
+        """The user's cart, or None if the store doesn't hold it yet."""
+
+    @abc.abstractmethod
+    async def load(self, user_id: int, cart_id: int, items: Dict[int, int]) -> StoredCart:
+        """Seed the user's cart from SQL unless it is already held; returns the held cart."""
+
+    @abc.abstractmethod
+    async def apply(self, user_id: int, adds: Dict[int, int], sets: Dict[int, int], removes: Set[int]) -> None:
+        """Atomically add to, set and remove item quantities, and mark the cart dirty."""
+
+    @abc.abstractmethod
+    async def clear(self, user_id: int, cart_id: int, dirty: bool = True) -> None:
+        """Empty the user's cart. dirty=False when SQL was already cleared."""
+
+    @abc.abstractmethod
+    async def remove_checked_out(self, user_id: int, cart_id: int, ordered: Dict[int, int], version: int) -> None:
+        """
+        Atomically take the `ordered` product_id -> quantity lines out of a cart that checkout wrote
+        at `version` and whose cart_items it cleared. Unchanged since, the cart is emptied and clean;
+        otherwise only the changes made meanwhile are left, and stay dirty.
+        """
+
+    @abc.abstractmethod
+    async def take_dirty(self) -> List[int]:
+        """Return the users whose carts changed since they were last taken, and mark them clean."""
+
+    @abc.abstractmethod
+    async def mark_dirty(self, user_id: int) -> None:
+        """Mark a cart dirty again, e.g. after its flush failed."""
+
+    @abc.abstractmethod
+    async def discard_dirty(self, user_id: int) -> None:
+        """Mark one cart clean because it is about to be persisted."""
+
+    async def close(self) -> None:
+        """Release connections held by the store."""
+
+
+class MemoryCartStore(CartStore):
+    """
+    Carts in a dict of this process. Every method runs without awaiting, so each is atomic
+    on the event loop. Carts aren't shared between workers and unflushed changes die with
+    the process: meant for tests and single-process deployments. Keeps at most `max_carts`,
+    dropping the least recently used clean ones; a dropped cart is reloaded from SQL.
+    """
+
+    def __init__(self, max_carts: int = 100000):
+        self.max_carts = max_carts
+        self._carts: "OrderedDict[int, StoredCart]" = OrderedDict()
+        self._dirty: Set[int] = set()
+
+    def _copy(self, cart: StoredCart) -> StoredCart:
+        return StoredCart(cart.cart_id, dict(cart.items), cart.version)
+
+    def _touch(self, user_id: int, cart: StoredCart) -> None:
+        self._carts[user_id] = cart
+        self._carts.move_to_end(user_id)
+        if len(self._carts) > self.max_carts:
+            # Dirty carts hold changes SQL doesn't have yet, so only clean ones are dropped
+            evictable = next((key for key in self._carts if key not in self._dirty), None)
+            if evictable is not None:
+                del self._carts[evictable]
+
+    async def get(self, user_id: int) -> Optional[StoredCart]:
+        cart = self._carts.get(user_id)
+        if cart is None:
+            return None
+        self._carts.move_to_end(user_id)
+        return self._copy(cart)
+
+    async def load(self, user_id: int, cart_id: int, items: Dict[int, int]) -> StoredCart:
+        cart = self._carts.get(user_id) or StoredCart(cart_id, dict(items))
+        self._touch(user_id, cart)
+        return self._copy(cart)
+
+    async def apply(self, user_id: int, adds: Dict[int, int], sets: Dict[int, int], removes: Set[int]) -> None:
+        cart = self._carts[user_id]
+        for product_id, quantity in adds.items():
+            cart.items[product_id] = cart.items.get(product_id, 0) + quantity
+        cart.items.update(sets)
+        for product_id in removes:
+            cart.items.pop(product_id, None)
+        cart.version += 1
+        self._dirty.add(user_id)
+        self._touch(user_id, cart)
+
+    async def clear(self, user_id: int, cart_id: int, dirty: bool = True) -> None:
+        cart = self._carts.get(user_id)
+        if dirty:
+            self._dirty.add(user_id)
+        else:
+            self._dirty.discard(user_id)
+        self._touch(user_id, StoredCart(cart_id, version=cart.version + 1 if cart is not None else 0))
+
+    async def remove_checked_out(self, user_id: int, cart_id: int, ordered: Dict[int, int], version: int) -> None:
+        cart = self._carts.get(user_id)
+        if cart is None:
+            return
+        if cart.version == version:
+            await self.clear(user_id, cart_id, dirty=False)
+            return
+        for product_id, quantity in ordered.items():
+            left = cart.items.get(product_id, 0) - quantity
+            if left > 0:
+                cart.items[product_id] = left
+            else:
+                cart.items.pop(product_id, None)
+        cart.version += 1
+        self._dirty.add(user_id)
+        self._touch(user_id, cart)
+
+    async def take_dirty(self) -> List[int]:
+        user_ids, self._dirty = list(self._dirty), set()
+        return user_ids
+
+    async def mark_dirty(self, user_id: int) -> None:
+        self._dirty.add(user_id)
+
+    async def discard_dirty(self, user_id: int) -> None:
+        self._dirty.discard(user_id)
+
+
+class RedisCartStore(CartStore):
+    """
+    Carts in a Redis-protocol server (Redis, Valkey, KeyDB...), shared by every worker.
+    Each cart is a hash `cart:<user_id>` holding `cart_id` and `version` fields and one field
+    per product; adds are HINCRBY so concurrent increments never get lost, and each change is
+    one MULTI/EXEC round trip that also bumps the version, adds the user to the `cart:dirty`
+    set and pushes the key's expiry `ttl_seconds` out, so abandoned carts drop out of the server
+    (they stay in SQL). Clearing is a Lua script, so it can check the version atomically.
+    Needs the optional `redis` package.
+    """
+
+    CART_ID_FIELD = "cart_id"
+    VERSION_FIELD = "version"
+    DIRTY_KEY = "cart:dirty"
+
+    # Empty the cart, keeping its version increasing
+    CLEAR_SCRIPT = """
+        local version = tonumber(redis.call('HGET', KEYS[1], 'version') or '0')
+        redis.call('DEL', KEYS[1])
+        redis.call('HSET', KEYS[1], 'cart_id', ARGV[1], 'version', version + 1)
+        redis.call('PEXPIRE', KEYS[1], ARGV[2])
+        if ARGV[3] == '1' then
+            redis.call('SADD', KEYS[2], ARGV[4])
+        else
+            redis.call('SREM', KEYS[2], ARGV[4])
+        end
+    """
+
+    # Empty the cart if it is still at version ARGV[3], else subtract the ordered
+    # (product_id, quantity) pairs in ARGV[5..] and leave the rest dirty
+    REMOVE_CHECKED_OUT_SCRIPT = """
+        if redis.call('EXISTS', KEYS[1]) == 0 then
+            return
+        end
+        local version = tonumber(redis.call('HGET', KEYS[1], 'version') or '0')
+        if version == tonumber(ARGV[3]) then
+            redis.call('DEL', KEYS[1])
+            redis.call('HSET', KEYS[1], 'cart_id', ARGV[1], 'version', version + 1)
+            redis.call('SREM', KEYS[2], ARGV[4])
+        else
+            for i = 5, #ARGV, 2 do
+                if redis.call('HINCRBY', KEYS[1], ARGV[i], -tonumber(ARGV[i + 1])) <= 0 then
+                    redis.call('HDEL', KEYS[1], ARGV[i])
+                end
+            end
+            redis.call('HINCRBY', KEYS[1], 'version', 1)
+            redis.call('SADD', KEYS[2], ARGV[4])
+        end
+        redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    """
+
+    def __init__(self, url: str, client=None, ttl_seconds: int = 30 * 86400):
+        if client is None:
+            try:
+                from redis import asyncio as redis
+            except ImportError as e:
+                raise RuntimeError("CART_STORE=redis needs the redis package: pip install redis") from e
+            client = redis.from_url(url, decode_responses=True)
+        self._client = client
+        self._clear = client.register_script(self.CLEAR_SCRIPT)
+        self._remove_checked_out = client.register_script(self.REMOVE_CHECKED_OUT_SCRIPT)
+        self.ttl_seconds = ttl_seconds
+
+    def _key(self, user_id: int) -> str:
+        return f"cart:{user_id}"
+
+    def _decode(self, fields: Dict[str, str]) -> Optional[StoredCart]:
+        if self.CART_ID_FIELD not in fields:
+            return None
+        return StoredCart(
+            cart_id=int(fields[self.CART_ID_FIELD]),
+            items={
+                int(name): int(value) for name, value in fields.items()
+                if name not in (self.CART_ID_FIELD, self.VERSION_FIELD)
+            },
+            version=int(fields.get(self.VERSION_FIELD, 0)),
+        )
+
+    async def get(self, user_id: int) -> Optional[StoredCart]:
+        return self._decode(await self._client.hgetall(self._key(user_id)))
+
+    async def load(self, user_id: int, cart_id: int, items: Dict[int, int]) -> StoredCart:
+        from redis.exceptions import WatchError
+
+        key = self._key(user_id)
+        while True:
+            # Optimistic: only seed if nobody else did, without clobbering their changes
+            async with self._client.pipeline(transaction=True) as pipe:
+                try:
+                    await pipe.watch(key)
+                    cart = self._decode(await pipe.hgetall(key))
+                    if cart is not None:
+                        return cart
+                    pipe.multi()
+                    pipe.hset(key, mapping={self.CART_ID_FIELD: cart_id, self.VERSION_FIELD: 0, **items})
+                    pipe.expire(key, self.ttl_seconds)
+                    await pipe.execute()
+                    return StoredCart(cart_id, dict(items))
+                except WatchError:
+                    continue
+
+    async def apply(self, user_id: int, adds: Dict[int, int], sets: Dict[int, int], removes: Set[int]) -> None:
+        key = self._key(user_id)
+        async with self._client.pipeline(transaction=True) as pipe:
+            for product_id, quantity in adds.items():
+                pipe.hincrby(key, product_id, quantity)
+            if sets:
+                pipe.hset(key, mapping=sets)
+            if removes:
+                pipe.hdel(key, *removes)
+            pipe.hincrby(key, self.VERSION_FIELD, 1)
+            pipe.expire(key, self.ttl_seconds)
+            pipe.sadd(self.DIRTY_KEY, user_id)
+            await pipe.execute()
+
+    async def clear(self, user_id: int, cart_id: int, dirty: bool = True) -> None:
+        await self._clear(
+            keys=[self._key(user_id), self.DIRTY_KEY],
+            args=[cart_id, self.ttl_seconds * 1000, int(dirty), user_id],
+        )
+
+    async def remove_checked_out(self, user_id: int, cart_id: int, ordered: Dict[int, int], version: int) -> None:
+        await self._remove_checked_out(
+            keys=[self._key(user_id), self.DIRTY_KEY],
+            args=[cart_id, self.ttl_seconds * 1000, version, user_id,
+                  *(value for line in ordered.items() for value in line)],
+        )
+
+    async def take_dirty(self) -> List[int]:
+        async with self._client.pipeline(transaction=True) as pipe:
+            pipe.smembers(self.DIRTY_KEY)
+            pipe.delete(self.DIRTY_KEY)
+            members, _ = await pipe.execute()
+        return [int(user_id) for user_id in members]
+
+    async def mark_dirty(self, user_id: int) -> None:
+        await self._client.sadd(self.DIRTY_KEY, user_id)
+
+    async def discard_dirty(self, user_id: int) -> None:
+        await self._client.srem(self.DIRTY_KEY, user_id)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def create_cart_store(kind: str, url: Optional[str] = None, max_carts: int = 100000,
+                      ttl_seconds: int = 30 * 86400) -> Optional[CartStore]:
+    """Build the configured cart store; None for "sql", where carts live only in the tables."""
+    if kind not in CART_STORE_KINDS:
+        raise ValueError(f"Unknown cart store: {kind}")
+    if kind == "memory":
+        return MemoryCartStore(max_carts)
+    if kind == "redis":
+        return RedisCartStore(url, ttl_seconds=ttl_seconds)
+    return None
+
+
+# Shared store used by the async cart service functions and checkout
+cart_store = create_cart_store(
+    settings.CART_STORE, settings.CART_STORE_URL, settings.CART_STORE_MAX_CARTS, settings.CART_STORE_TTL_SECONDS
+)
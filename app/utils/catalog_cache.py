@@ -0,0 +1,141 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Iterable, Optional
+from fastapi import Response, status
+from app.config import settings
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag derived from the exact response bytes."""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header against `etag`.
+    Uses the weak comparison RFC 9110 prescribes for If-None-Match.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+class CachedResponse:
+    """Serialized response body plus its ETag."""
+    __slots__ = ("body", "etag", "expires_at")
+
+    def __init__(self, body: bytes, expires_at: float):
+        self.body = body
+        self.etag = make_etag(body)
+        self.expires_at = expires_at
+
+
+class CatalogCache:
+    """
+    In-process cache of serialized catalog responses, keyed by query shape.
+    Keys are tuples whose first element is the kind of response ("list" or
+    "detail"); detail keys are ("detail", product_id) so a product change only
+    drops that product's entry plus the list pages.
+
+    Writers bump `generation` when they invalidate. Readers capture the
+    generation before querying and pass it to `set`, so a response built from
+    data read before a commit is never stored after that commit's invalidation.
+    Invalidation is local to this process; `ttl_seconds` bounds how long other
+    workers can serve a stale catalog.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.generation = 0
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        """Return the cached response for `key`, or None if missing/expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]  # Drop the expired entry
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)  # Mark as most recently used
+            self.hits += 1
+            return entry
+
+    def set(self, key: Hashable, body: bytes, generation: int) -> CachedResponse:
+        """
+        Store `body` under `key` unless the catalog was invalidated since `generation`.
+        Returns the entry either way so the caller can reuse its ETag.
+        """
+        entry = CachedResponse(body, time.monotonic() + self.ttl_seconds)
+        if not self.enabled:
+            return entry
+        with self._lock:
+            if generation != self.generation:
+                return entry  # Built from data that may predate a commit, don't keep it
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)  # Evict the least recently used entry
+        return entry
+
+    def invalidate(self, product_ids: Iterable[int] = ()) -> None:
+        """Drop every list page and the detail entries of `product_ids`."""
+        stale_details = {("detail", product_id) for product_id in product_ids}
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+            for key in list(self._entries):
+                if key[0] != "detail" or key in stale_details:
+                    del self._entries[key]
+
+    def clear(self) -> None:
+        """Drop every cached response."""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Snapshot of cache effectiveness for metrics."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+# Shared cache used by the catalog routes
+catalog_cache = CatalogCache(
+    ttl_seconds=settings.CATALOG_CACHE_TTL_SECONDS,
+    max_entries=settings.CATALOG_CACHE_MAX_ENTRIES,
+)
+
+
+def catalog_response(entry: CachedResponse, if_none_match: Optional[str]) -> Response:
+    """Answer from the cached bytes, or with 304 if the client already has them."""
+    headers = {"ETag": entry.etag}
+    if etag_matches(if_none_match, entry.etag):
+        catalog_cache.not_modified += 1
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
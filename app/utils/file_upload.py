@@ -1,32 +1,113 @@
+import hashlib
 import os
-from fastapi import UploadFile, HTTPException
+import tempfile
+from dataclasses import dataclass
+from fastapi import UploadFile, HTTPException, status
 from pathlib import Path
-from datetime import datetime
+from starlette.concurrency import run_in_threadpool
 from app.config import settings
 
-UPLOAD_DIR = "uploads/products"  # Directory where product images will be stored
+UPLOAD_ROOT = "uploads"  # Served under /uploads
+UPLOAD_DIR = "uploads/images"  # Content-addressed store for product images
+CHUNK_SIZE = 1024 * 1024  # Bytes copied per read, so memory use doesn't grow with the file
 
 
-def save_upload_file(upload_file: UploadFile, product_id: int):
+@dataclass
+class SavedUpload:
+    """An upload staged in the store, plus what was learned while streaming it."""
+    path: str  # Content path it is published to, see publish_upload
+    size: int
+    sha256: str
+    temp_path: str  # Staged copy of the bytes until it is published or discarded
+
+
+class UploadTooLarge(Exception):
+    """Raised while streaming once an upload exceeds MAX_UPLOAD_SIZE_BYTES."""
+
+
+def content_path(sha256: str, ext: str) -> str:
+    """
+    Location of an image in the store, e.g. uploads/images/3f/3fa2...e1.png.
+    The path only changes when the content does, so it can be cached forever.
+    """
+    return os.path.join(UPLOAD_DIR, sha256[:2], f"{sha256}{ext}")
+
+
+def _file_extension(filename: str) -> str:
+    """Lowercased extension of the client's filename, dropped if it isn't plain alphanumerics."""
+    ext = Path(filename or "").suffix.lower()
+    return ext if ext[1:].isalnum() else ""
+
+
+def _stream_to_disk(source, ext: str, max_size: int) -> SavedUpload:
     """
-    Save the uploaded file to the server with a unique filename based on product_id.
-    Creates the upload directory if it doesn't exist and stores the file.
+    Copy `source` into a temp file in the store in CHUNK_SIZE pieces, hashing as it goes.
+    The file stays staged under its temp name: it is only renamed to its content path by
+    publish_upload, once a committed product references it, so a failed product write
+    never leaves an unreferenced image behind.
     """
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=".upload-")
     try:
-        # Create the upload directory if it doesn't already exist
-        Path(UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
+        with os.fdopen(fd, "wb") as buffer:
+            while chunk := source.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge()
+                digest.update(chunk)
+                buffer.write(chunk)
+            buffer.flush()
+            os.fsync(buffer.fileno())  # Make sure the bytes are on disk before the rename publishes them
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    sha256 = digest.hexdigest()
+    return SavedUpload(path=content_path(sha256, ext), size=size, sha256=sha256, temp_path=temp_path)
 
-        # Generate a unique filename using product_id and timestamp
-        file_ext = upload_file.filename.split('.')[-1]  # Get the file extension
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")  # Generate timestamp
-        filename = f"product_{product_id}_{timestamp}.{file_ext}"  # Unique filename format
-        file_path = os.path.join(UPLOAD_DIR, filename)  # Full file path
 
-        # Save the uploaded file to the server
-        with open(file_path, "wb") as buffer:
-            buffer.write(upload_file.file.read())  # Write the file content to disk
+def publish_upload(saved: SavedUpload) -> None:
+    """
+    Move a staged upload to its content path, atomically. Identical content that is
+    already stored is kept and the staged copy dropped, so each image is stored once.
+    """
+    if os.path.exists(saved.path):
+        discard_upload(saved)
+        return
+    os.makedirs(os.path.dirname(saved.path), exist_ok=True)
+    os.replace(saved.temp_path, saved.path)  # Atomic on POSIX and Windows
 
-        return file_path  # Return the path where the file is saved
+
+def discard_upload(saved: SavedUpload) -> None:
+    """Remove a staged upload that won't be published."""
+    try:
+        os.remove(saved.temp_path)
+    except FileNotFoundError:
+        pass
+
+
+async def save_upload_file(upload_file: UploadFile) -> SavedUpload:
+    """
+    Stage the uploaded file in the content-addressed store, named by its SHA-256 once
+    published (see publish_stored_image_async). Creates the upload directory if it doesn't
+    exist and streams the file to disk in a worker thread, enforcing MAX_UPLOAD_SIZE_BYTES
+    on the way.
+    """
+    try:
+        # Create the upload directory if it doesn't already exist
+        Path(UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
+
+        # Stream the uploaded file to disk off the event loop
+        await upload_file.seek(0)
+        return await run_in_threadpool(
+            _stream_to_disk, upload_file.file, _file_extension(upload_file.filename), settings.MAX_UPLOAD_SIZE_BYTES
+        )
+    except UploadTooLarge:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File exceeds the {settings.MAX_UPLOAD_SIZE_BYTES} byte upload limit"
+        )
     except Exception as e:
         # Raise an HTTP exception if any error occurs during file saving
         raise HTTPException(
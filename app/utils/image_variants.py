@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Dict, Optional
+from app.config import settings
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Resized variants generated for every uploaded product image, largest first, as the
+# longest edge in pixels. Each one is written in the original format and as WebP.
+IMAGE_VARIANTS = {
+    "detail": 1200,
+    "listing": 400,
+    "thumbnail": 150,
+}
+
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+
+def _save(image: "Image.Image", path: str, format: str) -> None:
+    """
+    Write `image` to a temp file next to its final path and rename it into place.
+    The temp name is unique, so concurrent jobs for the same variant never share one.
+    """
+    options = {}
+    if format == "WEBP":
+        options = {"quality": WEBP_QUALITY, "method": 4}
+    elif format == "JPEG":
+        options = {"quality": JPEG_QUALITY, "optimize": True, "progressive": True}
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")  # JPEG has no alpha channel
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}-")
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            image.save(buffer, format=format, **options)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def variant_paths(source_path: str) -> Dict[str, str]:
+    """
+    Paths of every variant of `source_path` keyed by variant name, with a `_webp`
+    suffix for the WebP copies, e.g. {"thumbnail": ..., "thumbnail_webp": ...}.
+    """
+    stem, ext = os.path.splitext(source_path)
+    paths = {}
+    for name in IMAGE_VARIANTS:
+        paths[name] = f"{stem}_{name}{ext}"
+        paths[f"{name}_webp"] = f"{stem}_{name}.webp"
+    return paths
+
+
+def generate_variants(source_path: str) -> Dict[str, str]:
+    """
+    Resize the image at `source_path` into every IMAGE_VARIANTS size.
+    Runs in a worker process and returns variant_paths(source_path). Sources are
+    content-addressed, so variants that already exist are reused as they are.
+    """
+    variants = variant_paths(source_path)
+    if all(os.path.exists(path) for path in variants.values()):
+        return variants
+
+    # Imported here, in the worker, so booting the app doesn't load Pillow
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as original:
+        format = {"MPO": "JPEG"}.get(original.format, original.format) or "PNG"
+        largest = max(IMAGE_VARIANTS.values())
+        original.draft("RGB", (largest, largest))  # Lets JPEG decode at reduced scale
+        image = ImageOps.exif_transpose(original)
+
+        # Shrink progressively, each variant resized from the previous (larger) one
+        for name, size in IMAGE_VARIANTS.items():
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)  # Never upscales
+            _save(image, variants[name], format)
+            _save(image, variants[f"{name}_webp"], "WEBP")
+    return variants
+
+
+class ImageVariantPool:
+    """
+    Process pool that generates image variants after an upload.
+    Resizing is CPU bound, so it runs in worker processes rather than on the event loop
+    or in the request's thread pool.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Create the executor on first use so importing the app stays cheap."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def generate(self, source_path: str) -> Dict[str, str]:
+        """Generate the variants of `source_path` in a worker process."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), generate_variants, source_path)
+
+    def shutdown(self) -> None:
+        """Stop the worker processes, waiting for running jobs to finish."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+# Shared pool used by the product upload background task
+image_variant_pool = ImageVariantPool(workers=settings.IMAGE_VARIANT_WORKERS)
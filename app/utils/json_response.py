@@ -0,0 +1,20 @@
+from typing import Any
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+def dump_json(adapter: TypeAdapter, value: Any) -> bytes:
+    """
+    Serialize trusted service output (ORM objects, rows, dataclasses) to JSON bytes in one
+    pydantic-core pass: validate with from_attributes, then dump straight to bytes.
+    """
+    return adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+
+
+def json_response(adapter: TypeAdapter, value: Any, status_code: int = 200) -> Response:
+    """
+    Response for a route's return value serialized with dump_json.
+    A returned Response skips FastAPI's response_model pass (a second validation, then
+    jsonable conversion and json.dumps); keep response_model on the route for the OpenAPI schema.
+    """
+    return Response(content=dump_json(adapter, value), status_code=status_code, media_type="application/json")
@@ -0,0 +1,28 @@
+import base64
+import json
+from typing import Any
+
+
+def encode_cursor(sort: str, value: Any, last_id: int) -> str:
+    """
+    Encode the position after the last row of a page as an opaque, URL-safe cursor.
+    """
+    payload = json.dumps({"s": sort, "v": value, "id": last_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> tuple[Any, int]:
+    """
+    Decode a cursor produced by encode_cursor into (sort value, last id).
+    Raises ValueError if the cursor is malformed or was issued for another sort key.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value, last_id = payload["v"], int(payload["id"])
+        cursor_sort = payload["s"]
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+    if cursor_sort != sort:
+        raise ValueError("Cursor was issued for a different sort order")
+    return value, last_id
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordPoolFull(Exception):
+    """Raised when the password hashing pool has no free worker or queue slot."""
+
+
+class PasswordHashingPool:
+    """
+    Bounded worker pool for bcrypt hashing and verification.
+    Keeps the ~250ms of CPU per hash off the event loop and rejects work
+    once `workers + queue_size` calls are in flight instead of queueing forever.
+    """
+
+    def __init__(self, workers: int, queue_size: int, kind: str = "thread"):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown password pool kind: {kind}")
+        self.workers = workers
+        self.queue_size = queue_size
+        self.kind = kind
+        self._executor: Optional[Executor] = None
+
+        # Counters, only mutated from the event loop thread
+        self.in_flight = 0
+        self.completed_total = 0
+        self.rejected_total = 0
+
+    @property
+    def capacity(self) -> int:
+        """Maximum number of calls that can be running or queued at once."""
+        return self.workers + self.queue_size
+
+    def _get_executor(self) -> Executor:
+        """Create the executor on first use so importing the app stays cheap."""
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="password-hash"
+                )
+        return self._executor
+
+    async def run(self, fn: Callable, *args):
+        """
+        Run `fn(*args)` on the pool and await its result.
+        Raises PasswordPoolFull immediately if the pool is saturated.
+        """
+        if self.in_flight >= self.capacity:
+            self.rejected_total += 1
+            logger.warning(
+                f"Password pool saturated ({self.in_flight}/{self.capacity}), rejecting call"
+            )
+            raise PasswordPoolFull()
+
+        loop = asyncio.get_running_loop()
+        future = self._get_executor().submit(fn, *args)
+        self.in_flight += 1
+        # Release the slot when the call itself ends, not when the awaiting request does:
+        # a cancelled request (client disconnect) can't cancel a hash that is already running
+        future.add_done_callback(lambda _: self._call_soon(loop, self._release))
+        return await asyncio.wrap_future(future)
+
+    @staticmethod
+    def _call_soon(loop: asyncio.AbstractEventLoop, callback: Callable) -> None:
+        """Schedule `callback` on the event loop from a worker thread, unless the loop is gone."""
+        try:
+            loop.call_soon_threadsafe(callback)
+        except RuntimeError:
+            pass  # Loop closed during shutdown, nothing left to account to
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self.completed_total += 1
+
+    def stats(self) -> dict:
+        """Snapshot of pool saturation for metrics and health checks."""
+        return {
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "queued": max(0, self.in_flight - self.workers),
+            "saturation": self.in_flight / self.capacity if self.capacity else 1.0,
+            "completed_total": self.completed_total,
+            "rejected_total": self.rejected_total,
+        }
+
+    def shutdown(self) -> None:
+        """Stop the worker threads/processes, waiting for running calls to finish."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+# Shared pool used by the async auth services
+password_pool = PasswordHashingPool(
+    workers=settings.PASSWORD_POOL_WORKERS,
+    queue_size=settings.PASSWORD_POOL_QUEUE_SIZE,
+    kind=settings.PASSWORD_POOL_KIND,
+)
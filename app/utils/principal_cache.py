@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+from app.config import settings
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    Snapshot of the authenticated user, detached from any DB session.
+    Carries the fields the auth dependencies and /auth/me need.
+    """
+    id: int
+    email: str
+    full_name: Optional[str]
+    role: object
+    is_active: bool
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        """Build a principal from a User model instance."""
+        return cls(
+            id=user.id,
+            email=user.email,
+            full_name=user.full_name,
+            role=user.role,
+            is_active=user.is_active,
+        )
+
+
+class PrincipalCache:
+    """
+    In-process TTL + LRU cache of resolved principals, keyed by token subject.
+    An entry lives for at most `ttl_seconds` and never past the `exp` of the
+    token that populated it. Invalidation is local to this process, so other
+    workers may serve a stale principal for up to `ttl_seconds`.
+    """
+
+    def __init__(self, ttl_seconds: int, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple[Principal, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_size > 0
+
+    def get(self, subject: str) -> Optional[Principal]:
+        """Return the cached principal for `subject`, or None if missing/expired."""
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[subject]  # Drop the expired entry
+                self.misses += 1
+                return None
+            self._entries.move_to_end(subject)  # Mark as most recently used
+            self.hits += 1
+            return entry[0]
+
+    def set(self, subject: str, principal: Principal, token_exp: Optional[float] = None) -> None:
+        """Cache `principal`, expiring at the TTL or the token's `exp` (epoch seconds), whichever is first."""
+        if not self.enabled:
+            return
+        ttl = self.ttl_seconds
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[subject] = (principal, time.monotonic() + ttl)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)  # Evict the least recently used entry
+
+    def invalidate(self, subject: str) -> None:
+        """Forget the principal for `subject`, e.g. after a role change or deactivation."""
+        with self._lock:
+            if self._entries.pop(subject, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        """Drop every cached principal."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Snapshot of cache effectiveness for metrics."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+# Shared cache used by get_current_user_async
+principal_cache = PrincipalCache(
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    max_size=settings.PRINCIPAL_CACHE_MAX_SIZE,
+)
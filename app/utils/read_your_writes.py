@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Hashable, Optional
+from app.config import settings
+
+# Id of the authenticated user of the in-flight request, set by get_current_user_async
+current_user_id: ContextVar[Optional[int]] = ContextVar("current_user_id", default=None)
+
+# Key recorded for catalog changes: catalog responses filled from a lagging replica would be
+# cached, so catalog reads (and only those) stay on the primary after one
+CATALOG_WRITES = "catalog"
+
+
+class RecentWrites:
+    """
+    In-process record of which users (and the catalog) wrote to the primary within the last
+    `window_seconds`. Their reads stay on the primary for that long, so nobody reads a replica
+    that hasn't caught up with their own write. Like principal_cache this is local to the
+    process: a request served by another worker may still see replica lag.
+    """
+
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self._writes: "OrderedDict[Hashable, float]" = OrderedDict()  # Oldest write first
+        self._lock = threading.Lock()
+
+    def record(self, key: Hashable) -> None:
+        """Note a write by `key` (a user id or CATALOG_WRITES) now."""
+        if self.window_seconds <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._writes[key] = now
+            self._writes.move_to_end(key)
+            # Entries are in write order, so expired ones are all at the front
+            while self._writes:
+                oldest = next(iter(self._writes.values()))
+                if oldest > now - self.window_seconds:
+                    break
+                self._writes.popitem(last=False)
+
+    def wrote_recently(self, key: Hashable) -> bool:
+        with self._lock:
+            written_at = self._writes.get(key)
+        return written_at is not None and written_at > time.monotonic() - self.window_seconds
+
+
+# Shared record consulted by the read-replica sessions
+recent_writes = RecentWrites(settings.READ_YOUR_WRITES_SECONDS)
+
+
+def reads_pinned_to_primary(catalog: bool = False) -> bool:
+    """
+    True if the current request must read from the primary to see a recent write: one of its
+    user's own, or any catalog change when it reads the catalog (`catalog`).
+    """
+    if catalog and recent_writes.wrote_recently(CATALOG_WRITES):
+        return True
+    user_id = current_user_id.get()
+    return user_id is not None and recent_writes.wrote_recently(user_id)
+
+
+def record_user_writes(conn, cursor, statement, parameters, context, executemany):
+    """before_cursor_execute hook for the primary engines: DML pins the current user's reads."""
+    if context is not None and (context.isinsert or context.isupdate or context.isdelete):
+        user_id = current_user_id.get()
+        if user_id is not None:
+            recent_writes.record(user_id)
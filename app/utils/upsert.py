@@ -0,0 +1,17 @@
+from typing import Callable, Optional
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+# Dialects whose insert() supports ON CONFLICT DO NOTHING / DO UPDATE
+_UPSERT_INSERTS = {
+    "postgresql": postgresql_insert,
+    "sqlite": sqlite_insert,
+}
+
+
+def upsert_insert(dialect_name: str) -> Optional[Callable]:
+    """
+    The dialect's insert() construct with on_conflict_do_nothing/on_conflict_do_update,
+    or None if the backend has no ON CONFLICT support.
+    """
+    return _UPSERT_INSERTS.get(dialect_name)
@@ -0,0 +1,115 @@
+"""
+Cold-start benchmark: how long a fresh worker takes to serve its first request.
+
+Migrates a throwaway SQLite database once, then repeatedly boots `app.main:app` under
+uvicorn and times from process spawn to the first 200 from GET /. Also times a bare
+`import app.main` in a fresh interpreter. Reports the median, min and max of each as
+JSON. Pass --baseline with an earlier result file to fail the run when the median
+time to first request regresses by more than --max-regression percent.
+
+    python benchmarks/cold_start.py --runs 10 --output cold_start.json
+    python benchmarks/cold_start.py --baseline cold_start.json
+
+For a per-module breakdown of the import cost:
+
+    python -X importtime -c "import app.main" 2> importtime.txt
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from load_test import free_port, migrate_database, server_env, start_server
+
+IMPORT_SCRIPT = "import time; start = time.perf_counter(); import app.main; print(time.perf_counter() - start)"
+
+
+def time_to_first_request(env: dict, timeout: float) -> float:
+    """Seconds from spawning uvicorn until GET / answers 200."""
+    port = free_port()
+    start = time.perf_counter()
+    server = start_server(env, port, workers=1)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+            while time.perf_counter() - start < timeout:
+                if server.poll() is not None:
+                    raise RuntimeError(f"Server exited with code {server.returncode} before serving")
+                try:
+                    if client.get("/").status_code == 200:
+                        return time.perf_counter() - start
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.005)
+        raise RuntimeError(f"Server did not serve a request within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def time_import(env: dict) -> float:
+    """Seconds a fresh interpreter spends importing app.main."""
+    output = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], env=env, cwd=env["LOADTEST_WORKDIR"],
+                            check=True, capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def summarize(samples: list) -> dict:
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 1),
+        "min_ms": round(min(samples) * 1000, 1),
+        "max_ms": round(max(samples) * 1000, 1),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Server boots (and imports) to time")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds to wait for each boot")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare the median against")
+    parser.add_argument("--max-regression", type=float, default=20.0,
+                        help="Allowed slowdown of the median time to first request in percent before failing")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="coldstart-") as workdir:
+        env = server_env(Path(workdir))
+        env["LOADTEST_WORKDIR"] = workdir
+        (Path(workdir) / "uploads").mkdir()
+        migrate_database(env)
+
+        first_request = [time_to_first_request(env, args.timeout) for _ in range(args.runs)]
+        imports = [time_import(env) for _ in range(args.runs)]
+
+    result = {
+        "time_to_first_request": summarize(first_request),
+        "import_app_main": summarize(imports),
+        "config": {"runs": args.runs, "python": sys.version.split()[0]},
+    }
+
+    exit_code = 0
+    if args.baseline:
+        previous = json.loads(Path(args.baseline).read_text())["time_to_first_request"]["median_ms"]
+        change = (result["time_to_first_request"]["median_ms"] - previous) / previous * 100
+        result["baseline_median_ms"] = previous
+        result["change_pct"] = round(change, 1)
+        exit_code = 1 if change > args.max_regression else 0
+
+    report = json.dumps(result, indent=2)
+    if args.output:
+        Path(args.output).write_text(report + "\n")
+    else:
+        print(report)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+"""
+End-to-end HTTP load test for the e-commerce API.
+
+Boots `app.main:app` under uvicorn against a throwaway SQLite database (or targets an
+already running server with --url), seeds products and customers, then drives a mix of
+realistic traffic through the real routers with concurrent virtual users:
+
+    browse products, view a product, login, add to cart, checkout, list orders
+
+Results are printed (or written with --output) as JSON with throughput and
+p50/p95/p99 latency per route. Pass --baseline with an earlier result file to fail the
+run when a route's p95 regresses by more than --max-regression percent.
+
+    python benchmarks/load_test.py --users 20 --duration 30 --output run.json
+    python benchmarks/load_test.py --baseline run.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Relative weight of each action a virtual user picks between requests
+TRAFFIC_MIX = {
+    "browse": 40,
+    "view_product": 20,
+    "add_to_cart": 20,
+    "list_orders": 10,
+    "checkout": 6,
+    "login": 4,
+}
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def server_env(workdir: Path) -> dict:
+    """Environment for the app under test: a SQLite file inside `workdir`."""
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{workdir / 'loadtest.db'}",
+        "SECRET_KEY": "load-test-secret",
+        "RATE_LIMIT_ENABLED": "false",  # Every virtual user shares one client IP
+        "PYTHONPATH": str(REPO_ROOT) + os.pathsep + env.get("PYTHONPATH", ""),
+    })
+    return env
+
+
+def migrate_database(env: dict) -> None:
+    """Create the schema the way deployments do: Alembic migrations, search index included."""
+    subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], env=env, cwd=REPO_ROOT,
+                   check=True, capture_output=True)
+
+
+def seed_database(env: dict, products: int, users: int, password: str) -> None:
+    """
+    Migrate the schema and seed products plus customer accounts.
+    Seeding runs in a subprocess so the app's settings pick up the load-test environment,
+    and through the ORM with the services' flush listeners, so products get categories and counts.
+    """
+    migrate_database(env)
+    script = f"""
+import random
+import app.services.category  # Links products to categories and keeps their counts on flush
+from app.database import SessionLocal
+from app.models import cart, order, product, user
+from app.services.auth import get_password_hash
+
+rng = random.Random(42)
+hashed = get_password_hash({password!r})
+db = SessionLocal()
+db.add_all([
+    product.Product(
+        name=f"Product {{i:06d}}",
+        description="Load test product",
+        price=round(rng.uniform(1, 500), 2),
+        category=f"category-{{i % 20}}",
+        image_url="https://example.com/image.png",
+    )
+    for i in range({products})
+])
+db.add_all([
+    user.User(email=f"user{{i}}@loadtest.local", full_name=f"User {{i}}",
+              hashed_password=hashed, is_active=True, role=user.UserRole.CUSTOMER)
+    for i in range({users})
+])
+db.commit()
+db.close()
+"""
+    subprocess.run([sys.executable, "-c", script], env=env, cwd=env["LOADTEST_WORKDIR"], check=True)
+
+
+def start_server(env: dict, port: int, workers: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning",
+        ],
+        env=env,
+        cwd=env["LOADTEST_WORKDIR"],
+    )
+
+
+async def wait_until_ready(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become ready within {timeout}s")
+
+
+class Recorder:
+    """Collects latency samples and errors per route."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, client: httpx.AsyncClient, route: str, method: str, url: str,
+                   expected_errors: tuple = (), **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.latencies[route].append(time.perf_counter() - start)
+            self.errors[route] += 1
+            return None
+        self.latencies[route].append(time.perf_counter() - start)
+        if response.status_code >= 400 and response.status_code not in expected_errors:
+            self.errors[route] += 1
+        return response
+
+    def report(self, elapsed: float) -> dict:
+        routes = {}
+        for route, samples in sorted(self.latencies.items()):
+            ordered = sorted(samples)
+            routes[route] = {
+                "count": len(samples),
+                "errors": self.errors[route],
+                "throughput_rps": round(len(samples) / elapsed, 2),
+                "mean_ms": round(sum(samples) / len(samples) * 1000, 2),
+                "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+                "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+                "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+                "max_ms": round(ordered[-1] * 1000, 2),
+            }
+        total = sum(len(samples) for samples in self.latencies.values())
+        return {
+            "duration_s": round(elapsed, 2),
+            "total_requests": total,
+            "total_errors": sum(self.errors.values()),
+            "throughput_rps": round(total / elapsed, 2),
+            "routes": routes,
+        }
+
+
+async def login(client: httpx.AsyncClient, recorder: Recorder, email: str, password: str):
+    response = await recorder.call(
+        client, "POST /auth/token", "POST", "/auth/token",
+        data={"username": email, "password": password},
+    )
+    if response is None or response.status_code != 200:
+        return None
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def virtual_user(index: int, args, recorder: Recorder, deadline: float) -> None:
+    rng = random.Random(args.seed + index)
+    email = f"user{index % args.seed_users}@loadtest.local"
+    actions, weights = zip(*TRAFFIC_MIX.items())
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=30.0) as client:
+        headers = await login(client, recorder, email, args.password)
+        while time.monotonic() < deadline:
+            action = rng.choices(actions, weights)[0]
+            if action == "browse":
+                await recorder.call(client, "GET /products/", "GET", "/products/",
+                                    params={"skip": rng.randrange(0, max(1, args.products - 20)), "limit": 20})
+            elif action == "view_product":
+                product_id = rng.randint(1, args.products)
+                await recorder.call(client, "GET /products/{product_id}", "GET", f"/products/{product_id}")
+            elif action == "login":
+                headers = await login(client, recorder, email, args.password) or headers
+            elif headers is None:
+                continue  # Every remaining action needs a token
+            elif action == "add_to_cart":
+                await recorder.call(client, "POST /cart/items/", "POST", "/cart/items/", headers=headers,
+                                    json={"product_id": rng.randint(1, args.products), "quantity": rng.randint(1, 3)})
+            elif action == "checkout":
+                # Checking out an empty cart (400) is an expected outcome, not a failure
+                await recorder.call(client, "POST /orders/", "POST", "/orders/", headers=headers,
+                                    expected_errors=(400,))
+            elif action == "list_orders":
+                await recorder.call(client, "GET /orders/", "GET", "/orders/", headers=headers)
+
+
+async def run_load(args) -> dict:
+    await wait_until_ready(args.url)
+    recorder = Recorder()
+    start = time.monotonic()
+    deadline = start + args.duration
+    await asyncio.gather(*(virtual_user(i, args, recorder, deadline) for i in range(args.users)))
+    return recorder.report(time.monotonic() - start)
+
+
+def compare_with_baseline(result: dict, baseline: dict, max_regression: float) -> list:
+    """Return the routes whose p95 got more than `max_regression` percent slower."""
+    regressions = []
+    for route, stats in result["routes"].items():
+        previous = baseline.get("routes", {}).get(route)
+        if not previous or not previous["p95_ms"]:
+            continue
+        change = (stats["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] * 100
+        if change > max_regression:
+            regressions.append({"route": route, "baseline_p95_ms": previous["p95_ms"],
+                                "p95_ms": stats["p95_ms"], "change_pct": round(change, 1)})
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Target an already running server instead of booting one")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to generate load for")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the booted server")
+    parser.add_argument("--products", type=int, default=1000, help="Products to seed")
+    parser.add_argument("--seed-users", type=int, default=50, help="Customer accounts to seed")
+    parser.add_argument("--password", default="load-test-password", help="Password of the seeded customers")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the traffic mix")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare p95 latencies against")
+    parser.add_argument("--max-regression", type=float, default=20.0,
+                        help="Allowed p95 slowdown per route in percent before failing")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    server = None
+    workdir = None
+    try:
+        if args.url is None:
+            workdir = tempfile.TemporaryDirectory(prefix="loadtest-")
+            env = server_env(Path(workdir.name))
+            env["LOADTEST_WORKDIR"] = workdir.name
+            (Path(workdir.name) / "uploads").mkdir()
+            seed_database(env, args.products, args.seed_users, args.password)
+            port = free_port()
+            args.url = f"http://127.0.0.1:{port}"
+            server = start_server(env, port, args.workers)
+
+        result = asyncio.run(run_load(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+        if workdir is not None:
+            workdir.cleanup()
+
+    result["config"] = {
+        "users": args.users, "duration_s": args.duration, "workers": args.workers,
+        "products": args.products, "seed_users": args.seed_users, "seed": args.seed,
+        "traffic_mix": TRAFFIC_MIX,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        regressions = compare_with_baseline(result, json.loads(Path(args.baseline).read_text()), args.max_regression)
+        result["regressions"] = regressions
+        exit_code = 1 if regressions else 0
+
+    report = json.dumps(result, indent=2)
+    if args.output:
+        Path(args.output).write_text(report + "\n")
+    else:
+        print(report)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Micro-benchmark of response serialization for the large list endpoints.
+
+Serializes in-memory ORM objects shaped like the responses of GET /products/?limit=100,
+GET /orders/ and GET /cart/ through:
+
+    response_model   FastAPI's route path: validate into the response_model, convert to
+                     jsonable Python (serialize_response), then JSONResponse's json.dumps
+    dump_json        app.utils.json_response.dump_json: one pydantic-core validate + dump to bytes
+    orjson           validate, dump_python(mode="json"), orjson.dumps (only if orjson is installed)
+
+and prints the per-item cost of each, as JSON with --output.
+
+    python benchmarks/serialization.py
+    python benchmarks/serialization.py --rounds 500 --output serialization.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+# Settings are read at import time; the benchmark never opens a connection
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+import app.models  # noqa: E402,F401  Resolves relationship targets
+from app.models.cart import Cart, CartItem  # noqa: E402
+from app.models.order import Order, OrderItem  # noqa: E402
+from app.models.product import Product  # noqa: E402
+from app.schemas.cart import Cart as CartSchema  # noqa: E402
+from app.schemas.order import Order as OrderSchema  # noqa: E402
+from app.schemas.product import Product as ProductSchema  # noqa: E402
+from app.utils.json_response import dump_json  # noqa: E402
+
+try:
+    import orjson
+except ImportError:  # Optional comparison only
+    orjson = None
+
+
+def make_products(count: int) -> list:
+    return [
+        Product(
+            id=i, sku=f"SKU-{i:06d}", name=f"Product {i}", description="A reasonably descriptive product text " * 3,
+            price=9.99 + i, image_url=f"https://cdn.example.com/{i}.jpg", category="Category",
+            local_image_path=f"uploads/images/ab/{i:064x}.jpg",
+            image_variants={name: f"uploads/images/ab/{i:064x}_{name}.jpg" for name in ("thumbnail", "listing", "detail")},
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def make_orders(count: int, items_per_order: int, products: list) -> list:
+    orders = []
+    for i in range(1, count + 1):
+        order = Order(id=i, user_id=1, total_amount=100.0, created_at=datetime(2026, 1, 1, 12, 0, i % 60), status="pending")
+        order.items = [
+            OrderItem(id=i * 100 + j, product_id=product.id, quantity=j + 1, price_at_purchase=product.price, product=product)
+            for j, product in enumerate(products[:items_per_order])
+        ]
+        orders.append(order)
+    return orders
+
+
+def make_cart(items: int, products: list) -> Cart:
+    cart = Cart(id=1, user_id=1)
+    cart.items = [
+        CartItem(id=j, product_id=product.id, quantity=1, product=product)
+        for j, product in enumerate(products[:items], start=1)
+    ]
+    return cart
+
+
+def response_model_path(response_type):
+    """The work a route with response_model=response_type does for its return value."""
+    field = create_model_field(name="Response", type_=response_type, mode="serialization")
+    loop = asyncio.new_event_loop()  # Reused, so loop setup isn't billed to serialization
+
+    def serialize(value) -> bytes:
+        content = loop.run_until_complete(serialize_response(field=field, response_content=value, is_coroutine=True))
+        return JSONResponse(content).body
+
+    return serialize
+
+
+def dump_json_path(response_type):
+    adapter = TypeAdapter(response_type)
+    return lambda value: dump_json(adapter, value)
+
+
+def orjson_path(response_type):
+    adapter = TypeAdapter(response_type)
+    return lambda value: orjson.dumps(adapter.dump_python(adapter.validate_python(value, from_attributes=True), mode="json"))
+
+
+def measure(serialize, value, rounds: int) -> float:
+    """Best mean seconds per call over five batches of `rounds` calls."""
+    serialize(value)  # Warm up schema caches
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            serialize(value)
+        best = min(best, (time.perf_counter() - start) / rounds)
+    return best
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=200, help="Serializations per timed batch")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    products = make_products(100)
+    cases = {
+        "GET /products/?limit=100": (List[ProductSchema], products, len(products)),
+        "GET /orders/ (50 orders x 4 items)": (List[OrderSchema], make_orders(50, 4, products), 50 * 4),
+        "GET /cart/ (20 items)": (CartSchema, make_cart(20, products), 20),
+    }
+    paths = {"response_model": response_model_path, "dump_json": dump_json_path}
+    if orjson is not None:
+        paths["orjson"] = orjson_path
+
+    results = {}
+    for case, (response_type, value, items) in cases.items():
+        timings = {name: measure(build(response_type), value, args.rounds) for name, build in paths.items()}
+        results[case] = {
+            "items": items,
+            "us_per_item": {name: round(seconds / items * 1e6, 3) for name, seconds in timings.items()},
+            "speedup": round(timings["response_model"] / timings["dump_json"], 2),
+        }
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,8 +11,12 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app.models.base import Base
 from app.models.user import User
 from app.models.product import Product
+from app.models.category import Category
 from app.models.cart import Cart, CartItem
 from app.models.order import Order, OrderItem
+from app.models.image import StoredImage
+from app.models.sales import DailySales, DailyProductSales, DailyCategorySales
+from app.models.outbox import OutboxEvent
 from app.config import settings
 
 config = context.config
@@ -22,10 +26,23 @@ if config.config_file_name is not None:
 
 target_metadata = Base.metadata
 
+# Search index objects created by raw DDL (see app/models/product.py), unknown to the metadata
+SEARCH_INDEX_OBJECTS = {"search_vector", "ix_products_search_vector", "ix_products_name_trgm"}
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Keep autogenerate from proposing to drop the search index objects."""
+    if reflected and compare_to is None:
+        if type_ == "table" and name.startswith("products_fts"):
+            return False
+        if name in SEARCH_INDEX_OBJECTS:
+            return False
+    return True
+
 def run_migrations_offline():
     context.configure(
         url=settings.DATABASE_URL,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -41,7 +58,8 @@ def run_migrations_online():
     with connectable.connect() as connection:
         context.configure(
             connection=connection,
-            target_metadata=target_metadata
+            target_metadata=target_metadata,
+            include_object=include_object,
         )
         with context.begin_transaction():
             context.run_migrations()
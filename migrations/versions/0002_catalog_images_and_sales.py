@@ -0,0 +1,227 @@
+"""catalog, images and sales
+
+Everything added on top of the baseline tables: categories with maintained product counts,
+SKUs and image variants on products, content-addressed stored_images, the daily sales
+rollups, the cart_items (cart_id, product_id) constraint, the keyset pagination and export
+indexes, and the product search index (tsvector and trigram indexes on PostgreSQL, an FTS5
+table with sync triggers on SQLite).
+
+Existing rows are carried over: categories are created from products.category and counted,
+duplicate cart lines are merged into one, the search index is filled and the rollups are
+computed from past orders. products.name and products.price become NOT NULL, so products
+missing either must be fixed before upgrading.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 20:38:12.402716
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Copied from app/models/product.py as of this revision, so later edits there don't rewrite history
+POSTGRES_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """ALTER TABLE products ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(category, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'C')
+    ) STORED""",
+    "CREATE INDEX ix_products_search_vector ON products USING gin (search_vector)",
+    "CREATE INDEX ix_products_name_trgm ON products USING gin (name gin_trgm_ops)",
+]
+
+SQLITE_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE products_fts USING fts5(
+        name, description, category, content='products', content_rowid='id',
+        tokenize='porter unicode61', prefix='2 3'
+    )""",
+    """CREATE TRIGGER products_fts_insert AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description, new.category);
+    END""",
+    """CREATE TRIGGER products_fts_delete AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description, category)
+        VALUES ('delete', old.id, old.name, old.description, old.category);
+    END""",
+    """CREATE TRIGGER products_fts_update AFTER UPDATE OF name, description, category ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description, category)
+        VALUES ('delete', old.id, old.name, old.description, old.category);
+        INSERT INTO products_fts(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description, new.category);
+    END""",
+    "INSERT INTO products_fts(products_fts) VALUES ('rebuild')",  # Index the existing products
+]
+
+# Same as `python -m app.cli rebuild-category-counts` as of this revision
+CATEGORY_BACKFILL = [
+    "INSERT INTO categories (name, product_count) "
+    "SELECT DISTINCT category, 0 FROM products WHERE category IS NOT NULL",
+    "UPDATE products SET category_id = (SELECT categories.id FROM categories WHERE categories.name = products.category)",
+    "UPDATE categories SET product_count = "
+    "(SELECT count(products.id) FROM products WHERE products.category_id = categories.id)",
+]
+
+# Sum the quantities of duplicate cart lines into the oldest one, then drop the others
+CART_ITEMS_DEDUPLICATION = [
+    """UPDATE cart_items SET quantity = (
+        SELECT sum(same.quantity) FROM cart_items AS same
+        WHERE same.cart_id = cart_items.cart_id AND same.product_id = cart_items.product_id
+    ) WHERE id IN (
+        SELECT min(id) FROM cart_items WHERE cart_id IS NOT NULL AND product_id IS NOT NULL
+        GROUP BY cart_id, product_id HAVING count(*) > 1
+    )""",
+    """DELETE FROM cart_items WHERE cart_id IS NOT NULL AND product_id IS NOT NULL AND id NOT IN (
+        SELECT min(id) FROM cart_items WHERE cart_id IS NOT NULL AND product_id IS NOT NULL
+        GROUP BY cart_id, product_id
+    )""",
+]
+
+
+def _sales_rollup_backfill(day: str) -> list:
+    """Same as `python -m app.cli rebuild-sales-rollups` as of this revision, with `day` the UTC day of orders.created_at."""
+    counted = "FROM orders JOIN order_items ON order_items.order_id = orders.id " \
+              "WHERE (orders.status IS NULL OR orders.status <> 'cancelled')"
+    revenue = "coalesce(sum(order_items.price_at_purchase * order_items.quantity), 0)"
+    return [
+        f"INSERT INTO sales_daily (day, orders, units, revenue) "
+        f"SELECT {day}, count(DISTINCT orders.id), coalesce(sum(order_items.quantity), 0), {revenue} "
+        f"{counted} GROUP BY {day}",
+        f"INSERT INTO sales_daily_products (day, product_id, units, revenue) "
+        f"SELECT {day}, order_items.product_id, coalesce(sum(order_items.quantity), 0), {revenue} "
+        f"{counted} AND order_items.product_id IS NOT NULL GROUP BY {day}, order_items.product_id",
+        f"INSERT INTO sales_daily_categories (day, category_id, units, revenue) "
+        f"SELECT {day}, products.category_id, coalesce(sum(order_items.quantity), 0), {revenue} "
+        f"{counted.replace('WHERE', 'JOIN products ON products.id = order_items.product_id WHERE')} "
+        f"AND products.category_id IS NOT NULL GROUP BY {day}, products.category_id",
+    ]
+
+
+def upgrade() -> None:
+    dialect_name = op.get_context().dialect.name
+
+    op.create_table('categories',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('product_count', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_index(op.f('ix_categories_id'), 'categories', ['id'], unique=False)
+    op.create_table('stored_images',
+    sa.Column('path', sa.String(), nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('path')
+    )
+    op.create_index(op.f('ix_stored_images_sha256'), 'stored_images', ['sha256'], unique=False)
+
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.add_column(sa.Column('sku', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('image_variants', sa.JSON(), nullable=True))
+        batch_op.add_column(sa.Column('category_id', sa.Integer(), nullable=True))
+        batch_op.alter_column('name', existing_type=sa.String(), nullable=False)
+        batch_op.alter_column('price', existing_type=sa.Float(), nullable=False)
+        batch_op.create_unique_constraint('uq_products_sku', ['sku'])
+        batch_op.create_foreign_key('fk_products_category_id_categories', 'categories', ['category_id'], ['id'])
+    op.create_index('ix_products_category_id_id', 'products', ['category_id', 'id'], unique=False)
+    op.create_index('ix_products_name_id', 'products', ['name', 'id'], unique=False)
+    op.create_index('ix_products_price_id', 'products', ['price', 'id'], unique=False)
+    for statement in CATEGORY_BACKFILL:
+        op.execute(statement)
+
+    for statement in CART_ITEMS_DEDUPLICATION:
+        op.execute(statement)
+    with op.batch_alter_table('cart_items') as batch_op:
+        batch_op.create_unique_constraint('uq_cart_items_cart_id_product_id', ['cart_id', 'product_id'])
+
+    op.create_index('ix_orders_created_at_id', 'orders', ['created_at', 'id'], unique=False)
+    op.create_index(op.f('ix_order_items_order_id'), 'order_items', ['order_id'], unique=False)
+
+    op.create_table('sales_daily',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('orders', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('day')
+    )
+    op.create_table('sales_daily_products',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('day', 'product_id')
+    )
+    op.create_table('sales_daily_categories',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ),
+    sa.PrimaryKeyConstraint('day', 'category_id')
+    )
+    if dialect_name == 'sqlite':
+        day = "date(orders.created_at)"  # Stored as UTC text
+    elif dialect_name == 'postgresql':
+        day = "CAST(timezone('UTC', orders.created_at) AS DATE)"
+    else:
+        day = "CAST(orders.created_at AS DATE)"
+    for statement in _sales_rollup_backfill(day):
+        op.execute(statement)
+
+    if dialect_name == 'postgresql':
+        for statement in POSTGRES_SEARCH_DDL:
+            op.execute(statement)
+    elif dialect_name == 'sqlite':
+        for statement in SQLITE_SEARCH_DDL:
+            op.execute(statement)
+
+
+def downgrade() -> None:
+    dialect_name = op.get_context().dialect.name
+    if dialect_name == 'sqlite':
+        op.execute('DROP TRIGGER IF EXISTS products_fts_insert')
+        op.execute('DROP TRIGGER IF EXISTS products_fts_delete')
+        op.execute('DROP TRIGGER IF EXISTS products_fts_update')
+        op.execute('DROP TABLE IF EXISTS products_fts')
+    elif dialect_name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_products_name_trgm')
+        op.execute('DROP INDEX IF EXISTS ix_products_search_vector')
+        op.execute('ALTER TABLE products DROP COLUMN IF EXISTS search_vector')
+
+    op.drop_table('sales_daily_categories')
+    op.drop_table('sales_daily_products')
+    op.drop_table('sales_daily')
+    op.drop_index(op.f('ix_order_items_order_id'), table_name='order_items')
+    op.drop_index('ix_orders_created_at_id', table_name='orders')
+    with op.batch_alter_table('cart_items') as batch_op:
+        batch_op.drop_constraint('uq_cart_items_cart_id_product_id', type_='unique')
+
+    op.drop_index('ix_products_price_id', table_name='products')
+    op.drop_index('ix_products_name_id', table_name='products')
+    op.drop_index('ix_products_category_id_id', table_name='products')
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_constraint('fk_products_category_id_categories', type_='foreignkey')
+        batch_op.drop_constraint('uq_products_sku', type_='unique')
+        batch_op.alter_column('price', existing_type=sa.Float(), nullable=True)
+        batch_op.alter_column('name', existing_type=sa.String(), nullable=True)
+        batch_op.drop_column('category_id')
+        batch_op.drop_column('image_variants')
+        batch_op.drop_column('sku')
+
+    op.drop_index(op.f('ix_stored_images_sha256'), table_name='stored_images')
+    op.drop_table('stored_images')
+    op.drop_index(op.f('ix_categories_id'), table_name='categories')
+    op.drop_table('categories')
@@ -0,0 +1,38 @@
+"""order item category
+
+Records each order line's category at checkout, so sales rollups keep the category a product
+was sold in after it is recategorised. Existing lines are backfilled from their product's
+current category, the best that is known for them.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 21:40:12.514306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('order_items') as batch_op:
+        batch_op.add_column(sa.Column('category_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_order_items_category_id_categories', 'categories', ['category_id'], ['id'])
+    op.execute(
+        "UPDATE order_items SET category_id = "
+        "(SELECT products.category_id FROM products WHERE products.id = order_items.product_id)"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('order_items') as batch_op:
+        batch_op.drop_constraint('fk_order_items_category_id_categories', type_='foreignkey')
+        batch_op.drop_column('category_id')
@@ -0,0 +1,85 @@
+"""
+GET /cart/, GET /orders/ and GET /orders/{id} load their graphs with the explicit
+selectin profiles in app/services/cart.py and app/services/order.py, so the number
+of SQL statements they run must not grow with the number of cart lines, orders or
+order items.
+"""
+import uuid
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app.database import async_engine
+from app.models.cart import Cart, CartItem
+from app.models.order import Order, OrderItem
+from app.models.product import Product
+from app.models.user import User
+from app.services.auth import create_access_token
+
+SMALL = {"orders": 1, "items": 1}
+LARGE = {"orders": 50, "items": 5}
+
+
+@contextmanager
+def count_queries():
+    """Count the statements the request handlers send through the async engine."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+def seed_customer(db, orders: int, items: int) -> tuple[dict, int]:
+    """
+    A customer with `orders` orders of `items` lines each, and a cart holding one line
+    per product. Returns the auth headers and the id of the last order.
+    """
+    suffix = uuid.uuid4().hex
+    user = User(email=f"{suffix}@example.com", hashed_password="-", full_name="Test")
+    products = [Product(name=f"product {suffix} {i}", price=1.0 + i, category="Tests") for i in range(items)]
+    db.add_all([user, *products])
+    db.flush()
+
+    cart = Cart(user_id=user.id)
+    db.add(cart)
+    db.flush()
+    db.add_all([CartItem(cart_id=cart.id, product_id=product.id, quantity=2) for product in products])
+
+    for _ in range(orders):
+        order = Order(user_id=user.id, total_amount=sum(p.price for p in products), status="pending")
+        db.add(order)
+        db.flush()
+        db.add_all([
+            OrderItem(order_id=order.id, product_id=product.id, quantity=1, price_at_purchase=product.price)
+            for product in products
+        ])
+    db.commit()
+    return {"Authorization": f"Bearer {create_access_token({'sub': user.email})}"}, order.id
+
+
+def queries_for(client, db, path: str, shape: dict) -> int:
+    headers, order_id = seed_customer(db, **shape)
+    url = path.format(order_id=order_id)
+    assert client.get("/auth/me", headers=headers).status_code == 200  # Resolve the principal outside the count
+    with count_queries() as statements:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.text
+    return len(statements)
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("/cart/", 3),  # cart, items, products
+    ("/orders/", 3),  # orders, items, products
+    ("/orders/{order_id}", 3),  # order, items, products
+])
+def test_query_count_is_fixed(client, db, path, expected):
+    small = queries_for(client, db, path, SMALL)
+    large = queries_for(client, db, path, LARGE)
+    assert small == large == expected